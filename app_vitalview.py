@@ -1,73 +1,128 @@
 # app_vitalview.py — VitalView (Login + Plans + Forgot Password + Stripe-ready)
 # Run: pip install streamlit pandas numpy altair bcrypt
-# Optional: pip install stripe reportlab
+# Optional: pip install stripe reportlab pyarrow openpyxl
 
-import os, time, secrets, sqlite3, bcrypt
+import time
+_RUN_T0 = time.perf_counter()   # start of this script run (cold start or rerun)
+
+import io, os, re, string, secrets, sqlite3, threading, zipfile, bcrypt
+from collections import deque
 import streamlit as st
 import pandas as pd
 import numpy as np
-import altair as alt
 
-# ---- Optional Stripe (safe if not installed) ----
-try:
-    import stripe
-    stripe.api_key = os.getenv("STRIPE_TEST_KEY", "")
-except Exception:
-    stripe = None
+# set_page_config must be the first Streamlit call of the run
+st.set_page_config(page_title="VitalView by Christopher Chaney", layout="wide")
+
+# ----------------------------
+# Startup / rerun timing (process-wide)
+# ----------------------------
+@st.cache_resource
+def _perf_log() -> dict:
+    return {"cold_start_s": None, "reruns_s": deque(maxlen=100), "imports_s": {}, "views_s": {},
+            "memory": deque(maxlen=500)}
+
+def _timed_import(name: str, loader):
+    """Run `loader` (an import) and record how long the first import took."""
+    log = _perf_log()["imports_s"]
+    t0 = time.perf_counter()
+    mod = loader()
+    log.setdefault(name, round(time.perf_counter() - t0, 4))
+    return mod
+
+# ----------------------------
+# Rerun profiler (opt-in, admin panel at the bottom of the sidebar)
+# ----------------------------
+import json, functools
+from contextlib import contextmanager, nullcontext
+
+PROFILE_TRACE_PATH = os.getenv("VITALVIEW_TRACE_PATH", "vitalview_traces.jsonl")
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("VITALVIEW_ADMIN_EMAILS", "").split(",") if e.strip()}
+
+class RerunProfiler:
+    """Collects (section, seconds, depth) for one script run. Disabled = near-zero overhead."""
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.records = []
+        self._depth = 0
+        self._mark = None   # (name, t0) of the current flat top-level section
+
+    @contextmanager
+    def section(self, name: str):
+        if not self.enabled:
+            yield; return
+        t0 = time.perf_counter(); self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.records.append({"section": name, "t0": t0, "s": time.perf_counter() - t0, "depth": self._depth})
+
+    def mark(self, name: str | None):
+        """Close the previous top-level section and start `name` (for code not inside a `with` block)."""
+        if not self.enabled: return
+        now = time.perf_counter()
+        if self._mark:
+            self.records.append({"section": self._mark[0], "t0": self._mark[1], "s": now - self._mark[1], "depth": 0})
+        self._mark = (name, now) if name else None
+
+_PROF = RerunProfiler(bool(st.session_state.get("profiler_on", False)))
+
+def profiled(fn):
+    """Time each call of a hot helper when the profiler is on."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _PROF.enabled:
+            return fn(*args, **kwargs)
+        with _PROF.section(fn.__name__ + "()"):
+            return fn(*args, **kwargs)
+    return wrapper
+
+# ---- Optional Stripe (lazy: imported on first checkout, safe if not installed) ----
+def get_stripe():
+    def _load():
+        try:
+            import stripe
+        except Exception:
+            return None
+        # timeouts/retries for every call; STRIPE_API_BASE points at stripe-mock for local testing
+        from vitalview_billing import configure_stripe
+        return configure_stripe(stripe, os.getenv("STRIPE_TEST_KEY", ""), os.getenv("STRIPE_API_BASE"))
+    return _timed_import("stripe", _load)
 
 STRIPE_PRICE_PRO = os.getenv("STRIPE_PRICE_PRO", "")
 STRIPE_PRICE_ENT = os.getenv("STRIPE_PRICE_ENT", "")
+STRIPE_SUCCESS_URL = os.getenv("STRIPE_SUCCESS_URL", "https://example.com/success")
+STRIPE_CANCEL_URL = os.getenv("STRIPE_CANCEL_URL", "https://example.com/cancel")
 
-# ---- Optional PDF export (safe if not installed) ----
-try:
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.units import inch
-    from reportlab.lib.utils import simpleSplit
-except Exception:
-    canvas = None
-# ---- Altair theme (optional) ----
-import altair as alt
-
-def vitalview_altair_theme():
-    return {
-        "config": {
-            "view": {"stroke": "transparent"},
-            "background": THEME["bg"],
-            "axis": {
-                "labelColor": THEME["text"],
-                "titleColor": THEME["text"],
-                "gridColor": THEME["muted"]
-            },
-            "legend": {
-                "labelColor": THEME["text"],
-                "titleColor": THEME["text"]
-            },
-            "title": {"color": THEME["text"]},
-            "range": {
-                "category": [THEME["primary"], THEME["accent"], THEME["good"], THEME["warn"], THEME["danger"]],
-            }
-        }
-    }
+# ---- Data logic (Streamlit-free, shared with benchmarks/batch tools) ----
+import vitalview_core as core
 
-# Register/enable each run (safe to call multiple times)
-alt.themes.register('vitalview', vitalview_altair_theme)
-alt.themes.enable('vitalview')
+# ---- Optional PDF export (ReportLab is imported on first render, safe if not installed) ----
+from vitalview_pdf import render_pdf, render_pdf_batch, pdf_pool, pdf_cache_key, pdf_available
 
-# ----------------------------
-# Page + basic style
-# ----------------------------
-st.markdown(
-    f"""
-    <div class="vv-hero">
-        <h2 style="margin:0;">VitalView</h2>
-        <div style="opacity:0.9;">by Christopher Chaney — Empowering communities through data-driven health insights</div>
-    </div>
-    """,
-    unsafe_allow_html=True
-)
+# ---- Optional columnar / spreadsheet export (lazy, safe if not installed) ----
+def get_pyarrow():
+    """(pyarrow, parquet, feather) or None."""
+    def _load():
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            import pyarrow.feather as pa_feather
+            return pa, pq, pa_feather
+        except Exception:
+            return None
+    return _timed_import("pyarrow", _load)
+
+def get_xlsx_engine():
+    def _load():
+        try:
+            import openpyxl  # noqa: F401  (pandas ExcelWriter engine)
+            return "openpyxl"
+        except Exception:
+            return None
+    return _timed_import("openpyxl", _load)
 
-st.set_page_config(page_title="VitalView by Christopher Chaney", layout="wide")
 # ===== VitalView polished theme (colors + tab highlight) =====
 PRIMARY = "#0A74DA"      # Vital blue
 ACCENT  = "#00E3A8"      # Aqua
@@ -126,12 +181,135 @@ THEMES = {
     },
 }
 
-if "theme_name" not in st.session_state:
+# ----------------------------
+# Session persistence (external state backend, so replicas need no sticky sessions)
+# ----------------------------
+import vitalview_state as vstate
+
+STATE_URL = os.getenv("VITALVIEW_STATE_URL", "")          # see vitalview_state.py; default SQLite file
+STATE_TTL_S = int(os.getenv("VITALVIEW_STATE_TTL", str(7 * 24 * 3600)))
+# per browser session (?sid= in the URL). The login is deliberately not among them: anyone holding a
+# copied or logged URL would be signed in. Logged-in users sign in again on a new connection; their
+# artifacts are kept per account.
+SESSION_KEYS = ("plan", "theme_name")
+ARTIFACT_KEYS = ("narratives", "community_actions")          # per account; per browser session when logged out
+
+@st.cache_resource
+def get_state_store():
+    return vstate.open_backend(STATE_URL)
+
+def _state_call(op: str, *args):
+    """Run a backend op; None (and a one-time warning) when the store is unreachable, so the app
+    keeps working on st.session_state alone."""
+    try:
+        return getattr(get_state_store(), op)(*args)
+    except (vstate.StateError, sqlite3.Error, OSError) as e:
+        if not st.session_state.get("_state_warned"):
+            st.session_state._state_warned = True
+            st.warning(f"Session storage unavailable; changes last only for this tab. ({e})")
+        return None
+
+def session_id() -> str:
+    # the id rides in the URL so a reconnect to any replica finds the same session record
+    sid = st.query_params.get("sid", "")
+    if not re.fullmatch(r"[0-9a-f]{32}", sid):
+        sid = secrets.token_hex(16)
+        st.query_params["sid"] = sid
+    return sid
+
+SID = session_id()
+
+def _artifact_ns() -> str:
+    u = st.session_state.get("user")
+    return f"user:{u['email'].strip().lower()}" if u else f"session:{SID}"
+
+def save_state(*keys):
+    """Write session keys through to the backend (call right after changing them)."""
+    for k in keys:
+        _state_call("put", f"session:{SID}", k, st.session_state.get(k), STATE_TTL_S)
+
+def load_artifacts(carry: bool = False):
+    """Replace the saved-artifact lists with the store's copy for the current account. With `carry`
+    (at login), items saved while logged out move into the account."""
+    prev = {k: list(st.session_state.get(k) or []) for k in ARTIFACT_KEYS}
+    saved = _state_call("get_many", _artifact_ns())
+    for k in ARTIFACT_KEYS:
+        st.session_state[k] = (saved or {}).get(k, prev[k] if saved is None else [])
+        for item in (prev[k] if carry and saved is not None else []):
+            if item not in st.session_state[k]:
+                st.session_state[k] = _state_call("append", _artifact_ns(), k, item) or st.session_state[k] + [item]
+    if carry and saved is not None:
+        _state_call("delete", f"session:{SID}", None)
+        save_state(*SESSION_KEYS)
+
+def add_artifact(key: str, item: dict):
+    st.session_state[key] = _state_call("append", _artifact_ns(), key, item) or \
+        list(st.session_state.get(key) or []) + [item]
+
+def remove_artifact(key: str, item: dict):
+    items = _state_call("remove", _artifact_ns(), key, item)
+    if items is None:
+        items = list(st.session_state.get(key) or [])
+        if item in items: items.remove(item)
+    st.session_state[key] = items
+
+if st.session_state.get("_hydrated") != SID:     # once per Streamlit session (and per sid)
+    for k, v in (_state_call("get_many", f"session:{SID}") or {}).items():
+        if k in SESSION_KEYS: st.session_state[k] = v
+    load_artifacts()
+    st.session_state._hydrated = SID
+
+if st.session_state.get("theme_name") not in THEMES:
     st.session_state.theme_name = "Vital (Bright)"
+st.sidebar.selectbox("🎨 Theme", list(THEMES), key="theme_name", on_change=save_state, args=("theme_name",))
 THEME = THEMES[st.session_state.theme_name]
 
-st.markdown(
-    f"""
+# ---- Altair theme (lazy: imported and registered once per theme on first chart) ----
+def vitalview_altair_theme(theme: dict):
+    return {
+        "config": {
+            "view": {"stroke": "transparent"},
+            "background": theme["bg"],
+            "axis": {
+                "labelColor": theme["text"],
+                "titleColor": theme["text"],
+                "gridColor": theme["muted"]
+            },
+            "legend": {
+                "labelColor": theme["text"],
+                "titleColor": theme["text"]
+            },
+            "title": {"color": theme["text"]},
+            "range": {
+                "category": [theme["primary"], theme["accent"], theme["good"], theme["warn"], theme["danger"]],
+            }
+        }
+    }
+
+def get_altair():
+    alt = _timed_import("altair", lambda: __import__("altair"))
+    name = "vitalview_" + re.sub(r"\W+", "_", st.session_state.theme_name).strip("_").lower()
+    if name not in alt.themes.names():
+        theme = dict(THEMES[st.session_state.theme_name])
+        alt.themes.register(name, lambda: vitalview_altair_theme(theme))
+    alt.themes.enable(name)
+    return alt
+
+# ----------------------------
+# Page + basic style (CSS built once per theme)
+# ----------------------------
+HERO_HTML = """
+    <div class="vv-hero">
+        <h2 style="margin:0;">VitalView</h2>
+        <div style="opacity:0.9;">by Christopher Chaney — Empowering communities through data-driven health insights</div>
+    </div>
+    """
+
+@st.cache_data(show_spinner=False)
+def theme_css(theme_name: str) -> str:
+    THEME = THEMES[theme_name]
+    # base polish (fixed brand colors) + CSS variables for the selected theme
+    return f"""
     <style>
       /* app background + base text */
       .stApp {{
@@ -194,12 +372,7 @@ st.markdown(
         font-weight: 800;
       }}
     </style>
-    """,
-    unsafe_allow_html=True
-)
-# ===== GLOBAL CSS USING CURRENT THEME =====
-st.markdown(
-    f"""
+    """ + f"""
     <style>
       :root {{
         --bg: {THEME['bg']};
@@ -284,13 +457,10 @@ st.markdown(
         color: var(--text);
       }}
     </style>
-    """,
-    unsafe_allow_html=True
-)
-
-
+    """
 
-THEME = THEMES[st.session_state.theme_name]  # refresh after possible change
+st.markdown(theme_css(st.session_state.theme_name), unsafe_allow_html=True)
+st.markdown(HERO_HTML, unsafe_allow_html=True)
 
 # ----------------------------
 # Session defaults (MUST be early)
@@ -304,11 +474,26 @@ if "plan" not in st.session_state:
 # Plans & features
 # ----------------------------
 PLAN_FEATURES = {
-    "free":       {"exports": False},
-    "pro":        {"exports": True},
-    "enterprise": {"exports": True},
+    "free":       {"exports": False, "batch_drafts": False},
+    "pro":        {"exports": True,  "batch_drafts": False},
+    "enterprise": {"exports": True,  "batch_drafts": True},
 }
 
+# ----------------------------
+# Audit log (write-behind: a buffered append here, batched SQLite writes on a background thread)
+# ----------------------------
+from vitalview_audit import AuditLog
+
+@st.cache_resource
+def get_audit() -> AuditLog:
+    return AuditLog(policy=os.getenv("VITALVIEW_AUDIT_POLICY", "drop_oldest"))
+
+def audit(kind: str, actor: str | None = None, **details):
+    """Record who did what; `actor` defaults to the logged-in email (or this browser session)."""
+    u = st.session_state.get("user")
+    actor = actor or (u["email"] if u else f"session:{SID[:8]}")
+    get_audit().log(kind, actor.strip().lower(), **details)
+
 # ----------------------------
 # Auth: SQLite + bcrypt
 # ----------------------------
@@ -344,6 +529,7 @@ def add_user(name, email, password, plan="free"):
         conn.execute("INSERT INTO users(name,email,password,plan) VALUES(?,?,?,?)",
                      (name.strip(), email.strip(), hashed, plan))
         conn.commit()
+        audit("signup", email, plan=plan)
         st.success("✅ Account created. Please log in.")
     except sqlite3.IntegrityError:
         st.error("❌ That email is already registered.")
@@ -358,20 +544,33 @@ def login_user(email, password):
     conn.close()
     if row and bcrypt.checkpw(password.encode(), row[2].encode()):
         st.session_state.user = {"name": row[0], "email": row[1], "plan": row[3]}
+        audit("login", row[1], plan=row[3])
+        load_artifacts(carry=True)
         st.success(f"👋 Welcome back, {row[0]}!")
-        st.experimental_rerun()
+        st.rerun()
     else:
+        audit("login_failed", email or "(blank)", known=bool(row))
         st.error("❌ Incorrect email or password.")
 
 def logout_user():
+    audit("logout")
     st.session_state.user = None
+    load_artifacts()
     st.success("Logged out.")
-    st.experimental_rerun()
+    st.rerun()
 
-def update_plan(email, plan):
+def update_plan(email, plan, source="stripe webhook"):
     conn = sqlite3.connect(DB_PATH)
+    old = conn.execute("SELECT plan FROM users WHERE email=?", (email,)).fetchone()
     conn.execute("UPDATE users SET plan=? WHERE email=?", (plan, email))
     conn.commit(); conn.close()
+    audit("plan_change", email, old=old[0] if old else None, new=plan, source=source)
+
+def current_plan(email):
+    conn = sqlite3.connect(DB_PATH)
+    row = conn.execute("SELECT plan FROM users WHERE email=?", (email,)).fetchone()
+    conn.close()
+    return row[0] if row else None
 
 def start_reset(email, ttl_minutes=15):
     email = (email or "").strip()
@@ -412,6 +611,7 @@ def finish_reset(email, code, newpwd):
     conn.execute("UPDATE users SET password=? WHERE email=?", (hashed, email))
     conn.execute("DELETE FROM password_resets WHERE email=?", (email,))
     conn.commit(); conn.close()
+    audit("password_reset", email)
     return True, "Password updated. Please log in."
 
 init_db()
@@ -419,6 +619,7 @@ init_db()
 # ----------------------------
 # Sidebar: Account
 # ----------------------------
+_PROF.mark("Sidebar: account & plans")
 st.sidebar.header("🔑 Account")
 if not st.session_state.user:
     auth_mode = st.sidebar.radio("Select option", ["Log In", "Sign Up"], horizontal=True, key="auth_mode")
@@ -434,6 +635,12 @@ if not st.session_state.user:
         su_plan  = st.sidebar.selectbox("Choose Plan", ["free","pro","enterprise"])
         if st.sidebar.button("Create Account"):
             add_user(su_name, su_email, su_pwd, su_plan)
+else:
+    # the login lives in this browser session only (it isn't persisted with the session id, so a reload
+    # or replica switch signs out); until then, offer a way out
+    st.sidebar.caption(f"Signed in as **{st.session_state.user['name']}** ({st.session_state.user['email']})")
+    if st.sidebar.button("Log Out"):
+        logout_user()
 # ===== Local Resources CSV (optional upload) =====
 st.sidebar.markdown("### 📂 Local Resources (CSV)")
 # ===== Local Resources CSV template helper =====
@@ -476,12 +683,62 @@ with st.sidebar.expander("🔁 Forgot password?"):
 # Plan selection (demo override when logged out)
 # ----------------------------
 with st.sidebar.expander("💳 Plan (demo selector when logged out)"):
-    st.session_state.plan = st.radio("Choose plan (demo only)", ["free","pro","enterprise"],
-                                     index=["free","pro","enterprise"].index(st.session_state.plan))
+    _plan = st.radio("Choose plan (demo only)", ["free","pro","enterprise"],
+                     index=["free","pro","enterprise"].index(st.session_state.plan))
+    if _plan != st.session_state.plan:
+        audit("plan_change", old=st.session_state.plan, new=_plan, source="demo selector")
+        st.session_state.plan = _plan
+        save_state("plan")
+
+# Webhook-driven plan sync: apply queued Stripe events (each once, whichever replica gets there first),
+# then pick up this account's plan if it changed here or elsewhere
+from vitalview_billing import Billing, checkout_completed_event
+
+@st.cache_resource
+def get_billing() -> Billing:
+    return Billing()
+
+get_billing().process_events(update_plan)
+if st.session_state.user:
+    _plan = current_plan(st.session_state.user["email"])
+    if _plan and _plan != st.session_state.user["plan"]:
+        st.session_state.user = {**st.session_state.user, "plan": _plan}
 
 # Determine active plan
 active_plan = st.session_state.user["plan"] if st.session_state.user else st.session_state.plan
 FEATURES = PLAN_FEATURES.get(active_plan, PLAN_FEATURES["free"])
+
+# ---- Per-plan quotas for expensive operations (token buckets shared by all replicas) ----
+from vitalview_quota import QuotaStore, QuotaExceeded
+
+QUOTA_QUEUE_WAIT_S = 3600        # background jobs wait this long for quota before failing
+RESCORE_MIN_ROWS = int(os.getenv("VITALVIEW_RESCORE_MIN_ROWS", "1000"))   # smaller tables score unmetered
+
+@st.cache_resource
+def get_quota() -> QuotaStore:
+    return QuotaStore()
+
+# logged-out sessions share one anonymous allowance: session ids and the demo plan picker are free to reset
+QUOTA_PLAN = active_plan if st.session_state.user else "anonymous"
+
+def quota_subject() -> str:
+    u = st.session_state.get("user")
+    return u["email"].strip().lower() if u else "anonymous"
+
+def charge(op: str, cost: float = 1) -> bool:
+    """Spend quota for an interactive operation; False (with a warning) when over the limit."""
+    try:
+        get_quota().take(quota_subject(), QUOTA_PLAN, op, cost)
+        return True
+    except QuotaExceeded as e:
+        st.warning(f"⏳ {e}")
+        return False
+
+def _job_with_quota(fh, report, quota, subject, plan, op, fn, *args):
+    # queued rather than rejected: the job holds its worker until a token and a run slot free up
+    report(0.0, "Waiting for quota…")
+    with quota.guard(subject, plan, op, wait=QUOTA_QUEUE_WAIT_S):
+        fn(fh, report, *args)
 st.markdown(
     f"<div style='text-align:center;color:#555;font-size:0.95em;'>"
     f"Active Plan: <b>{active_plan.title()}</b> — Exports: <b>{'ON' if FEATURES['exports'] else 'OFF'}</b></div>",
@@ -494,31 +751,15 @@ st.markdown(
 st.sidebar.markdown("---")
 st.sidebar.subheader("Upgrade (Stripe Test)")
 def start_checkout(price_id: str, user_email: str, success_plan: str):
+    """Reuse this account's open checkout for the price, or create one in the background."""
+    stripe = get_stripe()
     if stripe is None or not getattr(stripe, "api_key", ""):
         st.sidebar.error("Stripe not configured. Set STRIPE_TEST_KEY / PRICE env vars.")
         return
     if not user_email:
         st.sidebar.error("Log in first.")
         return
-    try:
-        session = stripe.checkout.Session.create(
-            mode="subscription",
-            payment_method_types=["card"],
-            line_items=[{"price": price_id, "quantity": 1}],
-            success_url="https://example.com/success",
-            cancel_url="https://example.com/cancel",
-            customer_email=user_email
-        )
-        st.sidebar.success("Checkout session created.")
-        st.sidebar.link_button("Open Stripe Checkout", session.url)
-        # DEMO: instantly flip plan (real apps: use Stripe webhooks)
-        if st.sidebar.button("Simulate success (demo)"):
-            update_plan(user_email, success_plan)
-            if st.session_state.user and st.session_state.user["email"] == user_email:
-                st.session_state.user["plan"] = success_plan
-            st.sidebar.success(f"Plan upgraded to {success_plan.title()}. Reload the page.")
-    except Exception as e:
-        st.sidebar.error(f"Stripe error: {e}")
+    get_billing().checkout(stripe, user_email, price_id, success_plan, STRIPE_SUCCESS_URL, STRIPE_CANCEL_URL)
 
 col1, col2 = st.sidebar.columns(2)
 with col1:
@@ -530,6 +771,30 @@ with col2:
         if not STRIPE_PRICE_ENT: st.sidebar.error("Missing STRIPE_PRICE_ENT"); 
         else: start_checkout(STRIPE_PRICE_ENT, st.session_state.user["email"] if st.session_state.user else None, "enterprise")
 
+if st.session_state.user:
+    _checkouts = get_billing().checkouts(st.session_state.user["email"])
+    for co in _checkouts:
+        if co["status"] == "pending":
+            st.sidebar.info(f"Creating {co['plan'].title()} checkout…")
+        elif co["status"] == "failed":
+            st.sidebar.error(f"Stripe error ({co['plan'].title()}): {co['error']}")
+        else:
+            st.sidebar.link_button(f"Open Stripe Checkout ({co['plan'].title()})", co["url"])
+            # DEMO: a completed-checkout event through the same queue a real webhook lands in
+            # (queued in the click callback, so the plan sync above applies it on this rerun)
+            st.sidebar.button("Simulate success (demo)", key=f"simulate_{co['price']}", on_click=get_billing().enqueue,
+                              args=(checkout_completed_event(co["email"], co["plan"], co["session_id"]),))
+    if any(co["status"] == "pending" for co in _checkouts):
+        st.sidebar.button("🔄 Refresh", key="checkout_refresh")
+
+with st.sidebar.expander(f"📊 Usage & limits ({QUOTA_PLAN.title()})"):
+    for u in get_quota().usage(quota_subject(), QUOTA_PLAN):
+        if not u["capacity"]:
+            st.caption(f"{u['label']}: not included"); continue
+        per = "hour" if u["window_s"] == 3600 else "day" if u["window_s"] == 86400 else f"{u['window_s']}s"
+        st.progress(u["used"] / u["capacity"], text=f"{u['label']}: {u['used']} / {u['capacity']} per {per}")
+    st.caption("Allowances refill continuously. Cached results (re-opened PDFs, repeated scorings) are free.")
+
 # ----------------------------
 # Data helpers & demo
 # ----------------------------
@@ -680,46 +945,14 @@ def local_resources(state: str, county: str) -> list[tuple[str, str]]:
 
 # hold parsed resources in memory
 # ===== Load & index local resources from CSV =====
+@profiled
 def load_local_resources_csv(file) -> dict:
-    """
-    CSV schema (headers, case-insensitive):
-      state, county, section, label, url
-    Returns: dict[(State, County)] -> list of (section, label, url)
-    """
-    if file is None:
-        return {}
-
+    """dict[(State, County)] -> list of (section, label, url); see vitalview_core."""
     try:
-        df = pd.read_csv(file)
-    except Exception:
-        try:
-            df = pd.read_csv(file, encoding="utf-8-sig")
-        except Exception as e:
-            st.warning(f"Could not read resources CSV: {e}")
-            return {}
-
-    # normalize columns
-    df.columns = [c.strip().lower() for c in df.columns]
-    required = {"state", "county", "section", "label", "url"}
-    if not required.issubset(set(df.columns)):
-        st.warning(f"Resources CSV missing columns: {required - set(df.columns)}")
+        return core.load_local_resources_csv(file)
+    except ValueError as e:
+        st.warning(str(e))
         return {}
-
-    # clean up text
-    for c in ["state", "county", "section", "label", "url"]:
-        df[c] = df[c].astype(str).str.strip()
-
-    # title-case state & county to match your filters
-    df["state"] = df["state"].str.title()
-    df["county"] = df["county"].str.title()
-
-    # build lookup dictionary
-    resources = {}
-    for _, row in df.iterrows():
-        key = (row["state"], row["county"])
-        resources.setdefault(key, []).append((row["section"], row["label"], row["url"]))
-
-    return resources
 UPLOADED_RESOURCES = load_local_resources_csv(res_csv)
 
 def need_search_links(need: str, state: str, county: str) -> list[tuple[str, str]]:
@@ -746,49 +979,22 @@ def need_search_links(need: str, state: str, county: str) -> list[tuple[str, str
     ])
     return [x for x in links if x]
 def _make_sample():
-    counties = [("Illinois","Cook","17031"),("Illinois","Lake","17097"),("Illinois","Will","17197")]
-    years = list(range(2019, 2025))
-    rows=[]
-    def trend(a,b,n): return [round(a+(b-a)*i/(n-1),2) for i in range(n)]
-    ob={"Cook":trend(29,33,len(years)),"Lake":trend(25,29,len(years)),"Will":trend(26,31,len(years))}
-    pm={"Cook":trend(11.5,9.2,len(years)),"Lake":trend(10.8,8.9,len(years)),"Will":trend(11.2,9.1,len(years))}
-    un={"Cook":trend(15,11,len(years)),"Lake":trend(12,9,len(years)),"Will":trend(13,9.5,len(years))}
-    nc={"Cook":trend(16,15,len(years)),"Lake":trend(7,6.5,len(years)),"Will":trend(6.3,5.9,len(years))}
-    fd={"Cook":{2019:17.6,2022:16.8,2024:16.2},"Lake":{2019:10.6,2022:10.1,2024:9.8},"Will":{2019:12.7,2022:12.1,2024:11.9}}
-    for (s,c,f) in counties:
-        for i,y in enumerate(years):
-            rows.append([s,c,f,y,"Obesity (%)",ob[c][i],"percent"])
-            rows.append([s,c,f,y,"PM2.5 (µg/m³)",pm[c][i],"ugm3"])
-            rows.append([s,c,f,y,"Uninsured (%)",un[c][i],"percent"])
-            rows.append([s,c,f,y,"No Car Households (%)",nc[c][i],"percent"])
-        for y in fd[c]:
-            rows.append([s,c,f,y,"Food Desert (%)",fd[c][y],"percent"])
-    return pd.DataFrame(rows, columns=["state","county","fips","year","indicator","value","unit"])
+    return core.make_sample()
 from datetime import datetime
 
 def _save_narrative(text: str, state_list, county_list):
-    if "narratives" not in st.session_state:
-        st.session_state.narratives = []
-    st.session_state.narratives.append({
+    add_artifact("narratives", {
         "ts": datetime.now().strftime("%Y-%m-%d %H:%M"),
         "states": list(state_list) if state_list else [],
         "counties": list(county_list) if county_list else [],
         "text": text,
     })
-def enforce_schema(df: pd.DataFrame) -> pd.DataFrame:
-    req = {"state","county","fips","year","indicator","value","unit"}
-    df = df.copy()
-    df.columns = [c.strip().lower() for c in df.columns]
-    missing = req - set(df.columns)
-    if missing:
-        st.error(f"Missing columns: {missing}"); st.stop()
-    df["year"] = pd.to_numeric(df["year"], errors="coerce")
-    df["value"] = pd.to_numeric(df["value"], errors="coerce")
-    df = df.dropna(subset=["year","value"])
-    for col in ("state","county","indicator","unit"):
-        df[col] = df[col].astype(str).str.strip()
-        if col in ("state","county"): df[col] = df[col].str.title()
-    return df
+@profiled
+def enforce_schema(df: pd.DataFrame, issues: dict | None = None) -> pd.DataFrame:
+    try:
+        return core.enforce_schema(df, issues)
+    except core.SchemaError as e:
+        st.error(str(e)); st.stop()
 # ===== Local resource linker =====
 def local_resources(state: str, county: str) -> list[tuple[str,str,str]]:
     """
@@ -833,35 +1039,138 @@ def local_resources(state: str, county: str) -> list[tuple[str,str,str]]:
         ("🚍 Transportation", "211.org — Local transportation help", "https://www.211.org"),
         ("💼 Benefits", "Benefits.gov — Eligibility Finder", "https://www.benefits.gov/"),
     ]
-def safe_csv_bytes(df: pd.DataFrame) -> bytes:
-    def esc(x):
-        if isinstance(x,str) and x and x[0] in ("=","+","-","@"): return "'"+x
-        return x
-    return df.applymap(esc).to_csv(index=False).encode("utf-8")
-
-def zscore(s: pd.Series) -> pd.Series:
-    s = pd.to_numeric(s, errors="coerce").astype(float)
-    std = s.std(ddof=0) or 1.0
-    return (s - s.mean()) / std
-
-def derive_pivot(df_latest: pd.DataFrame) -> pd.DataFrame:
-    if df_latest is None or df_latest.empty: return pd.DataFrame()
-    return df_latest.pivot_table(index=["state","county","fips"],
-                                 columns="indicator", values="value", aggfunc="mean")
-
-def to_pdf_bytes(text: str, title="VitalView Report") -> bytes:
-    if canvas is None: return b""
-    buf = __import__("io").BytesIO()
-    c = canvas.Canvas(buf, pagesize=letter); w,h = letter
-    margin = 0.75*inch; y = h - margin
-    c.setTitle(title); c.setFont("Helvetica-Bold", 14); c.drawString(margin,y,title); y -= 0.35*inch
-    c.setFont("Helvetica",10); maxw = w-2*margin
-    for raw in text.replace("\r","").split("\n"):
-        if not raw.strip(): y -= 0.18*inch; continue
-        for line in simpleSplit(raw,"Helvetica",10,maxw):
-            if y < margin: c.showPage(); y = h-margin; c.setFont("Helvetica",10)
-            c.drawString(margin,y,line); y -= 0.16*inch
-    c.showPage(); c.save(); pdf = buf.getvalue(); buf.close(); return pdf
+# ===== CSV export (formula-injection safe; implementation in vitalview_core) =====
+from vitalview_core import (CSV_CHUNK_ROWS, escape_csv_text,
+                            iter_safe_csv, safe_csv_bytes)
+
+# ===== Columnar / spreadsheet export =====
+def _export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Flatten index levels (pivot: state/county/fips) into columns; column labels as str."""
+    if df is None:
+        return pd.DataFrame()
+    out = df.reset_index() if any(n is not None for n in df.index.names) else df.reset_index(drop=True)
+    if not all(isinstance(c, str) for c in out.columns):
+        out = out.rename(columns=str)
+    if out.columns.name is not None:
+        out = out.rename_axis(columns=None)
+    return out
+
+def to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    arrow = get_pyarrow()
+    if arrow is None: return b""
+    pa, pq, _ = arrow
+    table = pa.Table.from_pandas(_export_frame(df), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression="zstd")
+    return sink.getvalue().to_pybytes()
+
+def to_arrow_bytes(df: pd.DataFrame) -> bytes:
+    """Arrow IPC file (Feather v2)."""
+    arrow = get_pyarrow()
+    if arrow is None: return b""
+    pa, _, pa_feather = arrow
+    table = pa.Table.from_pandas(_export_frame(df), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    pa_feather.write_feather(table, sink, compression="zstd")
+    return sink.getvalue().to_pybytes()
+
+def to_xlsx_bytes(df: pd.DataFrame, sheet_name: str = "VitalView") -> bytes:
+    engine = get_xlsx_engine()
+    if engine is None: return b""
+    buf = io.BytesIO()
+    # Excel evaluates formulas too, so reuse the CSV escaping on text cells
+    with pd.ExcelWriter(buf, engine=engine) as xw:
+        escape_csv_text(_export_frame(df)).to_excel(xw, index=False, sheet_name=sheet_name[:31])
+    return buf.getvalue()
+
+# label -> (writer, extension, mime, install hint)
+EXPORT_FORMATS = {
+    "CSV":     (safe_csv_bytes,   "csv",     "text/csv", ""),
+    "Parquet": (to_parquet_bytes, "parquet", "application/vnd.apache.parquet", "pyarrow"),
+    "Arrow":   (to_arrow_bytes,   "arrow",   "application/vnd.apache.arrow.file", "pyarrow"),
+    "XLSX":    (to_xlsx_bytes,    "xlsx",    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "openpyxl"),
+}
+
+EXPORT_DEPS = {"pyarrow": get_pyarrow, "openpyxl": get_xlsx_engine}
+
+def export_buttons(df: pd.DataFrame, basename: str, label: str, key: str):
+    """Format picker + download button; callers gate on FEATURES["exports"]."""
+    fmt = st.radio(f"{label} format", list(EXPORT_FORMATS.keys()), horizontal=True, key=f"{key}_fmt")
+    writer, ext, mime, hint = EXPORT_FORMATS[fmt]
+    if not hint or EXPORT_DEPS[hint]() is not None:
+        # bytes are built only when the button is clicked, not on every rerun
+        st.download_button(f"⬇️ Download {label} ({fmt})", data=lambda: writer(df if fmt != "CSV" else _export_frame(df)),
+                           file_name=f"{basename}.{ext}", mime=mime, key=f"{key}_dl",
+                           on_click=audit, args=("export",), kwargs={"what": basename, "format": fmt, "rows": len(df)})
+    else:
+        st.info(f"Install {hint} to enable {fmt} export:  \n`pip install {hint}`")
+
+zscore = core.zscore
+
+# serial by default; VITALVIEW_PIVOT_WORKERS > 1 opts into a forkserver pool for tract-level years
+PIVOT_WORKERS = int(os.getenv("VITALVIEW_PIVOT_WORKERS", "1"))
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _partition_pivot(year: int, version: str, _rows: pd.DataFrame):
+    # tract-level years can be pivoted sharded by state across cores (once per partition version);
+    # a resource, so every session reads the same pivot instead of unpickling its own copy
+    return core.derive_pivot(_rows, sparse="auto", workers=PIVOT_WORKERS)
+
+@profiled
+def derive_pivot(df_latest: pd.DataFrame):
+    """Pivot a filtered single-year slice. The whole year's pivot is cached per partition version
+    (an append leaves untouched years cached) and sliced to the selected locations and indicators. Wide, gappy
+    indicator sets come back as a core.SparsePivot, which compute_priority_df scores as-is."""
+    yrs = df_latest["year"].unique() if not df_latest.empty else []
+    ver = DF_PARTS.get(int(yrs[0])) if len(yrs) == 1 else None
+    if ver is None:
+        return core.derive_pivot(df_latest, sparse="auto")
+    full = _partition_pivot(int(yrs[0]), ver, df[df["year"] == yrs[0]])
+    locs = pd.MultiIndex.from_frame(df_latest[["state","county","fips"]].drop_duplicates())
+    rows, cols = full.index.isin(locs), full.columns.isin(df_latest["indicator"].unique())
+    if isinstance(full, core.SparsePivot):
+        return full.select_columns(cols).select_rows(rows)
+    return full.loc[rows, cols].dropna(axis=1, how="all")
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _cached_pdf(content_hash: str, title: str, layout_version: int, _text: str, _subject: str, _plan: str) -> bytes:
+    # keyed on (content hash, title, layout version); the text itself is not re-hashed.
+    # Only a miss renders, so only a miss spends a PDF token.
+    with get_quota().guard(_subject, _plan, "pdf"):
+        return render_pdf(_text, title)[0]
+
+@profiled
+def to_pdf_bytes(text: str, title="VitalView Report") -> bytes | None:
+    """PDF bytes; None without ReportLab, b"" (after a warning) when over the PDF quota."""
+    if not pdf_available():
+        return None       # checked before the cache and the quota: an empty render costs nothing
+    try:
+        return _cached_pdf(*pdf_cache_key(text, title), text, quota_subject(), QUOTA_PLAN)
+    except QuotaExceeded as e:
+        st.warning(f"⏳ {e}")
+        return b""
+
+def to_pdf_bytes_many(docs: list, max_workers: int | None = None, pool=None) -> list[bytes]:
+    """Batch variant of to_pdf_bytes for (text, title) pairs, rendered across a process pool."""
+    return render_pdf_batch(docs, max_workers=max_workers, pool=pool)
+
+# ===== Background jobs (exports off the script thread) =====
+from vitalview_jobs import JobQueue
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    return JobQueue()
+
+def job_owner() -> str:
+    """Jobs follow the account across sessions; logged-out visitors get a per-session id."""
+    if st.session_state.get("user"):
+        return st.session_state.user["email"]
+    return "session:" + st.session_state.setdefault("job_sid", secrets.token_hex(8))
+
+def _job_safe_csv(fh, report, df: pd.DataFrame):
+    n_chunks = max(1, -(-len(df) // CSV_CHUNK_ROWS))
+    for i, data in enumerate(iter_safe_csv(df), start=1):
+        fh.write(data); report(i / n_chunks, f"{min(i * CSV_CHUNK_ROWS, len(df)):,} rows")
 
 # ----------------------------
 # Sidebar: About + Data
@@ -869,42 +1178,262 @@ def to_pdf_bytes(text: str, title="VitalView Report") -> bytes:
 with st.sidebar.expander("ℹ️ About VitalView", expanded=True):
     st.write("Visualize local health data, identify disparities, and export grant-ready narratives.")
 
+_PROF.mark("Data load")
 demo_mode = st.sidebar.checkbox("🧪 Demo Mode (sample data)", value=True)
-uploaded = st.sidebar.file_uploader("Upload CSV (state, county, fips, year, indicator, value, unit)",
-                                    type=["csv"], accept_multiple_files=False)
-
-df = enforce_schema(_make_sample()) if (demo_mode or uploaded is None) else enforce_schema(pd.read_csv(uploaded))
+uploaded = st.sidebar.file_uploader("Upload CSV(s) (state, county, fips, year, indicator, value, unit)",
+                                    type=["csv"], accept_multiple_files=True,
+                                    help="Add files to append to the dataset (e.g. next year's indicators).")
+conflict_policy = st.sidebar.selectbox("Duplicate (fips, year, indicator) rows", list(core.CONFLICT_POLICIES),
+                                       format_func=core.CONFLICT_POLICIES.get, key="conflict_policy")
+
+SHARED_DATASET_PATH = os.getenv("VITALVIEW_DATASET", "")
+
+def _dataset_entry(d: pd.DataFrame, parts: dict, geo, issues: dict | None = None, **extra) -> dict:
+    """Sorted frame plus what the filters need to slice it without copying, and its data-health
+    profile (computed here, once per ingest, so the panel never rescans the rows)."""
+    d = core.sort_dataset(d)
+    return {"df": d, "parts": parts, "geo": geo, "slices": core.state_slices(d),
+            "bytes": int(d.memory_usage(deep=True).sum()), "profile": core.profile_dataset(d, issues), **extra}
+
+@st.cache_resource(show_spinner=False)
+def get_shared_dataset() -> dict:
+    """The canonical dataset, held once per process and shared read-only by every session
+    ($VITALVIEW_DATASET when set, else the sample). Sessions get shallow copies (see below)."""
+    issues = {}
+    if SHARED_DATASET_PATH:
+        from vitalview_cli import read_dataset
+        d, rep = core.merge_datasets(None, read_dataset(SHARED_DATASET_PATH, issues), "last")
+        issues["duplicates"] = rep["duplicates"]
+        source = os.path.basename(SHARED_DATASET_PATH)
+    else:
+        d, source = core.enforce_schema(_make_sample(), issues), "sample"
+    return _dataset_entry(d, core.partition_versions(d), core.GeoHierarchy(d), issues, source=source)
+
+def shared_view() -> tuple:
+    # copy(deep=False) shares the column buffers; under copy-on-write a session that writes to its
+    # frame gets its own copy of that column, so the cached one is never modified
+    sh = get_shared_dataset()
+    return sh["df"].copy(deep=False), sh["parts"], sh["geo"], sh["slices"], sh["profile"]
+
+@st.cache_resource(show_spinner=False)
+def get_store() -> tuple:
+    """(DatasetStore, GeoHierarchy, profile) when $VITALVIEW_DATASET is a store directory written by
+    `vitalview_cli.py store`. Nothing is loaded up front: the Filters selections are pushed into
+    the Parquet scan (store_filters) and only matching rows are read."""
+    from vitalview_store import DatasetStore
+    store = DatasetStore(SHARED_DATASET_PATH)
+    return store, core.GeoHierarchy(store.locations()), store.profile()
+
+def base_view() -> tuple:
+    """(df, DF_PARTS, GEO, DF_SLICES, DF_PROFILE) for the shared dataset. For a store, df is None
+    and the Filters panel scans it instead."""
+    global STORE
+    if not os.path.isdir(SHARED_DATASET_PATH):
+        return shared_view()
+    STORE, geo, prof = get_store()
+    return None, STORE.parts, geo, {}, prof
+
+def ingest_uploads(files, policy: str) -> dict:
+    """Merge newly added files into st.session_state.dataset (one merge per file, in upload order).
+    Files already ingested are skipped; removing a file or changing the policy rebuilds from scratch."""
+    ids = [getattr(f, "file_id", None) or f"{f.name}:{f.size}" for f in files]
+    ds = st.session_state.get("dataset")
+    if ds is None or ds["policy"] != policy or not set(ds["files"]) <= set(ids):
+        ds = {"df": None, "parts": {}, "geo": None, "slices": {}, "bytes": 0, "profile": None, "issues": {},
+              "files": [], "policy": policy, "log": []}
+    merged = False
+    for f, fid in zip(files, ids):
+        if fid in ds["files"]: continue
+        f.seek(0)
+        issues = {}
+        new = enforce_schema(pd.read_csv(f, dtype=str), issues)   # text, so fips keeps leading zeros
+        try:
+            ds["df"], rep = core.merge_datasets(ds["df"], new, policy)
+            ds["parts"].update(core.partition_versions(ds["df"], rep["years"]))
+            ds["issues"] = core.combine_issues(ds["issues"], {**issues, "duplicates": rep["duplicates"]})
+            ds["log"].append({"file": f.name, **rep, "dropped": issues["dropped"]})
+            merged = True
+        except core.ConflictError as e:
+            ds["log"].append({"file": f.name, "error": str(e)})
+        ds["files"].append(fid)
+    if merged:   # group codes for every geography level and state slices, once per ingest
+        ds.update(_dataset_entry(ds["df"], ds["parts"], core.GeoHierarchy(ds["df"]), ds["issues"]))
+    st.session_state.dataset = ds
+    return ds
+
+STORE = None   # set by base_view when the shared dataset is a store
+if demo_mode or not uploaded:
+    df, DF_PARTS, GEO, DF_SLICES, DF_PROFILE = base_view()
+else:
+    _ds = ingest_uploads(uploaded, conflict_policy)
+    df, DF_PARTS, GEO, DF_SLICES, DF_PROFILE = (_ds["df"], _ds["parts"], _ds["geo"], _ds["slices"], _ds["profile"]) \
+        if _ds["df"] is not None else base_view()
+    with st.sidebar.expander(f"📥 Ingested {len(_ds['log'])} file(s) · {len(_ds['df'] if _ds['df'] is not None else []):,} rows",
+                             expanded=False):
+        for e in _ds["log"]:
+            if "error" in e:
+                st.error(f"{e['file']}: skipped — {e['error']}")
+            else:
+                yrs = f"{e['years'][0]}–{e['years'][-1]}" if len(e["years"]) > 1 else ", ".join(map(str, e["years"]))
+                st.caption(f"**{e['file']}** · {e['rows']:,} rows ({yrs}): {e['added']:,} new, "
+                           f"{e['updated']:,} updated, {e['duplicates']:,} in-file duplicates"
+                           + (f", {e['dropped']:,} dropped (blank or non-numeric year/value)" if e.get("dropped") else ""))
+
+def data_health_panel(prof: dict):
+    """Reads the profile built at ingestion (_dataset_entry); nothing here touches the rows."""
+    flagged = prof["dropped"] + prof["duplicates"] + prof["n_outliers"]
+    with st.sidebar.expander(f"🩺 Data health · {flagged:,} flagged" if flagged else "🩺 Data health"):
+        st.caption(f"{prof['rows']:,} of {prof['rows_in']:,} rows kept · {prof['dropped']:,} dropped "
+                   f"(blank or non-numeric year/value) · {prof['duplicates']:,} duplicate (fips, year, indicator) "
+                   f"rows · {prof['n_outliers']:,} outliers (|z| > {prof['z_max']:g} within indicator-year)")
+        cells = pd.DataFrame({"blank": prof["missing"], "not numeric": prof["coerced"]}).fillna(0).astype(int)
+        cells = cells[cells.sum(axis=1) > 0]
+        if not cells.empty:
+            st.markdown("**Problem cells**")
+            st.dataframe(cells, use_container_width=True)
+        if not prof["coverage"].empty:
+            st.markdown("**Coverage** — % of each year's locations reporting")
+            st.dataframe(prof["coverage"], use_container_width=True)
+        if prof["n_outliers"]:
+            shown = len(prof["outliers"])
+            st.markdown("**Outliers**" + (f" — largest {shown:,} of {prof['n_outliers']:,}" if shown < prof["n_outliers"] else ""))
+            st.dataframe(prof["outliers"], use_container_width=True, hide_index=True)
+
+if DF_PROFILE is not None:
+    data_health_panel(DF_PROFILE)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _rollup_partition(year: int, version: str, level: str, _rows: pd.DataFrame, _geo) -> pd.DataFrame:
+    return core.rollup(_rows, _geo, level)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _rollup_dataset(level: str, parts: tuple, _df: pd.DataFrame, _geo) -> tuple:
+    # per-year rollups are cached on their own, so an append only rolls up the new years;
+    # the assembled level is shared read-only like the base dataset
+    d = core.sort_dataset(pd.concat([_rollup_partition(y, v, level, _df[_df["year"] == y], _geo)
+                                     for y, v in parts], ignore_index=True))
+    return d, core.state_slices(d)
+
+def at_level(level: str):
+    """(df, DF_PARTS, DF_SLICES) at geography `level`, served from the rollup caches."""
+    if level == GEO.base:
+        return df, DF_PARTS, DF_SLICES
+    parts = tuple(sorted(DF_PARTS.items()))
+    d, slices = _rollup_dataset(level, parts, df, GEO)
+    return d.copy(deep=False), {y: f"{v}:{level}" for y, v in parts}, slices
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _store_scan(level: str, states: tuple, counties: tuple, years: tuple, indicators: tuple) -> tuple:
+    # shared read-only across sessions like the base dataset; counties are pushed down where the level's
+    # county labels are the stored ones, else matched after the rollup ("(statewide)", "ZIP …")
+    push = level in (GEO.base, "county")
+    d, m = STORE.scan(states, counties if push else None, years, indicators)
+    if level != GEO.base:
+        d = core.sort_dataset(core.rollup(d, GEO, level))
+    if counties and not push:
+        d = d[d["county"].isin(counties)].reset_index(drop=True)
+    return d, core.state_slices(d), m
+
+def _fmt_scan(m: dict) -> str:
+    return (f"{m['row_groups']:,}/{m['row_groups_total']:,} row groups in {m['files']}/{m['files_total']} year file(s), "
+            f"{m['bytes_read'] / 2**20:,.1f} of {m['bytes_total'] / 2**20:,.1f} MB, {m['rows']:,} rows")
+
+def store_filters(level: str) -> tuple:
+    """Filters panel over a dataset store: options come from the manifest and the geography, and the
+    selections become the scan's predicates. The national frame (national ranks, peers, hot spots) is
+    the latest selected year only. Returns (df, dfx, DF_PARTS, DF_SLICES, state_sel, county_sel)."""
+    groups = GEO.groups[level]
+    states = STORE.states
+    state_sel = st.multiselect("Select State(s)", states, default=states[:1])
+    in_states = groups[groups["state"].isin(state_sel)] if state_sel else groups
+    county_sel = st.multiselect("Select County(ies)", sorted(in_states["county"].unique().tolist()))
+    y_min, y_max = min(STORE.years), max(STORE.years)
+    if y_min != y_max:
+        years = st.slider("Year range", y_min, y_max, (y_min, y_max))
+    else:
+        years = (y_min, y_max); st.caption(f"Year: {y_min}")
+    ind_sel = st.multiselect("Select Indicator(s)", STORE.indicators, help="Leave empty for all indicators.")
+    dfx, _, m = _store_scan(level, tuple(state_sel), tuple(county_sel), tuple(years), tuple(ind_sel))
+    latest = int(dfx["year"].max()) if not dfx.empty else years[1]
+    d, slices, m_nat = _store_scan(level, (), (), (latest, latest), ())
+    st.caption(f"💽 Scanned {_fmt_scan(m)} · national {latest}: {_fmt_scan(m_nat)}")
+    parts = STORE.parts if level == GEO.base else {y: f"{v}:{level}" for y, v in STORE.parts.items()}
+    return d.copy(deep=False), dfx.copy(deep=False), parts, slices, state_sel, county_sel
 
 # ----------------------------
 # Filters
 # ----------------------------
+_PROF.mark("Filters")
 left, right = st.columns([1,3])
 with left:
     st.subheader("Filters")
-    states = sorted(df["state"].unique().tolist())
-    state_sel = st.multiselect("Select State(s)", states, default=states[:1])
-    dfx = df[df["state"].isin(state_sel)] if state_sel else df.copy()
-    counties = sorted(dfx["county"].unique().tolist())
-    county_sel = st.multiselect("Select County(ies)", counties)
-    if county_sel: dfx = dfx[dfx["county"].isin(county_sel)]
-    years = sorted(dfx["year"].unique().tolist())
-    if years:
-        y_min, y_max = int(min(years)), int(max(years))
-        if y_min != y_max:
-            yr_from, yr_to = st.slider("Year range", y_min, y_max, (y_min, y_max))
-            dfx = dfx[(dfx["year"]>=yr_from)&(dfx["year"]<=yr_to)]
-        else:
-            st.caption(f"Year: {y_min}")
+    if st.session_state.get("geo_level") not in GEO.levels:
+        st.session_state.pop("geo_level", None)
+    geo_level = st.selectbox("Geography", GEO.levels, format_func=core.GEO_LABELS.get, key="geo_level",
+                             help="Coarser levels are population-weighted rollups (plain means without a population column).") \
+        if len(GEO.levels) > 1 else GEO.base
+    if STORE is not None:
+        df, dfx, DF_PARTS, DF_SLICES, state_sel, county_sel = store_filters(geo_level)
+    else:
+        df, DF_PARTS, DF_SLICES = at_level(geo_level)
+        states = sorted(df["state"].unique().tolist())
+        state_sel = st.multiselect("Select State(s)", states, default=states[:1])
+        dfx = core.select_states(df, DF_SLICES, state_sel)   # row slices of df, not copies
+        counties = sorted(dfx["county"].unique().tolist())
+        county_sel = st.multiselect("Select County(ies)", counties)
+        if county_sel: dfx = dfx[dfx["county"].isin(county_sel)]
+        years = sorted(dfx["year"].unique().tolist())
+        if years:
+            y_min, y_max = int(min(years)), int(max(years))
+            if y_min != y_max:
+                yr_from, yr_to = st.slider("Year range", y_min, y_max, (y_min, y_max))
+                dfx = dfx[(dfx["year"]>=yr_from)&(dfx["year"]<=yr_to)]
+            else:
+                st.caption(f"Year: {y_min}")
+        ind_sel = st.multiselect("Select Indicator(s)", sorted(dfx["indicator"].unique().tolist()),
+                                 help="Leave empty for all indicators.")
+        if ind_sel: dfx = dfx[dfx["indicator"].isin(ind_sel)]
 
 # ----------------------------
 # Tabs
 # ----------------------------
-tab_overview, tab_trends, tab_priority, tab_reports, tab_resources, tab_actions, tab_map = st.tabs(
-    ["🏠 Overview","📈 Trends","🎯 Priority","📝 Reports","🌍 Resources","🤝 Community Actions","🗺️ Map"]
-)
+_PROF.mark(None)
+# Only the selected view's body runs on a rerun (st.tabs executes every tab). Each view is a
+# fragment where supported, so its own widgets (weight sliders, map drilldown, ...) rerun just
+# that view instead of the whole script.
+VIEWS = {"Overview":"🏠 Overview","Trends":"📈 Trends","Priority":"🎯 Priority","Reports":"📝 Reports",
+         "Resources":"🌍 Resources","Community Actions":"🤝 Community Actions","Map":"🗺️ Map",
+         "Grant Writer":"🧠 Grant Writer"}
+active_view = st.radio("View", list(VIEWS), format_func=VIEWS.get, horizontal=True,
+                       key="active_view", label_visibility="collapsed")
+VIEW_FUNCS = {}
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+def view(name: str):
+    """Register a view body; it is timed per run (see the timing panel) and profiled."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def run():
+            t0 = time.perf_counter()
+            with _PROF.section(f"view: {name}"):
+                fn()
+            _perf_log().setdefault("views_s", {}).setdefault(name, deque(maxlen=50)).append(time.perf_counter() - t0)
+        VIEW_FUNCS[name] = _fragment(run)
+        return VIEW_FUNCS[name]
+    return deco
+
+def default_weight(ind: str) -> float:
+    return 1.0 if "Food Desert" in ind or "PM2.5" in ind else 0.8
+
+def current_weights(columns) -> dict:
+    """Priority-slider weights for `columns`. Kept in session state (not only the widget keys,
+    which Streamlit drops while the Priority view is hidden) so every view scores the same way."""
+    saved = st.session_state.get("weights", {})
+    return {ind: float(saved.get(ind, default_weight(ind))) for ind in columns}
 
 # Overview
-with tab_overview:
+@view("Overview")
+def view_overview():
     st.subheader("Welcome")
     cA,cB,cC = st.columns(3)
     cA.metric("Rows available", f"{len(dfx):,}")
@@ -925,11 +1454,13 @@ with tab_overview:
         vals.append(float(s.mean()) if not s.empty else 0.0)
     arr = np.array(vals); arr = arr/arr.max() if arr.max()>0 else arr
     donut_df = pd.DataFrame({"pillar":pillars,"score":arr})
+    alt = get_altair()
     st.altair_chart(alt.Chart(donut_df).mark_arc(innerRadius=70, outerRadius=110)
                     .encode(theta="score:Q", color="pillar:N", tooltip=["pillar","score"]), use_container_width=True)
 
 # Trends
-with tab_trends:
+@view("Trends")
+def view_trends():
     st.subheader("Trends & Comparisons")
     indicators = sorted(dfx["indicator"].dropna().unique().tolist()) if not dfx.empty else []
     ind_sel = st.selectbox("Indicator", indicators if indicators else ["(none)"])
@@ -941,18 +1472,29 @@ with tab_trends:
         st.caption(f"{len(dfi):,} rows after filters")
 
 # Priority (equity-weighted)
-def compute_priority_df(pivot: pd.DataFrame, weights: dict) -> pd.DataFrame:
-    if pivot is None or pivot.empty: return pd.DataFrame()
-    z = pivot.apply(zscore, axis=0)
-    score = 0; used=[]
-    for lbl, w in weights.items():
-        col = next((c for c in z.columns if c.lower().startswith(lbl.lower())), None)
-        if col is not None:
-            score = score + w * z[col]; used.append(col)
-    out = z.copy(); out["E_Score"] = score; out["__used__"]=", ".join(used) if used else "(none)"
-    return out.reset_index().sort_values("E_Score", ascending=False)
-
-with tab_priority:
+compute_priority_df = profiled(core.compute_priority_df)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _metered_priority(scope: tuple, weights: tuple, _pivot, _subject: str, _plan: str) -> pd.DataFrame:
+    with get_quota().guard(_subject, _plan, "rescore"):
+        return core.compute_priority_df(_pivot, dict(weights))
+
+@profiled
+def score_priority(pivot, weights: dict, year: int, national: bool = False) -> pd.DataFrame:
+    """compute_priority_df for the filtered scope (or the whole year with `national`). Tables of
+    RESCORE_MIN_ROWS+ locations are cached per (scope, weights), and each new one spends a
+    re-scoring token; over quota, the view gets an empty table and a warning."""
+    if pivot.empty: return pd.DataFrame()
+    if pivot.shape[0] < RESCORE_MIN_ROWS: return compute_priority_df(pivot, weights)
+    scope = (year, DF_PARTS.get(year, ""), geo_level) + (("*",) if national else (tuple(state_sel), tuple(county_sel)))
+    try:
+        return _metered_priority(scope, tuple(sorted(weights.items())), pivot, quota_subject(), QUOTA_PLAN)
+    except QuotaExceeded as e:
+        st.warning(f"⏳ {e}")
+        return pd.DataFrame()
+
+@view("Priority")
+def view_priority():
     st.subheader("Equity-Weighted Priority Scoring")
     if dfx.empty:
         st.info("Upload data or enable Demo Mode.")
@@ -962,41 +1504,154 @@ with tab_priority:
         pivot = derive_pivot(df_latest)
 
         # auto sliders for found indicators
+        saved = current_weights(pivot.columns)
         weights = {}
         for ind in sorted(pivot.columns.tolist()):
             label = ind.split("(")[0].strip()
-            default = 1.0 if "Food Desert" in ind or "PM2.5" in ind else 0.8
-            weights[ind] = st.slider(f"{label}", 0.0, 2.0, float(default), 0.1, key=f"w_{ind}")
+            weights[ind] = st.slider(f"{label}", 0.0, 2.0, saved[ind], 0.1, key=f"w_{ind}")
+        st.session_state.setdefault("weights", {}).update(weights)
 
-        priority_df = compute_priority_df(pivot, weights) if not pivot.empty else pd.DataFrame()
+        priority_df = score_priority(pivot, weights, latest)
         if priority_df.empty:
             st.info("No priority table available. Adjust weights or data.")
         else:
             st.dataframe(priority_df.head(15), use_container_width=True)
             if FEATURES["exports"]:
-                st.download_button("⬇️ Download Priority (CSV)",
-                                   data=safe_csv_bytes(priority_df),
-                                   file_name="priority_list.csv", mime="text/csv")
+                export_buttons(priority_df, "priority_list", "Priority", key="exp_priority")
+                if st.button("🧵 Export Priority CSV in background", key="job_priority_csv"):
+                    audit("export_queued", what="priority_list", format="CSV", rows=len(priority_df), year=latest)
+                    get_job_queue().submit(job_owner(), "priority_csv", f"Priority list {latest} ({len(priority_df):,} rows)",
+                                           _job_safe_csv, priority_df.copy(),
+                                           file_name="priority_list.csv", mime="text/csv")
+                    st.success("Export queued — see 🧵 Background jobs in the sidebar.")
+                with st.expander("More exports (filtered data, pivot)"):
+                    export_buttons(dfx, "vitalview_filtered", "Filtered data", key="exp_dfx")
+                    if isinstance(pivot, core.SparsePivot):   # long form: the wide pivot would be mostly empty
+                        export_buttons(pivot.to_long(), f"vitalview_pivot_{latest}_long", "Pivot (long)", key="exp_pivot")
+                    else:
+                        export_buttons(pivot, f"vitalview_pivot_{latest}", "Pivot", key="exp_pivot")
+
+            peer_panel(priority_df, latest)
+
+        with st.expander("📊 Indicator coverage"):
+            cov = core.coverage_report(pivot)
+            n_loc, n_ind = pivot.shape
+            filled = int(cov["locations"].sum())
+            st.caption(f"{n_loc:,} locations × {n_ind:,} indicators · {filled / max(1, n_loc * n_ind):.0%} of cells reported"
+                       + (" · sparse pivot" if isinstance(pivot, core.SparsePivot) else ""))
+            st.dataframe(cov, use_container_width=True, hide_index=True)
+            st.caption("A location missing any weighted indicator gets no Equity Score.")
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_peer_index(year: int, version: str, _pivot: pd.DataFrame) -> core.PeerIndex:
+    """Rebuilt only when the year's partition (values or indicator set) changes; weights don't matter."""
+    return core.PeerIndex(_pivot)
+
+def peer_panel(priority_df: pd.DataFrame, year: int):
+    with st.expander("👥 Peer counties (similar indicator profile)"):
+        # peers come from every county in the dataset for this year, not just the filtered ones
+        index = get_peer_index(year, DF_PARTS.get(year, ""), derive_pivot(df[df["year"] == year]))
+        opts = priority_df[["state","county","fips"]].astype(str).drop_duplicates("fips")
+        names = dict(zip(opts["fips"], opts["county"] + ", " + opts["state"]))
+        c1, c2 = st.columns([3, 1])
+        pick = c1.selectbox("County", list(names), format_func=names.get, key="peer_pick")
+        k = c2.number_input("Peers", 1, 50, 10, key="peer_k")
+        if pick:
+            peers = index.query(pick, int(k))
+            st.dataframe(peers.drop(columns=["fips"]).round(3), use_container_width=True, hide_index=True)
+            st.caption(f"Nearest of {len(index):,} counties in {year} by Euclidean distance over "
+                       f"{len(index.indicators)} z-scored indicators (missing = average).")
 
 # Reports (narrative + PDF)
-with tab_reports:
+@view("Reports")
+def view_reports():
     st.subheader("Grant / Board Narrative")
     try:
         latest = int(dfx["year"].max())
         df_latest = dfx[dfx["year"]==latest]
         pivot = derive_pivot(df_latest)
-        if 'weights' not in locals() or not pivot.columns.tolist():
-            weights = {c:1.0 for c in pivot.columns}
-        pr = compute_priority_df(pivot, weights) if not pivot.empty else pd.DataFrame()
+        pr = score_priority(pivot, current_weights(pivot.columns), latest)
     except Exception:
         pr = pd.DataFrame()
+    nar = ""
+    if pr.empty:
+        st.info("Generate a Priority table first to draft a narrative.")
+    else:
+        top3 = ", ".join([f"{r.county} ({r.state})" for _, r in pr.head(3).iterrows()])
+        region = ", ".join(sorted(dfx['state'].unique().tolist()))
+        nar = (
+            f"In {latest}, VitalView’s equity-weighted scoring for {region} highlights top-need areas: {top3}. "
+            "Key drivers include food access, air quality, insurance coverage, mobility barriers, and lifestyle risks. "
+            "These insights support targeted outreach, program design, and funding allocation with measurable outcomes."
+        )
+        st.text(nar)
+
+        if FEATURES["exports"]:
+            st.download_button("⬇️ Download Narrative (TXT)", data=nar.encode("utf-8"),
+                               file_name=f"VitalView_Narrative_{latest}.txt", mime="text/plain")
+            pdf_bytes = to_pdf_bytes(nar, title="VitalView Narrative")
+            if pdf_bytes:
+                st.download_button("⬇️ Download Narrative (PDF)", data=pdf_bytes,
+                                   file_name=f"VitalView_Narrative_{latest}.pdf", mime="application/pdf")
+            elif pdf_bytes is None:
+                st.info("Install ReportLab for PDF export:  \n`pip install reportlab`")
+        else:
+            st.info("Exports are a Pro feature. Upgrade in the sidebar.")
+    # --- Save narrative to library ---
+    col_s1, col_s2 = st.columns([1,1])
+    with col_s1:
+        if st.button("💾 Save to Library", key="save_narrative", disabled=not nar):
+            try:
+                _save_narrative(nar, state_sel, county_sel)
+                st.success("Saved! See it in 'Saved Narratives' below.")
+            except Exception as e:
+                st.error(f"Could not save: {e}")
+    with col_s2:
+        if FEATURES.get("exports", False) and nar:
+            st.download_button(
+                "⬇️ Download Narrative (TXT)",
+                data=nar.encode("utf-8"),
+                file_name="VitalView_Narrative.txt",
+                mime="text/plain",
+                key="download_narrative_reports"
+            )
+
+    st.markdown("---")
+    st.subheader("🗂️ Saved Narratives")
+    if "narratives" in st.session_state and st.session_state.narratives:
+        # newest first
+        for i, entry in enumerate(reversed(st.session_state.narratives)):
+            idx = len(st.session_state.narratives) - 1 - i
+            st.markdown(f"**{entry['ts']}** — {', '.join(entry['counties']) or '(all counties)'}; {', '.join(entry['states']) or '(all states)'}")
+            st.text(entry["text"])
+
+            cc1, cc2, cc3 = st.columns([1,1,2])
+            with cc1:
+                st.download_button(
+                    "⬇️ Download TXT",
+                    data=entry["text"].encode("utf-8"),
+                    file_name=f"VitalView_Narrative_{entry['ts'].replace(':','-')}.txt",
+                    mime="text/plain",
+                    key=f"dl_saved_{idx}"
+                )
+            with cc2:
+                if st.button("🗑️ Delete", key=f"del_saved_{idx}"):
+                    try:
+                        remove_artifact("narratives", entry)
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Delete failed: {e}")
+            st.markdown("---")
+    else:
+        st.info("No saved narratives yet. Generate one above and click **Save to Library**.")
 # ----------------------------
 # U.S. Map (State-level choropleth by equity score)
 # ----------------------------
-with tab_map:
+@view("Map")
+def view_map():
     st.subheader("U.S. Equity Score Map (Latest Year)")
 
-    if 'dfx' not in locals() or dfx.empty:
+    if dfx.empty:
         st.info("Upload data or enable Demo Mode to see the map.")
     else:
         try:
@@ -1006,12 +1661,11 @@ with tab_map:
             # Pivot (wide) for scoring
             pivot_map = derive_pivot(df_latest_map)
 
-            # Weights: use current ones if they exist, else fallback to 1.0 each
-            if 'weights' not in locals() or not weights:
-                weights = {col: 1.0 for col in (pivot_map.columns if not pivot_map.empty else [])}
+            # Weights: the Priority sliders (defaults until they are moved)
+            weights = current_weights(pivot_map.columns)
 
             # Compute equity scores (E_Score) per county
-            priority_map = compute_priority_df(pivot_map, weights) if not pivot_map.empty else pd.DataFrame()
+            priority_map = score_priority(pivot_map, weights, latest_year)
 
             if priority_map.empty:
                 st.info("Not enough data to compute scores for the map.")
@@ -1023,7 +1677,7 @@ with tab_map:
                     .rename(columns={"E_Score": "equity_score"})
                 )
 
-                import altair as alt
+                alt = get_altair()
                 us_states_url = "https://cdn.jsdelivr.net/npm/us-atlas@3/states-10m.json"
                 states = alt.topo_feature(us_states_url, feature="states")
 
@@ -1068,109 +1722,130 @@ with tab_map:
                             columns={"E_Score": "Equity Score", "__used__": "Weighted Indicators"}
                         )
                         st.dataframe(top_view, use_container_width=True)
+
+                st.markdown("### 🔥 Hot spots (county neighbors)")
+                if st.toggle("Hot-spot mode", key="map_hotspots",
+                             help="Getis-Ord Gi* and local Moran's I over adjacent counties, nationally."):
+                    hot_spot_panel(latest_year, weights)
         except Exception as e:
             st.error(f"Map error: {e}")
+
+# ===== County neighbor graph + hot spots (implementation in vitalview_spatial) =====
+import vitalview_spatial as spatial
+
+ADJACENCY_RETRY_S = int(os.getenv("VITALVIEW_ADJACENCY_RETRY", "900"))   # back-off after a failed fetch
+
+@st.cache_resource
+def _adjacency_slot() -> dict:
+    return {"graph": None, "failed": None, "lock": threading.Lock()}
+
+def get_neighbor_graph():
+    """Bundled county adjacency (built from the us-atlas TopoJSON on first use if missing), or None.
+    A miss is remembered for ADJACENCY_RETRY_S so reruns don't each wait out the fetch timeout."""
+    slot = _adjacency_slot()
+    if slot["graph"] is not None:
+        return slot["graph"]
+    if slot["failed"] is not None and time.time() - slot["failed"] < ADJACENCY_RETRY_S:
+        return None
+    if not slot["lock"].acquire(blocking=False):
+        return None                       # another session is fetching it
+    try:
+        if slot["graph"] is None:
+            with st.spinner("Loading county adjacency…"):
+                slot["graph"] = spatial.load_adjacency()
+            slot["failed"] = None if slot["graph"] is not None else time.time()
+        return slot["graph"]
+    finally:
+        slot["lock"].release()
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _hot_spots(year: int, version: str, weights_key: tuple, _pr: pd.DataFrame) -> dict:
+    res = spatial.hot_spots(_pr, get_neighbor_graph())
+    return {k: res[k] for k in ("gi", "moran", "quadrant")} | {"isolates": int((res["graph"].degree == 0).sum())}
+
+def hot_spot_panel(year: int, weights: dict):
+    if geo_level != "county":
+        st.info("Hot spots use the county adjacency graph — switch Geography to County.")
+        return
+    graph = get_neighbor_graph()
+    if graph is None:
+        st.info("County adjacency isn't available. Build it once with  \n"
+                "`python vitalview_spatial.py build counties-10m.json` (us-atlas) or a Census county_adjacency.txt.")
+        return
+    # every county in the dataset for this year, not just the filtered ones: clusters need their neighbors
+    pivot = derive_pivot(df[df["year"] == year])
+    pr = score_priority(pivot, weights, year, national=True)
+    if pr.empty: return
+    res = _hot_spots(year, DF_PARTS.get(year, ""), tuple(sorted(weights.items())), pr)
+    gi, moran = res["gi"], res["moran"]
+    col = st.selectbox("Measure", list(gi.columns), key="hot_col",
+                       format_func=lambda c: "Equity Score" if c == "E_Score" else c)
+    base = pr.assign(fips=pr["fips"].astype(str)).drop_duplicates("fips").set_index("fips")
+    out = base[["state", "county"]].assign(value=base[col], gi_z=gi[col], hot_spot=spatial.hot_spot_labels(gi[col]),
+                                           local_moran_i=moran[col], quadrant=res["quadrant"][col]).reset_index()
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Hot-spot counties (95%+)", f"{int(out['hot_spot'].isin(['Hot spot (95%)', 'Hot spot (99%)']).sum()):,}")
+    c2.metric("Cold-spot counties (95%+)", f"{int(out['hot_spot'].isin(['Cold spot (95%)', 'Cold spot (99%)']).sum()):,}")
+    c3.metric("Counties without neighbors", f"{res['isolates']:,}")
+
+    alt = get_altair()
+    counties = alt.topo_feature("https://cdn.jsdelivr.net/npm/us-atlas@3/counties-10m.json", feature="counties")
+    hot_chart = (
+        alt.Chart(counties)
+        .mark_geoshape(stroke="white", strokeWidth=0.1)
+        .transform_lookup(lookup="id", from_=alt.LookupData(out, "fips", ["county", "state", "gi_z", "hot_spot"]))
+        .encode(
+            color=alt.Color("gi_z:Q", title="Gi* z", scale=alt.Scale(scheme="redblue", reverse=True, domainMid=0)),
+            tooltip=[alt.Tooltip("county:N"), alt.Tooltip("state:N"), alt.Tooltip("hot_spot:N", title="Class"),
+                     alt.Tooltip("gi_z:Q", title="Gi* z", format=".2f")],
+        )
+        .properties(height=520)
+        .project(type="albersUsa")
+    )
+    st.altair_chart(hot_chart, use_container_width=True)
+    st.caption(f"{year}, all {len(out):,} counties in the dataset (filters don't apply: a cluster needs its neighbors). "
+               "Gi* uses binary contiguity including the county itself; Moran's I uses row-standardized weights.")
+    sig = out[out["hot_spot"].str.startswith(("Hot", "Cold"))].sort_values("gi_z", ascending=False)
+    st.dataframe(sig.rename(columns={"value": col, "gi_z": "Gi* z", "hot_spot": "Class",
+                                     "local_moran_i": "Local Moran's I", "quadrant": "Quadrant"}),
+                 use_container_width=True, hide_index=True)
+    if FEATURES["exports"]:
+        export_buttons(sig, "vitalview_hot_spots", "Hot spots", key="exp_hot")
+
 # =========================
 # 🧠 AI Grant Writer (Data-Aware Draft) + 1-Click Polisher
 # =========================
-st.divider()
-st.subheader("🧠 AI Grant Writer (Data-Aware Draft)")
-
 # tiny helper to make quick trend blurbs
-def _trend_blurbs(df_scope: pd.DataFrame) -> list:
-    blurbs = []
-    if df_scope is None or df_scope.empty: 
-        return blurbs
-    years_sorted = sorted(pd.to_numeric(df_scope["year"], errors="coerce").dropna().unique().tolist())
-    slice_years = years_sorted[-3:] if len(years_sorted) >= 3 else years_sorted
-    d3 = df_scope[df_scope["year"].isin(slice_years)].copy()
-    for ind, sub in d3.groupby("indicator"):
-        try:
-            sub = sub.groupby("year", as_index=False)["value"].mean().sort_values("year")
-            if len(sub) >= 2:
-                delta = float(sub["value"].iloc[-1]) - float(sub["value"].iloc[0])
-                dirw = "increased" if delta > 0 else ("decreased" if delta < 0 else "held steady")
-                blurbs.append(f"{ind} {dirw} by {abs(delta):.1f} over {len(sub)} year(s).")
-        except Exception:
-            pass
-    return blurbs[:6]
-
-with st.form("ai_grant_writer_form"):
-    program_name = st.text_input("Program/Initiative Name", value="VitalView Community Health Initiative")
-    target_pop   = st.text_input("Target Population", value="Low-income residents in identified priority counties")
-    timeframe    = st.text_input("Timeframe", value="12 months")
-    geog_scope   = st.text_input("Geographic focus (optional)", value="")
-    focus_domains = st.multiselect(
-        "Focus Domains",
-        ["Food Access", "Environmental Health", "Healthcare Access", "Housing & Transportation", "Education & Outreach", "Behavioral Health"],
-        default=["Food Access","Healthcare Access","Housing & Transportation"]
-    )
-    outcomes_txt = st.text_area("SMART Outcomes (one per line)", value="Increase SNAP enrollment by 10%\nLaunch weekly mobile market in 2 neighborhoods\nEnroll 100 residents in lifestyle coaching")
-    include_stories = st.checkbox("Include recent Community Actions (stories)", value=True)
-    tone = st.selectbox("Tone", ["Neutral professional", "Equity-forward", "Impact-focused"], index=1)
-    build_ai = st.form_submit_button("🧠 Generate Draft")
+_trend_blurbs = core.trend_blurbs
 
-draft = ""
-if build_ai:
-    try:
-        # scope & latest
-        df_scope = dfx.copy() if ('dfx' in locals() and not dfx.empty) else df.copy()
-        latest_year = int(df_scope["year"].max()) if not df_scope.empty else None
-        piv = derive_pivot(df_scope[df_scope["year"] == latest_year]) if latest_year else derive_pivot(df_scope)
-
-        # weights fallback if none exist
-        if 'weights' not in locals() or not weights:
-            weights = {col: 1.0 for col in (piv.columns if not piv.empty else [])}
-
-        pr_df = compute_priority_df(piv, weights) if not piv.empty else pd.DataFrame()
-        top_list = ", ".join([f"{r.county} ({r.state})" for _, r in pr_df.head(3).iterrows()]) if not pr_df.empty else "priority areas identified"
-
-        used_cols = []
-        if "__used__" in pr_df.columns and not pr_df.empty and isinstance(pr_df["__used__"].iloc[0], str):
-            used_cols = [c.strip() for c in pr_df["__used__"].iloc[0].split(",") if c.strip()]
-        if not used_cols:
-            used_cols = list(piv.columns)[:5] if not piv.empty else []
-        drivers_text = ", ".join(used_cols) if used_cols else "multiple community determinants"
-
-        trends = _trend_blurbs(df_scope)
-        # (Optional) pull community actions from session storage
-        story_lines = []
-        if include_stories and "community_actions" in st.session_state and st.session_state.community_actions:
-            for s in st.session_state.community_actions[-3:]:
-                snippet = (s["story"][:220] + "…") if len(s["story"]) > 220 else s["story"]
-                story_lines.append(f"- {s['location']}: {snippet}")
-        if not story_lines:
-            story_lines = ["- (No community stories submitted yet)"]
-
-        outcomes_lines = [o.strip() for o in outcomes_txt.splitlines() if o.strip()]
-        domains_text = ", ".join(focus_domains) if focus_domains else "core equity domains"
-
-        if tone == "Neutral professional":
-            tone_intro = "This proposal presents a practical, data-driven plan to improve community health outcomes."
-        elif tone == "Impact-focused":
-            tone_intro = "This initiative is designed to deliver measurable improvements where the need is greatest."
-        else:  # Equity-forward
-            tone_intro = "Grounded in equity, this proposal centers communities experiencing disproportionate barriers."
-
-        draft = f"""
-{program_name} — Grant Draft
+# ===== Grant draft template (compiled once, shared by the form and batch mode) =====
+
+GRANT_TONE_INTROS = {
+    "Neutral professional": "This proposal presents a practical, data-driven plan to improve community health outcomes.",
+    "Impact-focused": "This initiative is designed to deliver measurable improvements where the need is greatest.",
+    "Equity-forward": "Grounded in equity, this proposal centers communities experiencing disproportionate barriers.",
+}
+
+GRANT_DRAFT_TEMPLATE = string.Template("""
+$program_name — Grant Draft
 
 Executive Summary
-{tone_intro} Using VitalView’s equity-weighted analysis, we identified top-need areas: {top_list}.
-We will deploy targeted interventions across {domains_text} with measurable outcomes over {timeframe}.
+$tone_intro Using VitalView’s equity-weighted analysis, we identified top-need areas: $top_list.
+We will deploy targeted interventions across $domains_text with measurable outcomes over $timeframe.
 
 Statement of Need
-VitalView synthesizes local indicators (e.g., {drivers_text}) to surface where resources can do the most good.
-{'Geographic scope: ' + geog_scope if geog_scope else ''}
+VitalView synthesizes local indicators (e.g., $drivers_text) to surface where resources can do the most good.
+$geog_line
 
 Recent Indicator Trends
-{chr(10).join(['- ' + t for t in trends]) if trends else '- Insufficient trend data; baseline profiles available.'}
+$trend_lines
 
 Community Voice
-{chr(10).join(story_lines)}
+$story_lines
 
 Target Population
-{target_pop}
+$target_pop
 
 Proposed Strategies
 - Data-informed outreach and enrollment navigation
@@ -1187,9 +1862,9 @@ Partnerships
 (Add/replace with named partners as appropriate.)
 
 SMART Outcomes
-{chr(10).join(['- ' + o for o in outcomes_lines]) if outcomes_lines else '- Add SMART outcomes here'}
+$outcome_lines
 
-Implementation Timeline ({timeframe})
+Implementation Timeline ($timeframe)
 - Phase 1: Launch outreach; finalize partners; baseline metrics
 - Phase 2: Program activation; midpoint evaluation; adjust targeting
 - Phase 3: Scale to additional neighborhoods; deepen case management
@@ -1206,38 +1881,83 @@ Budget & Sustainability (outline)
 - Data/evaluation (hosting, analytics, reporting)
 - Sustainability via payer/city partnerships and philanthropy
 
-Powered by VitalView — Community Health Dashboard (© {latest_year if latest_year else ''})
-"""
-        st.text(draft)
-
-        # downloads (Pro feature)
-        if FEATURES.get("exports", False):
-            st.download_button(
-                "⬇️ Download Draft (TXT)",
-                data=draft.encode("utf-8"),
-                file_name="VitalView_Grant_Draft.txt",
-                mime="text/plain",
-                key="download_ai_draft_txt"
-            )
-            pdf_ai = to_pdf_bytes(draft, title="VitalView — Grant Draft")
-            if pdf_ai:
-                st.download_button(
-                    "⬇️ Download Draft (PDF)",
-                    data=pdf_ai,
-                    file_name="VitalView_Grant_Draft.pdf",
-                    mime="application/pdf",
-                    key="download_ai_draft_pdf"
-                )
-            else:
-                st.info("Install ReportLab to enable PDF export:  \n`pip install reportlab`")
-        else:
-            st.info("Exports are a Pro feature. Upgrade in the sidebar to download.")
-    except Exception as e:
-        st.error(f"Grant Writer error: {e}")
+Powered by VitalView — Community Health Dashboard (© $year)
+""")
 
-# -------- 1-Click Polisher --------
-st.subheader("🪄 Polish This Draft (1-Click Formatter)")
+def render_grant_draft(program_name, tone, top_list, domains_text, timeframe, drivers_text,
+                       geog_scope, trends, story_lines, target_pop, outcomes_lines, latest_year) -> str:
+    return GRANT_DRAFT_TEMPLATE.substitute(
+        program_name=program_name,
+        tone_intro=GRANT_TONE_INTROS.get(tone, GRANT_TONE_INTROS["Equity-forward"]),
+        top_list=top_list, domains_text=domains_text, timeframe=timeframe, drivers_text=drivers_text,
+        geog_line=('Geographic scope: ' + geog_scope) if geog_scope else '',
+        trend_lines="\n".join('- ' + t for t in trends) if trends else '- Insufficient trend data; baseline profiles available.',
+        story_lines="\n".join(story_lines),
+        target_pop=target_pop,
+        outcome_lines="\n".join('- ' + o for o in outcomes_lines) if outcomes_lines else '- Add SMART outcomes here',
+        year=latest_year if latest_year else '',
+    )
 
+# -------- Batch drafts (Enterprise): one draft per county/state in scope --------
+def _story_lines(include: bool) -> list:
+    lines = []
+    if include and st.session_state.get("community_actions"):
+        for s in st.session_state.community_actions[-3:]:
+            snippet = (s["story"][:220] + "…") if len(s["story"]) > 220 else s["story"]
+            lines.append(f"- {s['location']}: {snippet}")
+    return lines or ["- (No community stories submitted yet)"]
+
+def iter_batch_drafts(df_scope: pd.DataFrame, pr_all: pd.DataFrame, level: str, common: dict):
+    """Yield (file stem, draft text) per county or state. Priority + trends are computed by the
+    caller once; each group's rows come from a single groupby pass over `df_scope`."""
+    keys = ["state", "county"] if level == "County" else ["state"]
+    for key, sub in df_scope.groupby(keys, sort=True):
+        key = key if isinstance(key, tuple) else (key,)
+        if level == "County":
+            state, county = key
+            rows = pr_all[(pr_all["state"] == state) & (pr_all["county"] == county)]
+            place = f"{county} ({state})"
+        else:
+            state, = key
+            rows = pr_all[pr_all["state"] == state]
+            place = state
+        top_list = ", ".join(f"{r.county} ({r.state})" for r in rows.head(3).itertuples()) or place
+        used = rows["__used__"].iloc[0] if not rows.empty else ""
+        drivers_text = used if used and used != "(none)" else "multiple community determinants"
+        text = render_grant_draft(top_list=top_list, drivers_text=drivers_text,
+                                  geog_scope=place, trends=_trend_blurbs(sub), **common)
+        stem = "_".join(str(k) for k in key).replace(" ", "_").replace("/", "-")
+        yield stem, text
+
+def write_batch_drafts_zip(fh, drafts, total: int, want_pdf: bool, batch_size: int = 50, progress=None) -> int:
+    """Write drafts into a ZIP at `fh`, `batch_size` at a time (PDFs rendered in parallel per batch)
+    so only one batch of texts/PDFs is held in memory. One render pool serves every batch.
+    Returns the number of drafts written."""
+    done = 0
+    with (pdf_pool() if want_pdf and total > 1 else nullcontext()) as pool, \
+         zipfile.ZipFile(fh, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        batch = []
+        def flush():
+            nonlocal done
+            pdfs = to_pdf_bytes_many([(t, "VitalView — Grant Draft") for (_, t) in batch], pool=pool) if want_pdf else []
+            for i, (stem, text) in enumerate(batch):
+                zf.writestr(f"txt/VitalView_Grant_Draft_{stem}.txt", text.encode("utf-8"))
+                if want_pdf and pdfs[i]:
+                    zf.writestr(f"pdf/VitalView_Grant_Draft_{stem}.pdf", pdfs[i])
+            done += len(batch); batch.clear()
+            if progress: progress(done, total)
+        for item in drafts:
+            batch.append(item)
+            if len(batch) >= batch_size: flush()
+        if batch: flush()
+    return done
+
+def _job_batch_drafts(fh, report, df_scope, pr_all, level, common, total, want_pdf, batch_size):
+    write_batch_drafts_zip(fh, iter_batch_drafts(df_scope, pr_all, level, common), total,
+                           want_pdf=want_pdf, batch_size=batch_size,
+                           progress=lambda d, t: report(d / max(t, 1), f"{d} / {t} drafts"))
+
+# -------- 1-Click Polisher helpers --------
 def _summarize_lines(text: str, max_chars: int = 1400) -> str:
     if not text: return ""
     t = " ".join(line.strip() for line in text.splitlines())
@@ -1255,89 +1975,216 @@ def _to_bullets(text: str, max_lines: int = 14) -> str:
             out.append("…"); break
     return "\n".join(out)
 
+GRANT_SECTION_HEADERS = ["Executive Summary","Statement of Need","Recent Indicator Trends",
+                         "Community Voice","Target Population","Proposed Strategies",
+                         "Partnerships","SMART Outcomes","Implementation Timeline",
+                         "Evaluation & Equity Monitoring","Budget & Sustainability"]
+_SECTION_RE = re.compile("|".join(re.escape(h) for h in GRANT_SECTION_HEADERS))
+
 def _sectionize(text: str) -> dict:
+    """Single pass over the draft: one precompiled regex per line instead of 11 substring checks.
+    Keys are the canonical header names, so "Implementation Timeline (12 months)" -> "Implementation Timeline"."""
     sections, current = {}, None
     for line in (text or "").splitlines():
         if line.strip() and not line.startswith(" "):
-            if any(h in line for h in ["Executive Summary","Statement of Need","Recent Indicator Trends",
-                                       "Community Voice","Target Population","Proposed Strategies",
-                                       "Partnerships","SMART Outcomes","Implementation Timeline",
-                                       "Evaluation & Equity Monitoring","Budget & Sustainability"]):
-                current = line.strip(); sections[current] = []; continue
+            m = _SECTION_RE.search(line)
+            if m:
+                current = m.group(0); sections[current] = []; continue
         if current: sections[current].append(line)
     return {k:"\n".join(v).strip() for k,v in sections.items()}
 
-polish_mode = st.selectbox(
-    "Audience / Style",
-    ["Board-ready Executive Summary","Clinic/Implementation Summary","Funder Narrative (Concise)","Bulleted Talking Points"],
-    index=0
-)
-polish_btn = st.button("✨ Polish Current Draft")
-
-if polish_btn:
-    if not draft:
-        st.warning("Generate a draft above first, then polish it.")
-    else:
-        secs = _sectionize(draft)
-        exsum = secs.get("Executive Summary","")
-        need  = secs.get("Statement of Need","")
-        strategies = secs.get("Proposed Strategies","")
-        outcomes  = secs.get("SMART Outcomes","")
-        timeline  = secs.get("Implementation Timeline","")
-        evalmon   = secs.get("Evaluation & Equity Monitoring","")
-
-        if polish_mode == "Board-ready Executive Summary":
-            polished = f"""Executive Summary (Board-ready)
-
-{_summarize_lines(exsum, 600)}
-
-Key Drivers & Need
-{_summarize_lines(need, 500)}
-
-Planned Actions
-{_to_bullets(strategies, 8)}
-
-SMART Outcomes
-{_to_bullets(outcomes, 6)}
-"""
-        elif polish_mode == "Clinic/Implementation Summary":
-            polished = f"""Clinic / Implementation Summary
-
-What We’ll Do (Action Steps)
-{_to_bullets(strategies, 10)}
-
-12-Month Timeline
-{_to_bullets(timeline, 8)}
-
-Evaluation & Reporting
-{_summarize_lines(evalmon, 400)}
-"""
-        elif polish_mode == "Funder Narrative (Concise)":
-            polished = f"""Funder Narrative (Concise)
-
-Need & Equity Rationale
-{_summarize_lines(need, 500)}
-
-Approach
-{_summarize_lines(strategies, 500)}
-
-Measurable Outcomes
-{_to_bullets(outcomes, 8)}
-"""
-        else:
-            polished = f"""Talking Points
+# style -> (title, [(block heading or None, draft section, formatter, limit), ...])
+POLISH_STYLES = {
+    "Board-ready Executive Summary": ("Executive Summary (Board-ready)", [
+        (None, "Executive Summary", _summarize_lines, 600),
+        ("Key Drivers & Need", "Statement of Need", _summarize_lines, 500),
+        ("Planned Actions", "Proposed Strategies", _to_bullets, 8),
+        ("SMART Outcomes", "SMART Outcomes", _to_bullets, 6),
+    ]),
+    "Clinic/Implementation Summary": ("Clinic / Implementation Summary", [
+        ("What We’ll Do (Action Steps)", "Proposed Strategies", _to_bullets, 10),
+        ("12-Month Timeline", "Implementation Timeline", _to_bullets, 8),
+        ("Evaluation & Reporting", "Evaluation & Equity Monitoring", _summarize_lines, 400),
+    ]),
+    "Funder Narrative (Concise)": ("Funder Narrative (Concise)", [
+        ("Need & Equity Rationale", "Statement of Need", _summarize_lines, 500),
+        ("Approach", "Proposed Strategies", _summarize_lines, 500),
+        ("Measurable Outcomes", "SMART Outcomes", _to_bullets, 8),
+    ]),
+    "Bulleted Talking Points": ("Talking Points", [
+        (None, "Executive Summary", _to_bullets, 6),
+        ("Need", "Statement of Need", _to_bullets, 6),
+        ("Actions", "Proposed Strategies", _to_bullets, 8),
+        ("Outcomes", "SMART Outcomes", _to_bullets, 6),
+    ]),
+}
 
-{_to_bullets(exsum, 6)}
+def polish_all(draft_text: str) -> dict:
+    """Parse once, render every audience style."""
+    secs = _sectionize(draft_text)
+    out = {}
+    for style, (title, blocks) in POLISH_STYLES.items():
+        parts = [((head + "\n") if head else "") + fmt(secs.get(sec, ""), limit) for (head, sec, fmt, limit) in blocks]
+        out[style] = title + "\n\n" + "\n\n".join(parts) + "\n"
+    return out
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _polish_cached(draft_hash: str, _draft_text: str) -> dict:
+    return polish_all(_draft_text)
+
+def polish_draft(draft_text: str, style: str) -> str:
+    """Cached by (draft hash, style): all styles are rendered on the first call for a draft."""
+    h = __import__("hashlib").sha256(draft_text.encode("utf-8")).hexdigest()
+    return _polish_cached(h, draft_text)[style]
+
+@view("Grant Writer")
+def view_grant_writer():
+    st.subheader("🧠 AI Grant Writer (Data-Aware Draft)")
+
+    with st.form("ai_grant_writer_form"):
+        program_name = st.text_input("Program/Initiative Name", value="VitalView Community Health Initiative")
+        target_pop   = st.text_input("Target Population", value="Low-income residents in identified priority counties")
+        timeframe    = st.text_input("Timeframe", value="12 months")
+        geog_scope   = st.text_input("Geographic focus (optional)", value="")
+        focus_domains = st.multiselect(
+            "Focus Domains",
+            ["Food Access", "Environmental Health", "Healthcare Access", "Housing & Transportation", "Education & Outreach", "Behavioral Health"],
+            default=["Food Access","Healthcare Access","Housing & Transportation"]
+        )
+        outcomes_txt = st.text_area("SMART Outcomes (one per line)", value="Increase SNAP enrollment by 10%\nLaunch weekly mobile market in 2 neighborhoods\nEnroll 100 residents in lifestyle coaching")
+        include_stories = st.checkbox("Include recent Community Actions (stories)", value=True)
+        tone = st.selectbox("Tone", ["Neutral professional", "Equity-forward", "Impact-focused"], index=1)
+        build_ai = st.form_submit_button("🧠 Generate Draft")
 
-Need
-{_to_bullets(need, 6)}
+    draft = ""
+    if build_ai and charge("grant_draft"):
+        try:
+            # scope & latest
+            df_scope = dfx if not dfx.empty else df   # read-only below
+            latest_year = int(df_scope["year"].max()) if not df_scope.empty else None
+            piv = derive_pivot(df_scope[df_scope["year"] == latest_year]) if latest_year else derive_pivot(df_scope)
+
+            weights = current_weights(piv.columns)
+
+            pr_df = compute_priority_df(piv, weights) if not piv.empty else pd.DataFrame()
+            top_list = ", ".join([f"{r.county} ({r.state})" for _, r in pr_df.head(3).iterrows()]) if not pr_df.empty else "priority areas identified"
+
+            used_cols = []
+            if "__used__" in pr_df.columns and not pr_df.empty and isinstance(pr_df["__used__"].iloc[0], str):
+                used_cols = [c.strip() for c in pr_df["__used__"].iloc[0].split(",") if c.strip()]
+            if not used_cols:
+                used_cols = list(piv.columns)[:5] if not piv.empty else []
+            drivers_text = ", ".join(used_cols) if used_cols else "multiple community determinants"
+
+            trends = _trend_blurbs(df_scope)
+            # (Optional) pull community actions from session storage
+            story_lines = _story_lines(include_stories)
+
+            outcomes_lines = [o.strip() for o in outcomes_txt.splitlines() if o.strip()]
+            domains_text = ", ".join(focus_domains) if focus_domains else "core equity domains"
+
+            draft = render_grant_draft(
+                program_name=program_name, tone=tone, top_list=top_list, domains_text=domains_text,
+                timeframe=timeframe, drivers_text=drivers_text, geog_scope=geog_scope, trends=trends,
+                story_lines=story_lines, target_pop=target_pop, outcomes_lines=outcomes_lines,
+                latest_year=latest_year,
+            )
+            st.text(draft)
 
-Actions
-{_to_bullets(strategies, 8)}
+            # downloads (Pro feature)
+            if FEATURES.get("exports", False):
+                st.download_button(
+                    "⬇️ Download Draft (TXT)",
+                    data=draft.encode("utf-8"),
+                    file_name="VitalView_Grant_Draft.txt",
+                    mime="text/plain",
+                    key="download_ai_draft_txt"
+                )
+                pdf_ai = to_pdf_bytes(draft, title="VitalView — Grant Draft")
+                if pdf_ai:
+                    st.download_button(
+                        "⬇️ Download Draft (PDF)",
+                        data=pdf_ai,
+                        file_name="VitalView_Grant_Draft.pdf",
+                        mime="application/pdf",
+                        key="download_ai_draft_pdf"
+                    )
+                elif pdf_ai is None:
+                    st.info("Install ReportLab to enable PDF export:  \n`pip install reportlab`")
+            else:
+                st.info("Exports are a Pro feature. Upgrade in the sidebar to download.")
+        except Exception as e:
+            st.error(f"Grant Writer error: {e}")
+
+    if FEATURES.get("batch_drafts", False):
+        with st.expander("📦 Batch drafts — one per county or state (Enterprise)"):
+            bc1, bc2, bc3 = st.columns(3)
+            batch_level = bc1.radio("One draft per", ["County", "State"], horizontal=True, key="batch_level")
+            batch_size  = bc2.number_input("Batch size", 10, 500, 50, 10, key="batch_size")
+            batch_pdf   = bc3.checkbox("Include PDFs", value=True, key="batch_pdf")
+            bb1, bb2 = st.columns(2)
+            batch_now = bb1.button("📦 Build ZIP", key="batch_build")
+            batch_bg  = bb2.button("🧵 Build in background", key="batch_build_bg")
+            if batch_now and not charge("batch"):
+                batch_now = False
+            if batch_now or batch_bg:
+                df_scope_b = dfx if not dfx.empty else df
+                latest_b = int(df_scope_b["year"].max())
+                piv_b = derive_pivot(df_scope_b[df_scope_b["year"] == latest_b])
+                w_b = current_weights(piv_b.columns)
+                pr_all = compute_priority_df(piv_b, w_b) if not piv_b.empty else pd.DataFrame(columns=["state","county","__used__"])
+                common = dict(
+                    program_name=program_name, tone=tone, target_pop=target_pop, timeframe=timeframe,
+                    domains_text=", ".join(focus_domains) if focus_domains else "core equity domains",
+                    story_lines=_story_lines(include_stories),
+                    outcomes_lines=[o.strip() for o in outcomes_txt.splitlines() if o.strip()],
+                    latest_year=latest_b,
+                )
+                keys_b = ["state", "county"] if batch_level == "County" else ["state"]
+                total_b = int(df_scope_b[keys_b].drop_duplicates().shape[0])
+            if batch_bg:
+                get_job_queue().submit(
+                    job_owner(), "batch_drafts", f"Grant drafts by {batch_level} ({total_b})",
+                    _job_with_quota, get_quota(), quota_subject(), QUOTA_PLAN, "batch",
+                    _job_batch_drafts, df_scope_b, pr_all, batch_level, common, total_b, batch_pdf, int(batch_size),
+                    file_name=f"VitalView_Grant_Drafts_by_{batch_level}.zip", mime="application/zip")
+                st.success("Batch queued — see 🧵 Background jobs in the sidebar.")
+            elif batch_now:
+                bar = st.progress(0.0, text=f"0 / {total_b} drafts")
+                buf = io.BytesIO()
+                n_b = write_batch_drafts_zip(
+                    buf, iter_batch_drafts(df_scope_b, pr_all, batch_level, common), total_b,
+                    want_pdf=batch_pdf, batch_size=int(batch_size),
+                    progress=lambda d, t: bar.progress(d / max(t, 1), text=f"{d} / {t} drafts"),
+                )
+                st.session_state.batch_zip = {"data": buf.getvalue(), "count": n_b, "level": batch_level}
+            bz = st.session_state.get("batch_zip")
+            if bz and "data" in bz:
+                st.download_button(f"⬇️ Download {bz['count']} drafts (ZIP)", data=bz["data"],
+                                   file_name=f"VitalView_Grant_Drafts_by_{bz['level']}.zip",
+                                   mime="application/zip", key="batch_zip_dl")
+
+    # -------- 1-Click Polisher --------
+    st.subheader("🪄 Polish This Draft (1-Click Formatter)")
+
+    if draft:
+        st.session_state.last_draft = draft
+    current_draft = draft or st.session_state.get("last_draft", "")
+
+    polish_mode = st.selectbox(
+        "Audience / Style",
+        list(POLISH_STYLES.keys()),
+        index=0
+    )
+    polish_btn = st.button("✨ Polish Current Draft")
+    if polish_btn and current_draft:
+        st.session_state.polish_for = current_draft
 
-Outcomes
-{_to_bullets(outcomes, 6)}
-"""
+    if polish_btn and not current_draft:
+        st.warning("Generate a draft above first, then polish it.")
+    elif current_draft and st.session_state.get("polish_for") == current_draft:
+        # once polished, switching style re-renders straight from the cache
+        polished = polish_draft(current_draft, polish_mode)
 
         st.text(polished)
         if FEATURES.get("exports", False):
@@ -1357,13 +2204,12 @@ Outcomes
                     mime="application/pdf",
                     key="download_polished_draft_pdf"
                 )
-            else:
+            elif pdf_polished is None:
                 st.info("Install ReportLab to enable PDF export:  \n`pip install reportlab`")
         else:
             st.info("Exports are a Pro feature. Upgrade in the sidebar to download.")
+
 # ---------- Resources Tab (Smart, Need-Based) ----------
-# Local directory (uploaded CSV first, then built-in, then national)
-st.markdown("### 📍 Local Programs (based on your State/County)")
 # ---------- Helper: local resource lookup ----------
 def local_resources(state: str, county: str) -> list:
     """
@@ -1410,7 +2256,8 @@ def local_resources(state: str, county: str) -> list:
     return results
 
 # ---------- Resources Tab (Smart, Need-Based) ----------
-with tab_resources:
+@view("Resources")
+def view_resources():
     st.subheader("🌍 Community Health Resources")
 
     # --- Emergency banner ---
@@ -1476,11 +2323,12 @@ with tab_resources:
 
     st.info("Tip: adjust **State/County** filters to update local links. Use the keywords box to refine searches (e.g., 'utility shutoff', 'opioid', 'dental clinic').")
 # ---------- Community Actions Tab ----------
-with tab_actions:
+@view("Community Actions")
+def view_community_actions():
     st.subheader("🤝 Community Actions & Local Insights")
     st.markdown("Share real projects or observations that match what you see in the data.")
 
-    # in-memory store (resets on app restart)
+    # saved through the state backend (per account; per browser session when logged out)
     if "community_actions" not in st.session_state:
         st.session_state.community_actions = []
 
@@ -1494,7 +2342,7 @@ with tab_actions:
         story = st.text_area("Describe your initiative or observation")
         submitted = st.form_submit_button("📤 Submit Story")
     if submitted and story.strip():
-        st.session_state.community_actions.append({
+        add_artifact("community_actions", {
             "name": name or "Anonymous",
             "location": location or "Unknown",
             "category": category,
@@ -1516,76 +2364,51 @@ _Category:_ **{entry['category']}**
     else:
         st.info("No community stories yet. Be the first to contribute!")
     st.caption("VitalView connects insight to action — share these with clients, students, or partners.")
-    if pr.empty:
-        st.info("Generate a Priority table first to draft a narrative.")
-    else:
-        top3 = ", ".join([f"{r.county} ({r.state})" for _, r in pr.head(3).iterrows()])
-        region = ", ".join(sorted(dfx['state'].unique().tolist()))
-        nar = (
-            f"In {latest}, VitalView’s equity-weighted scoring for {region} highlights top-need areas: {top3}. "
-            "Key drivers include food access, air quality, insurance coverage, mobility barriers, and lifestyle risks. "
-            "These insights support targeted outreach, program design, and funding allocation with measurable outcomes."
-        )
-        st.text(nar)
+# ----------------------------
+# Render the selected view (the only one that runs this rerun)
+# ----------------------------
+VIEW_FUNCS[active_view]()
 
-        if FEATURES["exports"]:
-            st.download_button("⬇️ Download Narrative (TXT)", data=nar.encode("utf-8"),
-                               file_name=f"VitalView_Narrative_{latest}.txt", mime="text/plain")
-            pdf_bytes = to_pdf_bytes(nar, title="VitalView Narrative")
-            if pdf_bytes:
-                st.download_button("⬇️ Download Narrative (PDF)", data=pdf_bytes,
-                                   file_name=f"VitalView_Narrative_{latest}.pdf", mime="application/pdf")
-            else:
-                st.info("Install ReportLab for PDF export:  \n`pip install reportlab`")
-        else:
-            st.info("Exports are a Pro feature. Upgrade in the sidebar.")
-# --- Save narrative to library ---
-col_s1, col_s2 = st.columns([1,1])
-with col_s1:
-    if st.button("💾 Save to Library", key="save_narrative"):
-        try:
-            _save_narrative(nar, state_sel if 'state_sel' in locals() else [], county_sel if 'county_sel' in locals() else [])
-            st.success("Saved! See it in 'Saved Narratives' below.")
-        except Exception as e:
-            st.error(f"Could not save: {e}")
-with col_s2:
-    if FEATURES.get("exports", False):
-        st.download_button(
-            "⬇️ Download Narrative (TXT)",
-            data=nar.encode("utf-8"),
-            file_name="VitalView_Narrative.txt",
-            mime="text/plain",
-            key="download_narrative_reports"
-        )
+# ----------------------------
+# Sidebar: Background jobs
+# ----------------------------
+with st.sidebar.expander("🧵 Background jobs"):
+    jobs = get_job_queue().list_jobs(job_owner())
+    if not jobs:
+        st.caption("No jobs yet. Large exports can run here without freezing the page.")
+    if any(j["status"] in ("queued", "running") for j in jobs):
+        st.button("🔄 Refresh", key="jobs_refresh")
+    for j in jobs:
+        st.markdown(f"**#{j['id']} {j['label']}** — _{j['status']}_")
+        if j["status"] in ("queued", "running"):
+            st.progress(float(j["progress"] or 0.0), text=j["message"] or None)
+        elif j["status"] == "done" and j["result_path"] and os.path.exists(j["result_path"]):
+            with open(j["result_path"], "rb") as fh:
+                st.download_button("⬇️ Download", data=fh, file_name=j["file_name"], mime=j["mime"], key=f"job_dl_{j['id']}",
+                                   on_click=audit, args=("export",), kwargs={"what": j["kind"], "job": j["id"]})
+        elif j["status"] == "failed":
+            st.caption(j["message"])
+        if j["status"] in ("done", "failed") and st.button("🗑️ Remove", key=f"job_rm_{j['id']}"):
+            get_job_queue().delete(j["id"], job_owner())
+            st.rerun()
+# ----------------------------
+# Sidebar: Startup / rerun timing
+# ----------------------------
+with st.sidebar.expander("⏱️ Startup & rerun timing"):
+    perf = _perf_log()
+    reruns = sorted(perf["reruns_s"])
+    st.metric("Cold start (first run in this process)",
+              f"{perf['cold_start_s']:.2f}s" if perf["cold_start_s"] is not None else "— (this run)")
+    if reruns:
+        st.metric("Warm rerun (median)", f"{reruns[len(reruns)//2]*1000:.0f} ms",
+                  help=f"p95 {reruns[min(len(reruns)-1, int(len(reruns)*0.95))]*1000:.0f} ms over the last {len(reruns)} reruns")
+    if perf.get("views_s"):
+        st.caption("View render (median): " + ", ".join(
+            f"{k} {sorted(v)[len(v)//2]*1000:.0f} ms" for k, v in perf["views_s"].items() if v))
+    if perf["imports_s"]:
+        st.caption("Deferred imports (first use): " +
+                   ", ".join(f"{k} {v*1000:.0f} ms" for k, v in perf["imports_s"].items()))
 
-st.markdown("---")
-st.subheader("🗂️ Saved Narratives")
-if "narratives" in st.session_state and st.session_state.narratives:
-    # newest first
-    for i, entry in enumerate(reversed(st.session_state.narratives)):
-        idx = len(st.session_state.narratives) - 1 - i
-        st.markdown(f"**{entry['ts']}** — {', '.join(entry['counties']) or '(all counties)'}; {', '.join(entry['states']) or '(all states)'}")
-        st.text(entry["text"])
-
-        cc1, cc2, cc3 = st.columns([1,1,2])
-        with cc1:
-            st.download_button(
-                "⬇️ Download TXT",
-                data=entry["text"].encode("utf-8"),
-                file_name=f"VitalView_Narrative_{entry['ts'].replace(':','-')}.txt",
-                mime="text/plain",
-                key=f"dl_saved_{idx}"
-            )
-        with cc2:
-            if st.button("🗑️ Delete", key=f"del_saved_{idx}"):
-                try:
-                    del st.session_state.narratives[idx]
-                    st.experimental_rerun()
-                except Exception as e:
-                    st.error(f"Delete failed: {e}")
-        st.markdown("---")
-else:
-    st.info("No saved narratives yet. Generate one above and click **Save to Library**.")
 # ----------------------------
 # Footer
 # ----------------------------
@@ -1596,3 +2419,110 @@ st.markdown("""
 <i>Empowering data-driven wellness and equity-based action.</i>
 </div>
 """, unsafe_allow_html=True)
+
+# ----------------------------
+# Admin: per-section rerun profiler
+# ----------------------------
+def is_admin() -> bool:
+    u = st.session_state.get("user")
+    return bool(u and u["email"].strip().lower() in ADMIN_EMAILS)
+
+def process_rss() -> int:
+    """Resident set size of this server process in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"): return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource, sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def active_sessions() -> int | None:
+    try:
+        from streamlit.runtime import get_instance
+        return get_instance()._session_mgr.num_active_sessions()
+    except Exception:
+        return None
+
+# one (time, sessions, RSS) sample per run, for the memory report
+_n_sessions = active_sessions()
+_perf_log()["memory"].append((time.time(), _n_sessions, process_rss()))
+
+if is_admin():
+    with st.sidebar.expander("🧠 Memory (admin)"):
+        mem = pd.DataFrame(list(_perf_log()["memory"]), columns=["ts", "sessions", "rss"]).dropna()
+        own = st.session_state.get("dataset") or {}
+        c1, c2 = st.columns(2)
+        c1.metric("Process RSS", f"{process_rss() / 2**20:,.0f} MB")
+        c2.metric("Active sessions", _n_sessions if _n_sessions is not None else "—")
+        if os.path.isdir(SHARED_DATASET_PATH):
+            ss = get_store()[0].stats()
+            st.caption(f"Dataset store ({os.path.basename(SHARED_DATASET_PATH.rstrip('/'))}): "
+                       f"{ss['bytes_total'] / 2**20:,.1f} MB on disk, {ss['scans']:,} scans read "
+                       f"{ss['bytes_read'] / 2**20:,.1f} MB / {ss['rows_read']:,} rows for {ss['rows']:,} matches. "
+                       f"This session's uploads: {own.get('bytes', 0) / 2**20:,.1f} MB.")
+        else:
+            sh = get_shared_dataset()
+            st.caption(f"Shared dataset ({sh['source']}): {len(sh['df']):,} rows, {sh['bytes'] / 2**20:,.1f} MB, "
+                       f"held once for all sessions. This session's uploads: {own.get('bytes', 0) / 2**20:,.1f} MB.")
+        if not mem.empty:
+            mem = mem.assign(rss_mb=mem["rss"] / 2**20).groupby("sessions", as_index=False)["rss_mb"].max()
+            st.line_chart(mem, x="sessions", y="rss_mb")
+            st.caption("Peak RSS (MB) seen at each concurrent-session count, from recent runs.")
+
+    with st.sidebar.expander("📜 Audit log (admin)"):
+        log = get_audit()
+        # include this run's events, but don't wait on a writer that is failing and backing off
+        errs = log.stats()["errors"]
+        if errs == st.session_state.get("audit_errors_seen", errs):
+            log.flush(0.05)
+        st.session_state.audit_errors_seen = errs
+        a1, a2 = st.columns(2)
+        audit_hours = a1.selectbox("Period", [1, 24, 168, 720], index=1, key="audit_hours",
+                                   format_func=lambda h: {1: "Last hour", 24: "Last day", 168: "Last week", 720: "Last 30 days"}[h])
+        audit_who = a2.text_input("User contains", key="audit_actor")
+        audit_kinds = st.multiselect("Events", log.kinds(), key="audit_kinds")
+        ev = pd.DataFrame(log.query(audit_kinds, audit_who, since=time.time() - audit_hours * 3600, limit=1000),
+                          columns=["id", "ts", "kind", "actor", "details"])
+        ev["ts"] = pd.to_datetime(ev["ts"], unit="s").dt.strftime("%Y-%m-%d %H:%M:%S")
+        st.dataframe(ev.drop(columns="id"), use_container_width=True, hide_index=True)
+        s_ = log.stats()
+        st.caption(f"{len(ev):,} event(s) shown (newest first, max 1,000). Buffer: {s_['queued']:,}/{s_['max_queue']:,} "
+                   f"({s_['policy']}), {s_['written']:,} written in {s_['batches']:,} batches, {s_['dropped']:,} dropped"
+                   + (f", {s_['errors']} write errors" if s_["errors"] else "") + ".")
+        if not ev.empty:
+            st.download_button("⬇️ Download events (CSV)", data=ev.to_csv(index=False).encode("utf-8"),
+                               file_name="vitalview_audit.csv", mime="text/csv", key="audit_dl")
+
+if is_admin():
+    with st.sidebar.expander("🛠️ Rerun profiler (admin)"):
+        st.checkbox("Profile each rerun", key="profiler_on",
+                    help="Times every tab body and the hot helpers. Takes effect from the next rerun.")
+        st.checkbox("Append traces to file", key="profiler_dump", help=PROFILE_TRACE_PATH)
+        if _PROF.enabled:
+            _PROF.mark(None)
+            total = time.perf_counter() - _RUN_T0
+            prof_df = pd.DataFrame(sorted(_PROF.records, key=lambda r: r["t0"]))
+            if not prof_df.empty:
+                prof_df["section"] = ["· " * d + n for n, d in zip(prof_df["section"], prof_df["depth"])]
+                prof_df["ms"] = (prof_df["s"] * 1000).round(1)
+                prof_df["% run"] = (prof_df["s"] / total * 100).round(1)
+                st.caption(f"This run: {total*1000:.0f} ms (nested rows are included in their parent)")
+                st.dataframe(prof_df[["section", "ms", "% run"]], use_container_width=True, hide_index=True)
+            if st.session_state.get("profiler_dump"):
+                with open(PROFILE_TRACE_PATH, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps({"ts": time.time(), "user": st.session_state.user["email"],
+                                         "total_s": total, "sections": _PROF.records}) + "\n")
+            if os.path.exists(PROFILE_TRACE_PATH):
+                with open(PROFILE_TRACE_PATH, "rb") as fh:
+                    st.download_button("⬇️ Download traces (JSONL)", data=fh,
+                                       file_name="vitalview_traces.jsonl", mime="application/json")
+
+# record this run's wall time (shown in the timing panel on the next run)
+_run_s = time.perf_counter() - _RUN_T0
+if _perf_log()["cold_start_s"] is None:
+    _perf_log()["cold_start_s"] = _run_s
+else:
+    _perf_log()["reruns_s"].append(_run_s)
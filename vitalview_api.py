@@ -0,0 +1,208 @@
+# vitalview_api.py — VitalView read-only HTTP API (stdlib only, no Streamlit)
+# Run: python vitalview_api.py data.csv --port 8765
+#   GET /v1/health
+#   GET /v1/priority?year=2024&limit=50&state=Illinois&weights=Food%20Desert:1.5,PM2.5:1
+#   GET /v1/county/<fips>?year=2024&weights=...
+#   GET /v1/trends/<fips>?indicator=Obesity%20(%25)
+# Responses carry an ETag derived from (dataset version, normalized request); repeat requests with
+# If-None-Match get 304. Scored tables and response bodies are cached per dataset version.
+
+import os, sys, json, hashlib, threading
+from collections import OrderedDict
+from typing import NamedTuple
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+import pandas as pd
+
+import vitalview_core as core
+from vitalview_cli import read_dataset
+
+class LRU:
+    """Small thread-safe LRU dict."""
+    def __init__(self, maxsize: int):
+        self.maxsize, self._d, self._lock = maxsize, OrderedDict(), threading.Lock()
+    def get(self, key):
+        with self._lock:
+            if key not in self._d: return None
+            self._d.move_to_end(key); return self._d[key]
+    def put(self, key, value):
+        with self._lock:
+            self._d[key] = value; self._d.move_to_end(key)
+            while len(self._d) > self.maxsize: self._d.popitem(last=False)
+
+def parse_weights(spec: str) -> tuple:
+    """"Food Desert:1.5,PM2.5:1" -> (("Food Desert", 1.5), ("PM2.5", 1.0)) — sorted, hashable."""
+    out = []
+    for part in (spec or "").split(","):
+        if ":" in part:
+            k, v = part.rsplit(":", 1)
+            out.append((k.strip(), float(v)))
+    return tuple(sorted(out))
+
+class NotFound(LookupError):
+    """Unknown year/state/county in a request (404 with this message)."""
+
+class Snapshot(NamedTuple):
+    """One dataset version. refresh() swaps the whole snapshot, so a request never mixes versions."""
+    version: str
+    df: pd.DataFrame
+    years: list
+    states: frozenset
+
+class ScoreStore:
+    """Dataset + caches. The dataset version is the file's content hash (for a store directory,
+    a hash of its manifest's partition versions); the data is re-read (and every cache entry
+    naturally misses) when the file's or manifest's mtime/size changes."""
+    def __init__(self, path: str, cache_size: int = 256):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stat = None
+        self.snap = None
+        self.tables = LRU(64)           # (version, weights, year) -> priority DataFrame
+        self.bodies = LRU(cache_size)   # (version, request key) -> JSON bytes
+        self.refresh()
+
+    def refresh(self):
+        if os.path.isdir(self.path):
+            from vitalview_store import MANIFEST
+            src = os.path.join(self.path, MANIFEST)
+        else:
+            src = self.path
+        st = os.stat(src)
+        stat = (st.st_mtime_ns, st.st_size)
+        if stat == self._stat: return
+        with self._lock:
+            if stat == self._stat: return
+            with open(src, "rb") as fh:
+                raw = fh.read()
+            if src != self.path:
+                raw = json.dumps(json.loads(raw)["parts"], sort_keys=True).encode()
+            version = hashlib.sha256(raw).hexdigest()[:16]
+            df = read_dataset(self.path)
+            self.snap = Snapshot(version, df, sorted(int(y) for y in df["year"].unique()),
+                                 frozenset(df["state"].unique()))
+            self._stat = stat
+
+    def priority(self, snap: Snapshot, weights: tuple, year: int) -> pd.DataFrame:
+        key = (snap.version, weights, year)
+        pr = self.tables.get(key)
+        if pr is None:
+            pr = core.score_years(snap.df, dict(weights), [year])
+            self.tables.put(key, pr)
+        return pr
+
+def _check_year(snap: Snapshot, year: int):
+    if year not in snap.years:
+        span = f"{snap.years[0]}–{snap.years[-1]}" if snap.years else "none"
+        raise NotFound(f"no data for year {year} (available: {span})")
+
+def _records(df: pd.DataFrame) -> list:
+    return json.loads(df.to_json(orient="records", force_ascii=False))
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"     # keep-alive for dashboards polling many endpoints
+    disable_nagle_algorithm = True    # headers and body go out in separate writes; avoid delayed-ACK stalls
+    store: ScoreStore = None
+
+    def log_message(self, fmt, *args):
+        if os.getenv("VITALVIEW_API_LOG"): super().log_message(fmt, *args)
+
+    def _send(self, code: int, body: bytes = b"", etag: str | None = None):
+        self.send_response(code)
+        if etag: self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")      # clients revalidate with If-None-Match
+        if code != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and code != 304: self.wfile.write(body)
+
+    def _error(self, code: int, msg: str):
+        self._send(code, json.dumps({"error": msg}).encode("utf-8"))
+
+    def do_GET(self):
+        store = self.store
+        store.refresh()
+        snap = store.snap                 # this request's dataset version, whatever refresh does next
+        url = urlsplit(self.path)
+        q = dict(parse_qsl(url.query))
+        parts = [p for p in url.path.split("/") if p]
+        try:
+            weights = parse_weights(q.get("weights", ""))
+            year = int(q["year"]) if q.get("year") else snap.years[-1]
+        except (ValueError, IndexError):
+            return self._error(400, "bad year/weights")
+
+        # normalized request -> ETag (computed before any work, so 304s are nearly free)
+        req_key = (tuple(parts), tuple(sorted((k, v) for k, v in q.items() if k not in ("weights", "year"))), weights, year)
+        etag = '"' + hashlib.sha1(repr((snap.version, req_key)).encode()).hexdigest()[:20] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, etag=etag)
+        body = store.bodies.get((snap.version, req_key))
+        if body is None:
+            try:
+                payload = self._payload(snap, parts, q, weights, year)
+            except NotFound as e:
+                return self._error(404, e.args[0])
+            except ValueError as e:
+                return self._error(400, str(e))
+            if payload is None:
+                return self._error(404, "unknown endpoint")
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            store.bodies.put((snap.version, req_key), body)
+        self._send(200, body, etag)
+
+    def _payload(self, snap: Snapshot, parts, q, weights, year):
+        store = self.store
+        if parts == ["v1", "health"]:
+            return {"version": snap.version, "years": snap.years, "rows": int(len(snap.df))}
+        if parts == ["v1", "priority"]:
+            _check_year(snap, year)
+            limit = int(q.get("limit", 50))
+            pr = store.priority(snap, weights, year)
+            if q.get("state"):
+                state = q["state"].strip().title()
+                if state not in snap.states: raise NotFound(f"unknown state {q['state']!r}")
+                pr = pr[pr["state"] == state]
+            cols = ["rank", "state", "county", "fips", "E_Score"]
+            return {"version": snap.version, "year": year, "total": int(len(pr)),
+                    "used": pr["__used__"].iloc[0] if len(pr) else "(none)",
+                    "items": _records(pr.head(limit)[cols])}
+        if len(parts) == 3 and parts[:2] == ["v1", "county"]:
+            _check_year(snap, year)
+            pr = store.priority(snap, weights, year)
+            row = pr[pr["fips"].astype(str) == parts[2]]
+            if row.empty: raise NotFound(f"no county {parts[2]} in {year}")
+            raw = snap.df[(snap.df["fips"].astype(str) == parts[2]) & (snap.df["year"] == year)]
+            return {"version": snap.version, "year": year, "of": int(len(pr)),
+                    "score": _records(row.drop(columns=["__used__"]))[0],
+                    "values": _records(raw.groupby("indicator", as_index=False)["value"].mean())}
+        if len(parts) == 3 and parts[:2] == ["v1", "trends"]:
+            d = snap.df[snap.df["fips"].astype(str) == parts[2]]
+            if d.empty: raise NotFound(f"no county {parts[2]}")
+            if q.get("indicator"): d = d[d["indicator"] == q["indicator"]]
+            series = d.groupby(["indicator", "year"], as_index=False)["value"].mean()
+            return {"version": snap.version, "fips": parts[2],
+                    "series": {ind: _records(g[["year", "value"]]) for ind, g in series.groupby("indicator")}}
+        return None
+
+def serve(path: str, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    Handler.store = ScoreStore(path)
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    return httpd
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="VitalView priority-score HTTP API")
+    ap.add_argument("dataset", help="dataset (.csv or .parquet) in the upload schema, or a store directory")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+    httpd = serve(args.dataset, args.host, args.port)
+    print(f"VitalView API on http://{args.host}:{args.port} (dataset {Handler.store.snap.version})", file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
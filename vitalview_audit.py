@@ -0,0 +1,150 @@
+# vitalview_audit.py — VitalView audit/event log (write-behind to SQLite, no Streamlit)
+# log() only appends to a bounded in-memory buffer; a background thread writes batches in one
+# transaction. When the buffer is full the backpressure policy decides what gives:
+#   drop_oldest  keep the newest events (default)      drop_new  keep what's already buffered
+#   block        wait up to block_s for room, then drop the new event
+# Dropped events are counted (stats()), never raised: auditing must not break a login or an export.
+
+import os, json, time, atexit, sqlite3, threading, traceback
+from collections import deque
+
+AUDIT_DB_PATH = os.getenv("VITALVIEW_AUDIT_DB", "vitalview_audit.db")
+POLICIES = ("drop_oldest", "drop_new", "block")
+
+class AuditLog:
+    def __init__(self, db_path: str = AUDIT_DB_PATH, max_queue: int = 10_000, batch_size: int = 500,
+                 flush_s: float = 1.0, policy: str = "drop_oldest", block_s: float = 0.05):
+        if policy not in POLICIES: raise ValueError(f"policy must be one of {POLICIES}")
+        self.db_path, self.max_queue, self.batch_size = db_path, max_queue, batch_size
+        self.flush_s, self.policy, self.block_s = flush_s, policy, block_s
+        self._wake_at = max(1, min(batch_size, max_queue))   # buffer length that triggers an early write
+        self._buf = deque()
+        self._cv = threading.Condition()
+        self._in_flight = 0
+        self._flush_req = False
+        self._closed = False
+        self._stats = {"logged": 0, "written": 0, "dropped": 0, "batches": 0, "errors": 0,
+                       "last_batch": 0, "last_write_ms": 0.0}
+        self._init_db()
+        self._thread = threading.Thread(target=self._writer, name="vitalview-audit", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _conn(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS events(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL,
+                kind TEXT,
+                actor TEXT,
+                details TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS events_ts ON events(ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS events_kind ON events(kind, ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS events_actor ON events(actor, ts)")
+        conn.commit(); conn.close()
+
+    # ---- hot path ----
+    def log(self, kind: str, actor: str = "", **details) -> bool:
+        """Buffer one event; False if the backpressure policy dropped it."""
+        row = (time.time(), kind, actor or "", json.dumps(details, default=str) if details else "{}")
+        with self._cv:
+            if self._closed: return False
+            if len(self._buf) >= self.max_queue:
+                if self.policy == "drop_oldest":
+                    self._buf.popleft(); self._stats["dropped"] += 1
+                elif self.policy == "block" and self._cv.wait_for(lambda: len(self._buf) < self.max_queue, self.block_s):
+                    pass
+                else:
+                    self._stats["dropped"] += 1
+                    return False
+            self._buf.append(row)
+            self._stats["logged"] += 1
+            if len(self._buf) >= self._wake_at: self._cv.notify_all()
+        return True
+
+    # ---- writer ----
+    def _writer(self):
+        while True:
+            with self._cv:
+                self._cv.wait_for(lambda: self._closed or self._flush_req or len(self._buf) >= self._wake_at, self.flush_s)
+                batch = [self._buf.popleft() for _ in range(min(self.batch_size, len(self._buf)))]
+                if not self._buf: self._flush_req = False
+                self._in_flight = len(batch)
+                self._cv.notify_all()               # room for blocked producers
+                if not batch and self._closed: return
+            if not batch: continue
+            t0 = time.perf_counter()
+            try:
+                conn = self._conn()
+                with conn:
+                    conn.executemany("INSERT INTO events(ts,kind,actor,details) VALUES(?,?,?,?)", batch)
+                conn.close()
+                ok = True
+            except sqlite3.Error:
+                traceback.print_exc()
+                ok = False
+            with self._cv:
+                if ok:
+                    self._stats["written"] += len(batch); self._stats["batches"] += 1
+                    self._stats["last_batch"] = len(batch)
+                    self._stats["last_write_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+                else:
+                    # put the batch back (oldest first) within the queue bound, and back off
+                    self._stats["errors"] += 1
+                    room = max(0, self.max_queue - len(self._buf))
+                    self._stats["dropped"] += len(batch) - min(room, len(batch))
+                    self._buf.extendleft(reversed(batch[-room:] if room else []))
+                self._in_flight = 0
+                self._cv.notify_all()
+            if not ok: time.sleep(min(self.flush_s * 5, 5.0))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything logged so far is written (True) or `timeout` passes (False)."""
+        with self._cv:
+            self._flush_req = True
+            self._cv.notify_all()
+            return self._cv.wait_for(lambda: not self._buf and not self._in_flight, timeout)
+
+    def close(self, timeout: float = 5.0):
+        with self._cv:
+            if self._closed: return
+            self._closed = True
+            self._cv.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._cv:
+            return {**self._stats, "queued": len(self._buf) + self._in_flight, "max_queue": self.max_queue,
+                    "policy": self.policy}
+
+    # ---- reads ----
+    def query(self, kinds=None, actor: str | None = None, since: float | None = None,
+              until: float | None = None, limit: int = 500) -> list[dict]:
+        """Newest first. `actor` matches as a case-insensitive substring."""
+        where, args = [], []
+        if kinds:
+            where.append(f"kind IN ({','.join('?' * len(kinds))})"); args += list(kinds)
+        if actor:
+            where.append("actor LIKE ?"); args.append(f"%{actor.strip().lower()}%")
+        if since is not None:
+            where.append("ts >= ?"); args.append(since)
+        if until is not None:
+            where.append("ts < ?"); args.append(until)
+        sql = "SELECT id, ts, kind, actor, details FROM events" + (" WHERE " + " AND ".join(where) if where else "")
+        conn = self._conn(); conn.row_factory = sqlite3.Row
+        rows = conn.execute(sql + " ORDER BY ts DESC, id DESC LIMIT ?", (*args, limit)).fetchall()
+        conn.close()
+        return [dict(r) for r in rows]
+
+    def kinds(self) -> list[str]:
+        conn = self._conn()
+        out = [r[0] for r in conn.execute("SELECT DISTINCT kind FROM events ORDER BY kind")]
+        conn.close()
+        return out
@@ -0,0 +1,112 @@
+# vitalview_bench.py — VitalView micro-benchmarks on synthetic data
+# Run:     python vitalview_bench.py --sizes demo,state,national --out bench.json
+# Compare: python vitalview_bench.py --sizes national --compare bench.json
+# Times the hot data helpers from vitalview_core (+ PDF rendering) across dataset sizes.
+
+import io, os, sys, json, time, platform, statistics
+import pandas as pd
+import numpy as np
+
+import vitalview_core as core
+from vitalview_pdf import render_pdf
+
+# name -> make_synthetic kwargs (None = the app's built-in demo sample)
+SIZES = {
+    "demo":     None,
+    "state":    dict(n_counties=102, n_indicators=5, n_years=6),
+    "national": dict(n_counties=core.US_COUNTY_COUNT, n_indicators=5, n_years=6),
+    "wide":     dict(n_counties=core.US_COUNTY_COUNT, n_indicators=60, n_years=6, missing_frac=0.3),
+    "gappy":    dict(n_counties=core.US_COUNTY_COUNT, n_indicators=300, n_years=2, missing_frac=0.9),
+    "tracts":   dict(n_counties=core.US_COUNTY_COUNT, tracts_per_county=27, n_indicators=5, n_years=6),
+}
+
+def _time(fn, repeats: int) -> dict:
+    runs = []
+    for _ in range(repeats):
+        t0 = time.perf_counter(); fn(); runs.append(time.perf_counter() - t0)
+    return {"median_s": round(statistics.median(runs), 6), "min_s": round(min(runs), 6), "repeats": repeats}
+
+def bench_size(name: str, repeats: int = 5, missing_frac: float | None = None, dup_frac: float | None = None) -> list[dict]:
+    spec = SIZES[name]
+    if spec is None:
+        raw = core.make_sample()
+    else:
+        spec = dict(spec)
+        if missing_frac is not None: spec["missing_frac"] = missing_frac
+        if dup_frac is not None: spec["dup_frac"] = dup_frac
+        raw = core.make_synthetic(**spec)
+
+    df = core.enforce_schema(raw)
+    latest = df[df["year"] == df["year"].max()]
+    pivot = core.derive_pivot(latest)
+    weights = {c: 1.0 for c in pivot.columns}
+    pr = core.compute_priority_df(pivot, weights)
+    sparse = core.derive_pivot(latest, sparse=True)
+    res_csv = core.make_synthetic_resources(df).to_csv(index=False).encode("utf-8")
+    top = "\n".join(f"{r.county} ({r.state}): {r.E_Score:.2f}" for r in pr.head(500).itertuples())
+    report_text = f"Priority report — {name}\n\n{top}"
+    peers = core.PeerIndex(pivot)
+    probe = str(pr["fips"].iloc[0])
+
+    cases = {
+        "enforce_schema":           lambda: core.enforce_schema(raw),
+        "profile_dataset":          lambda: core.profile_dataset(df),
+        "derive_pivot":             lambda: core.derive_pivot(latest),
+        "compute_priority_df":      lambda: core.compute_priority_df(pivot, weights),
+        "derive_pivot_sparse":      lambda: core.derive_pivot(latest, sparse=True),
+        "compute_priority_sparse":  lambda: core.compute_priority_df(sparse, weights),
+        "safe_csv_bytes":           lambda: core.safe_csv_bytes(pr),
+        "load_local_resources_csv": lambda: core.load_local_resources_csv(io.BytesIO(res_csv)),
+        "to_pdf_bytes":             lambda: render_pdf(report_text, "VitalView Benchmark"),
+        "peer_index_build":         lambda: core.PeerIndex(pivot),
+        "peer_query":               lambda: peers.query(probe, 10),
+    }
+    meta = {"size": name, "raw_rows": len(raw), "locations": int(pivot.shape[0]), "indicators": int(pivot.shape[1])}
+    out = []
+    for func, fn in cases.items():
+        r = _time(fn, repeats)
+        out.append({**meta, "func": func, **r})
+        print(f"{name:>9} {func:<26} median {r['median_s']*1000:9.1f} ms   min {r['min_s']*1000:9.1f} ms", file=sys.stderr)
+    return out
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(), "platform": platform.platform(),
+        "pandas": pd.__version__, "numpy": np.__version__, "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(current: list[dict], baseline_path: str, threshold: float = 1.2) -> list[str]:
+    """Lines for (size, func) pairs that got slower than `threshold`× the baseline median."""
+    with open(baseline_path, encoding="utf-8") as fh:
+        base = {(r["size"], r["func"]): r for r in json.load(fh)["results"]}
+    lines = []
+    for r in current:
+        b = base.get((r["size"], r["func"]))
+        if not b or not b["median_s"]: continue
+        ratio = r["median_s"] / b["median_s"]
+        flag = "REGRESSION" if ratio > threshold else ("faster" if ratio < 1 / threshold else "")
+        lines.append(f"{r['size']:>9} {r['func']:<26} {ratio:6.2f}x  {flag}")
+    return lines
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="VitalView micro-benchmarks")
+    ap.add_argument("--sizes", default="demo,state,national", help=f"comma list of {', '.join(SIZES)}")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--missing", type=float, default=None, help="override missing_frac")
+    ap.add_argument("--dups", type=float, default=None, help="override dup_frac")
+    ap.add_argument("--out", default="vitalview_bench.json")
+    ap.add_argument("--compare", default=None, help="baseline JSON from an earlier run")
+    args = ap.parse_args()
+
+    results = []
+    for name in [s.strip() for s in args.sizes.split(",") if s.strip()]:
+        if name not in SIZES:
+            ap.error(f"unknown size {name!r}")
+        results.extend(bench_size(name, args.repeats, args.missing, args.dups))
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump({"env": environment(), "results": results}, fh, indent=2)
+    print(f"wrote {args.out}", file=sys.stderr)
+    if args.compare:
+        print("\n".join(compare(results, args.compare)))
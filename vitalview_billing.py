@@ -0,0 +1,352 @@
+# vitalview_billing.py — VitalView Stripe checkout + webhook plan sync (no Streamlit)
+# Checkout sessions are created off the script thread (timeouts, retry with backoff, one idempotency key
+# per cached session) and reused per (email, price) until they expire. Plan changes come only from
+# Stripe webhooks: events are verified, queued in SQLite by id, and applied once each.
+# Webhook receiver (point the Stripe dashboard / `stripe listen --forward-to` here):
+#   python vitalview_billing.py webhook --port 8767 --users-db vitalview_users.db
+# Local testing without Stripe: run stripe-mock and set STRIPE_API_BASE=http://localhost:12111, then
+#   python vitalview_billing.py simulate --email you@example.org --plan pro    # signed test event
+
+import os, sys, json, time, hmac, random, sqlite3, hashlib, threading, traceback
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BILLING_DB_PATH = os.getenv("VITALVIEW_BILLING_DB", "vitalview_billing.db")
+STRIPE_TIMEOUT_S = float(os.getenv("STRIPE_TIMEOUT_S", "10"))
+STRIPE_RETRIES = int(os.getenv("STRIPE_RETRIES", "3"))
+CHECKOUT_TTL_S = 3600          # Stripe's minimum is 30 minutes; reused until a minute before expiry
+PENDING_STALE_S = 120
+PROCESSING_STALE_S = 300       # a claimed event older than this was dropped by a crashed replica; re-queue it
+EVENT_MAX_ATTEMPTS = 5
+_RETRYABLE = ("APIConnectionError", "RateLimitError", "APIError")
+
+def configure_stripe(stripe, api_key: str, api_base: str | None = None,
+                     timeout: float = STRIPE_TIMEOUT_S):
+    """API key, optional base URL (stripe-mock) and a bounded HTTP timeout. Retries are done by
+    Billing._create, so the library's own retry loop is switched off."""
+    stripe.api_key = api_key
+    if api_base: stripe.api_base = api_base.rstrip("/")
+    stripe.max_network_retries = 0
+    client = getattr(stripe, "RequestsClient", None) or getattr(getattr(stripe, "http_client", None), "RequestsClient", None)
+    if client is not None:
+        try:
+            stripe.default_http_client = client(timeout=timeout)
+        except Exception:
+            pass   # requests missing: the library falls back to its urllib client (no per-call timeout)
+    return stripe
+
+def call_with_retry(fn, retries: int = STRIPE_RETRIES, base_delay: float = 0.5, sleep=time.sleep):
+    """fn() with exponential backoff and jitter on network, rate-limit and 5xx errors; others raise at once."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries or type(e).__name__ not in _RETRYABLE: raise
+            sleep(base_delay * 2 ** attempt * (0.5 + random.random()))
+
+# ----------------------------
+# Webhook signatures (Stripe's scheme, so verification doesn't need the stripe package)
+# ----------------------------
+class SignatureError(ValueError):
+    pass
+
+def sign_payload(payload: bytes, secret: str, ts: int | None = None) -> str:
+    ts = int(ts if ts is not None else time.time())
+    mac = hmac.new(secret.encode(), f"{ts}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={ts},v1={mac}"
+
+def verify_signature(payload: bytes, header: str, secret: str, tolerance: int = 300):
+    parts = [p.split("=", 1) for p in (header or "").split(",") if "=" in p]
+    ts = next((v for k, v in parts if k == "t"), None)
+    sigs = [v for k, v in parts if k == "v1"]
+    if not ts or not sigs or not ts.isdigit():
+        raise SignatureError("malformed Stripe-Signature header")
+    want = hmac.new(secret.encode(), f"{ts}.".encode() + payload, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(want, s) for s in sigs):
+        raise SignatureError("signature mismatch")
+    if abs(time.time() - int(ts)) > tolerance:
+        raise SignatureError("timestamp outside tolerance")
+
+def checkout_completed_event(email: str, plan: str, session_id: str = "", event_id: str | None = None) -> dict:
+    """A checkout.session.completed event in Stripe's shape (demo button and `simulate`)."""
+    now = int(time.time())
+    return {"id": event_id or f"evt_local_{hashlib.sha1(f'{email}{plan}{time.time_ns()}'.encode()).hexdigest()[:20]}",
+            "object": "event", "type": "checkout.session.completed", "created": now,
+            "data": {"object": {"id": session_id or "cs_local", "object": "checkout.session",
+                                "customer_email": email, "client_reference_id": email,
+                                "metadata": {"email": email, "plan": plan}}}}
+
+def users_db_plan_setter(users_db: str, audit=None):
+    """apply_plan(email, plan) for the app's users table (used by the standalone webhook receiver);
+    changes are recorded in `audit` (a vitalview_audit.AuditLog) when given."""
+    def apply_plan(email: str, plan: str):
+        conn = sqlite3.connect(users_db, timeout=10)
+        old = conn.execute("SELECT plan FROM users WHERE email=?", (email,)).fetchone()
+        conn.execute("UPDATE users SET plan=? WHERE email=?", (plan, email))
+        conn.commit(); conn.close()
+        if audit is not None:
+            audit.log("plan_change", email.strip().lower(), old=old[0] if old else None, new=plan, source="stripe webhook")
+    return apply_plan
+
+class Billing:
+    """
+    Checkout-session cache and webhook event queue, both in SQLite so every replica shares them.
+    One instance per process (the app holds it with st.cache_resource).
+    """
+    def __init__(self, db_path: str = BILLING_DB_PATH, max_workers: int = 2):
+        self.db_path = db_path
+        self._init_db()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vitalview-stripe")
+
+    def _conn(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkout_sessions(
+                email TEXT,
+                price TEXT,
+                plan TEXT,
+                status TEXT,
+                session_id TEXT,
+                url TEXT,
+                idem_key TEXT,
+                error TEXT DEFAULT '',
+                expires INTEGER,
+                created INTEGER,
+                PRIMARY KEY(email, price)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS webhook_events(
+                id TEXT PRIMARY KEY,
+                type TEXT,
+                created INTEGER,
+                payload TEXT,
+                status TEXT DEFAULT 'queued',
+                attempts INTEGER DEFAULT 0,
+                result TEXT DEFAULT '',
+                received INTEGER,
+                claimed INTEGER DEFAULT 0
+            )
+        """)
+        if "claimed" not in {r[1] for r in conn.execute("PRAGMA table_info(webhook_events)")}:
+            conn.execute("ALTER TABLE webhook_events ADD COLUMN claimed INTEGER DEFAULT 0")   # older databases
+        conn.execute("CREATE INDEX IF NOT EXISTS webhook_events_status ON webhook_events(status, created)")
+        conn.commit(); conn.close()
+
+    # ---- checkout sessions ----
+    def checkout(self, stripe, email: str, price: str, plan: str, success_url: str, cancel_url: str) -> dict:
+        """The cached session for (email, price) if it is still usable; otherwise start creating one
+        in the background and return the 'pending' record. Never blocks on Stripe."""
+        now = int(time.time())
+        conn = self._conn(); conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM checkout_sessions WHERE email=? AND price=?", (email, price)).fetchone()
+            # a 'pending' row older than the worst-case retry time was lost to a restart: create anew
+            if row and ((row["status"] == "pending" and row["created"] > now - PENDING_STALE_S)
+                        or (row["status"] == "open" and row["expires"] > now + 60)):
+                conn.execute("COMMIT")
+                return dict(row)
+            idem = "vv-checkout-" + hashlib.sha256(f"{email}|{price}|{time.time_ns()}".encode()).hexdigest()[:32]
+            conn.execute("INSERT OR REPLACE INTO checkout_sessions(email,price,plan,status,idem_key,error,expires,created) "
+                         "VALUES(?,?,?,'pending',?,'',?,?)", (email, price, plan, idem, now + CHECKOUT_TTL_S, now))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        self._pool.submit(self._create, stripe, email, price, plan, idem, now + CHECKOUT_TTL_S, success_url, cancel_url)
+        return {"email": email, "price": price, "plan": plan, "status": "pending", "session_id": None, "url": None,
+                "idem_key": idem, "error": "", "expires": now + CHECKOUT_TTL_S, "created": now}
+
+    def _create(self, stripe, email, price, plan, idem, expires, success_url, cancel_url):
+        meta = {"email": email, "plan": plan}
+        try:
+            s = call_with_retry(lambda: stripe.checkout.Session.create(
+                mode="subscription",
+                line_items=[{"price": price, "quantity": 1}],
+                success_url=success_url,
+                cancel_url=cancel_url,
+                customer_email=email,
+                client_reference_id=email,
+                metadata=meta,
+                subscription_data={"metadata": meta},      # so subscription events map back to the account
+                expires_at=expires,
+                idempotency_key=idem,                      # same key on every retry: at most one session
+            ))
+            self._set_checkout(email, price, idem, status="open", session_id=s.id, url=s.url,
+                               expires=int(getattr(s, "expires_at", None) or expires))
+        except Exception as e:
+            traceback.print_exc()
+            self._set_checkout(email, price, idem, status="failed", error=f"{type(e).__name__}: {e}")
+
+    def _set_checkout(self, email, price, idem, **fields):
+        cols = ", ".join(f"{k}=?" for k in fields)
+        conn = self._conn()
+        # keyed on the idempotency key too, so a late result never overwrites a newer attempt
+        conn.execute(f"UPDATE checkout_sessions SET {cols} WHERE email=? AND price=? AND idem_key=?",
+                     (*fields.values(), email, price, idem))
+        conn.commit(); conn.close()
+
+    def checkouts(self, email: str) -> list[dict]:
+        """This account's live checkout records (pending, open and unexpired, or failed)."""
+        conn = self._conn(); conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM checkout_sessions WHERE email=? AND status IN ('pending','open','failed') "
+                            "AND expires > ? ORDER BY created DESC", (email, int(time.time()))).fetchall()
+        conn.close()
+        return [dict(r) for r in rows]
+
+    # ---- webhook events ----
+    def enqueue(self, event: dict) -> bool:
+        """Queue a (verified) Stripe event; False if this event id was already received."""
+        conn = self._conn()
+        cur = conn.execute("INSERT OR IGNORE INTO webhook_events(id,type,created,payload,received) VALUES(?,?,?,?,?)",
+                           (event["id"], event["type"], int(event.get("created") or time.time()),
+                            json.dumps(event), int(time.time())))
+        conn.commit(); conn.close()
+        return cur.rowcount == 1
+
+    def receive(self, payload: bytes, sig_header: str, secret: str) -> bool:
+        """Verify a raw webhook body against the endpoint secret and queue it."""
+        verify_signature(payload, sig_header, secret)
+        return self.enqueue(json.loads(payload))
+
+    def process_events(self, apply_plan, limit: int = 50) -> list[tuple]:
+        """Apply queued events oldest-first; each is claimed atomically, so concurrent replicas never
+        apply one twice; claims left 'processing' past PROCESSING_STALE_S are re-queued first.
+        Returns [(email, plan)] changes applied by this call."""
+        conn = self._conn()
+        conn.execute("UPDATE webhook_events SET status=CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                     "result='claim expired' WHERE status='processing' AND claimed < ?",
+                     (EVENT_MAX_ATTEMPTS, int(time.time()) - PROCESSING_STALE_S))
+        conn.commit()
+        ids = [r[0] for r in conn.execute("SELECT id FROM webhook_events WHERE status='queued' "
+                                          "ORDER BY created, received LIMIT ?", (limit,))]
+        applied = []
+        for eid in ids:
+            if conn.execute("UPDATE webhook_events SET status='processing', attempts=attempts+1, claimed=? "
+                            "WHERE id=? AND status='queued'", (int(time.time()), eid)).rowcount != 1:
+                conn.commit(); continue
+            conn.commit()
+            event = json.loads(conn.execute("SELECT payload FROM webhook_events WHERE id=?", (eid,)).fetchone()[0])
+            try:
+                change = self._apply(event, apply_plan)
+                if change: applied.append(change)
+                conn.execute("UPDATE webhook_events SET status='done', result=? WHERE id=?",
+                             (f"{change[0]} -> {change[1]}" if change else "ignored", eid))
+            except Exception as e:
+                attempts = conn.execute("SELECT attempts FROM webhook_events WHERE id=?", (eid,)).fetchone()[0]
+                conn.execute("UPDATE webhook_events SET status=?, result=? WHERE id=?",
+                             ("failed" if attempts >= EVENT_MAX_ATTEMPTS else "queued", f"{type(e).__name__}: {e}", eid))
+            conn.commit()
+        conn.close()
+        return applied
+
+    def _apply(self, event: dict, apply_plan):
+        obj = event.get("data", {}).get("object", {})
+        meta = obj.get("metadata") or {}
+        if event["type"] == "checkout.session.completed":
+            email = meta.get("email") or obj.get("customer_email") or (obj.get("customer_details") or {}).get("email") \
+                or obj.get("client_reference_id")
+            plan = meta.get("plan")
+            if not (email and plan): return None
+            apply_plan(email, plan)
+            conn = self._conn()
+            conn.execute("UPDATE checkout_sessions SET status='complete' WHERE email=? AND session_id=?", (email, obj.get("id")))
+            conn.commit(); conn.close()
+            return email, plan
+        if event["type"] == "customer.subscription.deleted" and meta.get("email"):
+            apply_plan(meta["email"], "free")
+            return meta["email"], "free"
+        return None
+
+    def recent_events(self, limit: int = 50) -> list[dict]:
+        conn = self._conn(); conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT id,type,status,attempts,result,received FROM webhook_events "
+                            "ORDER BY received DESC LIMIT ?", (limit,)).fetchall()
+        conn.close()
+        return [dict(r) for r in rows]
+
+# ----------------------------
+# Standalone webhook receiver
+# ----------------------------
+class WebhookHandler(BaseHTTPRequestHandler):
+    billing: Billing = None
+    secret: str = ""
+    wake: threading.Event = None
+
+    def log_message(self, fmt, *args):
+        if os.getenv("VITALVIEW_API_LOG"): super().log_message(fmt, *args)
+
+    def _reply(self, code: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/stripe/webhook":
+            return self._reply(404, {"error": "unknown endpoint"})
+        payload = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            new = self.billing.receive(payload, self.headers.get("Stripe-Signature", ""), self.secret)
+        except (SignatureError, ValueError, KeyError) as e:
+            return self._reply(400, {"error": str(e)})
+        self.wake.set()                       # acknowledge fast; the drain thread applies it
+        self._reply(200, {"received": True, "duplicate": not new})
+
+def serve_webhooks(billing: Billing, secret: str, apply_plan, host: str = "127.0.0.1", port: int = 8767,
+                   poll_s: float = 5.0) -> ThreadingHTTPServer:
+    wake = threading.Event()
+    def drain():
+        while True:
+            wake.wait(poll_s); wake.clear()
+            try:
+                billing.process_events(apply_plan)
+            except Exception:
+                traceback.print_exc()
+    threading.Thread(target=drain, name="vitalview-webhook-drain", daemon=True).start()
+    handler = type("Handler", (WebhookHandler,), {"billing": billing, "secret": secret, "wake": wake})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    return httpd
+
+if __name__ == "__main__":
+    import argparse
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+    ap = argparse.ArgumentParser(description="VitalView Stripe webhook receiver")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    wp = sub.add_parser("webhook", help="receive Stripe webhooks and apply plan changes")
+    wp.add_argument("--host", default="127.0.0.1")
+    wp.add_argument("--port", type=int, default=8767)
+    wp.add_argument("--users-db", default="vitalview_users.db")
+    sp = sub.add_parser("simulate", help="POST a signed checkout.session.completed to a receiver")
+    sp.add_argument("--email", required=True)
+    sp.add_argument("--plan", default="pro", choices=["free", "pro", "enterprise"])
+    sp.add_argument("--url", default="http://127.0.0.1:8767/stripe/webhook")
+    args = ap.parse_args()
+    secret = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+    if not secret:
+        sys.exit("error: set STRIPE_WEBHOOK_SECRET (the endpoint's whsec_... signing secret)")
+    if args.cmd == "webhook":
+        from vitalview_audit import AuditLog
+        setter = users_db_plan_setter(args.users_db, AuditLog())
+        httpd = serve_webhooks(Billing(), secret, setter, args.host, args.port)
+        print(f"VitalView webhooks on http://{args.host}:{args.port}/stripe/webhook", file=sys.stderr)
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        body = json.dumps(checkout_completed_event(args.email, args.plan)).encode("utf-8")
+        req = Request(args.url, data=body, headers={"Stripe-Signature": sign_payload(body, secret),
+                                                    "Content-Type": "application/json"})
+        try:
+            with urlopen(req, timeout=10) as r: print(r.status, r.read().decode())
+        except HTTPError as e:
+            print(e.code, e.read().decode()); sys.exit(1)
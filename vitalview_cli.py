@@ -0,0 +1,141 @@
+# vitalview_cli.py — VitalView headless scoring (no Streamlit; for scheduled/batch runs)
+# Score every year:   python vitalview_cli.py score data.csv --weights weights.json --out scores.parquet
+# Latest year only:   python vitalview_cli.py score data.parquet --years latest --out latest.csv
+# Tract-level data:   python vitalview_cli.py score tracts.parquet --workers 16 --out scores.parquet
+# Trend blurbs:       python vitalview_cli.py trends data.csv --by state --out trends.json
+# Data health:        python vitalview_cli.py profile data.csv --out coverage.csv
+# Dataset store:      python vitalview_cli.py store data.csv vitalview_store/   (then VITALVIEW_DATASET=vitalview_store/)
+
+import os, sys, json, time, argparse
+import pandas as pd
+
+import vitalview_core as core
+
+def read_dataset(path: str, issues: dict | None = None) -> pd.DataFrame:
+    """CSV or Parquet (by extension) in the upload schema, run through enforce_schema
+    (which fills `issues` with blank/unparseable counts when given a dict), or a store directory."""
+    if os.path.isdir(path):
+        from vitalview_store import DatasetStore
+        return DatasetStore(path).scan()[0]
+    ext = os.path.splitext(path)[1].lower()
+    # CSV read as text so fips keeps its leading zeros; enforce_schema coerces year/value
+    raw = pd.read_parquet(path) if ext in (".parquet", ".pq") else pd.read_csv(path, dtype=str)
+    return core.enforce_schema(raw, issues)
+
+def read_weights(path: str | None) -> dict:
+    """JSON object {indicator-or-label: weight} or a CSV with indicator,weight columns.
+    Keys match indicators by prefix, like the app's sliders ("Food Desert" -> "Food Desert (%)")."""
+    if not path: return {}
+    if path.lower().endswith(".csv"):
+        w = pd.read_csv(path)
+        w.columns = [c.strip().lower() for c in w.columns]
+        return {str(k): float(v) for k, v in zip(w["indicator"], w["weight"])}
+    with open(path, encoding="utf-8") as fh:
+        return {str(k): float(v) for k, v in json.load(fh).items()}
+
+def write_table(df: pd.DataFrame, path: str):
+    if path.lower().endswith((".parquet", ".pq")):
+        df.to_parquet(path, index=False)
+    else:
+        with open(path, "wb") as fh:
+            core.write_safe_csv(df, fh)
+
+def cmd_score(args) -> int:
+    t0 = time.perf_counter()
+    df = read_dataset(args.input)
+    weights = read_weights(args.weights)
+    if args.years == "all":
+        years = None
+    elif args.years == "latest":
+        years = [int(df["year"].max())]
+    else:
+        years = [int(y) for y in args.years.split(",")]
+    scores = core.score_years(df, weights, years, workers=args.workers)
+    write_table(scores, args.out)
+    n_years = scores["year"].nunique() if not scores.empty else 0
+    print(f"scored {len(scores):,} rows over {n_years} year(s) -> {args.out} "
+          f"({time.perf_counter() - t0:.1f}s)", file=sys.stderr)
+    return 0
+
+def cmd_trends(args) -> int:
+    df = read_dataset(args.input)
+    keys = {"all": [], "state": ["state"], "county": ["state", "county"]}[args.by]
+    if keys:
+        out = [{**dict(zip(keys, k if isinstance(k, tuple) else (k,))), "trends": core.trend_blurbs(sub)}
+               for k, sub in df.groupby(keys, sort=True)]
+    else:
+        out = [{"trends": core.trend_blurbs(df)}]
+    text = json.dumps(out, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh: fh.write(text)
+    else:
+        print(text)
+    return 0
+
+def cmd_profile(args) -> int:
+    issues = {}
+    df = read_dataset(args.input, issues)
+    prof = core.profile_dataset(df, issues, z_max=args.z)
+    summary = {k: v for k, v in prof.items() if k not in ("coverage", "outliers")}
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    if args.out:
+        write_table(prof["coverage"].reset_index(), args.out)
+    if args.outliers:
+        write_table(prof["outliers"], args.outliers)
+    return 0
+
+def cmd_store(args) -> int:
+    from vitalview_store import write_store
+    t0 = time.perf_counter()
+    issues = {}
+    df, rep = core.merge_datasets(None, read_dataset(args.input, issues), "last")
+    issues["duplicates"] = rep["duplicates"]
+    m = write_store(df, args.out, issues, args.row_group_rows)
+    print(f"stored {m['rows']:,} rows in {len(m['years'])} year partition(s) -> {args.out} "
+          f"({time.perf_counter() - t0:.1f}s)", file=sys.stderr)
+    return 0
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="vitalview", description="VitalView headless scoring")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("score", help="equity-weighted priority scores per year")
+    sp.add_argument("input", help="dataset (.csv or .parquet)")
+    sp.add_argument("--weights", help="weights file (.json or .csv with indicator,weight)")
+    sp.add_argument("--years", default="all", help="all | latest | comma-separated years")
+    sp.add_argument("--out", required=True, help="output (.parquet or .csv)")
+    sp.add_argument("--workers", type=int, default=1,
+                    help="processes for large years, sharded by state (default 1 = serial)")
+    sp.set_defaults(func=cmd_score)
+
+    tp = sub.add_parser("trends", help="trend blurbs (last three years) as JSON")
+    tp.add_argument("input", help="dataset (.csv or .parquet)")
+    tp.add_argument("--by", choices=["all", "state", "county"], default="all")
+    tp.add_argument("--out", help="JSON file (default: stdout)")
+    tp.set_defaults(func=cmd_trends)
+
+    pp = sub.add_parser("profile", help="data-quality profile: blank/unparseable cells, duplicates, coverage, outliers")
+    pp.add_argument("input", help="dataset (.csv or .parquet)")
+    pp.add_argument("--z", type=float, default=core.OUTLIER_Z, help="outlier threshold in |z| within indicator-year")
+    pp.add_argument("--out", help="indicator × year coverage table (.csv or .parquet)")
+    pp.add_argument("--outliers", help="outlier rows (.csv or .parquet)")
+    pp.set_defaults(func=cmd_profile)
+
+    st = sub.add_parser("store", help="write a year-partitioned Parquet store the app can scan with filter pushdown")
+    st.add_argument("input", help="dataset (.csv or .parquet)")
+    st.add_argument("out", help="store directory (an existing store there is replaced)")
+    st.add_argument("--row-group-rows", type=int, default=16_384,
+                    help="rows per Parquet row group; smaller groups prune finer (default 16384)")
+    st.set_defaults(func=cmd_store)
+
+    args = ap.parse_args(argv)
+    try:
+        return args.func(args)
+    except (core.SchemaError, FileExistsError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+if __name__ == "__main__":
+    import vitalview_shard
+    vitalview_shard.START_METHOD = "fork"   # single-threaded here, so workers can inherit the rows
+    sys.exit(main())
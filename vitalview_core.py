@@ -0,0 +1,710 @@
+# vitalview_core.py — VitalView data logic (no Streamlit)
+# Schema checks, data-quality profiling, pivot + equity scoring, incremental ingestion, safe CSV export,
+# local-resources parsing and sample/synthetic datasets. The Streamlit app, benchmarks and batch tools all import from here.
+
+import hashlib
+import pandas as pd
+import numpy as np
+
+SCHEMA_COLUMNS = ["state","county","fips","year","indicator","value","unit"]
+RESOURCE_COLUMNS = ["state","county","section","label","url"]
+
+class SchemaError(ValueError):
+    """Uploaded data is missing required columns."""
+
+# ----------------------------
+# Schema
+# ----------------------------
+def enforce_schema(df: pd.DataFrame, issues: dict | None = None) -> pd.DataFrame:
+    """Lower-case headers, coerce year/value (dropping rows that fail), tidy text columns.
+    Raises SchemaError when required columns are missing. Pass a dict as `issues` to have it filled
+    with what was blank, failed to parse or was dropped (see schema_issues)."""
+    req = set(SCHEMA_COLUMNS)
+    df = df.copy()
+    df.columns = [c.strip().lower() for c in df.columns]
+    missing = req - set(df.columns)
+    if missing:
+        raise SchemaError(f"Missing columns: {missing}")
+    year = pd.to_numeric(df["year"], errors="coerce")
+    value = pd.to_numeric(df["value"], errors="coerce")
+    if issues is not None:
+        issues.update(schema_issues(df, year, value))
+    df["year"], df["value"] = year, value
+    df = df.dropna(subset=["year","value"])
+    for col in ("state","county","indicator","unit"):
+        df[col] = df[col].astype(str).str.strip()
+        if col in ("state","county"): df[col] = df[col].str.title()
+    return df
+
+def _blank(s: pd.Series) -> np.ndarray:
+    m = s.isna().to_numpy()
+    if pd.api.types.is_numeric_dtype(s):
+        return m
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype(object)
+    kind = pd.api.types.infer_dtype(s, skipna=True)
+    if kind == "string":
+        m = m | s.str.strip().eq("").fillna(False).to_numpy(dtype=bool)
+    elif kind.startswith("mixed"):
+        # .str refuses columns that aren't mostly text (e.g. Excel ints in an object column)
+        m = m | s.map(lambda x: isinstance(x, str) and not x.strip()).to_numpy(dtype=bool)
+    return m
+
+def schema_issues(raw: pd.DataFrame, year: pd.Series, value: pd.Series) -> dict:
+    """Counts for enforce_schema's `issues`: rows in/dropped, blank cells per column and year/value
+    cells that were present but not numeric (coerced to NaN). `raw` has the lower-cased headers."""
+    blank = {c: _blank(raw[c]) for c in SCHEMA_COLUMNS}
+    bad_year, bad_value = year.isna().to_numpy(), value.isna().to_numpy()
+    return {"rows": len(raw), "dropped": int((bad_year | bad_value).sum()),
+            "missing": {c: int(m.sum()) for c, m in blank.items()},
+            "coerced": {"year": int((bad_year & ~blank["year"]).sum()),
+                        "value": int((bad_value & ~blank["value"]).sum())}}
+
+def combine_issues(a: dict, b: dict) -> dict:
+    """Sum two issue dicts (e.g. one per uploaded file); nested counts are summed per key."""
+    out = {}
+    for k in set(a) | set(b):
+        x, y = a.get(k, 0), b.get(k, 0)
+        out[k] = combine_issues(x or {}, y or {}) if isinstance(x, dict) or isinstance(y, dict) else x + y
+    return out
+
+# ----------------------------
+# Scoring
+# ----------------------------
+def zscore(s: pd.Series) -> pd.Series:
+    s = pd.to_numeric(s, errors="coerce").astype(float)
+    std = s.std(ddof=0) or 1.0
+    return (s - s.mean()) / std
+
+LOCATION_KEYS = ["state","county","fips"]
+SPARSE_MAX_DENSITY = 0.25      # derive_pivot(sparse="auto"): go sparse when at most this share of cells is filled
+SPARSE_MIN_CELLS = 250_000     # ... and the dense pivot would have at least this many cells
+SPARSE_Z_COLUMNS = 20          # z columns a sparse priority table carries (E_Score still uses every weight)
+SHARD_MIN_ROWS = 200_000       # rows in a year before sharded scoring beats pool start-up + hand-off
+
+class SparsePivot:
+    """
+    Location × indicator means kept as coordinates (rows, cols, values) — the dense pivot_table
+    without its NaN cells. Exposes the parts of the DataFrame API the app reads off a pivot
+    (index, columns, shape, empty); compute_priority_df scores it without densifying.
+    """
+    def __init__(self, index: pd.MultiIndex, columns: pd.Index, rows, cols, values):
+        self.index, self.columns = index, columns
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.values = np.asarray(values, dtype=float)
+
+    @classmethod
+    def from_long(cls, df: pd.DataFrame) -> "SparsePivot":
+        # pivot_table drops null keys; ngroup would tag them -1 and wrap them onto the last cell
+        df = df.dropna(subset=["value", "indicator"] + LOCATION_KEYS)
+        loc = df.groupby(LOCATION_KEYS, sort=True).ngroup().to_numpy()
+        ind, indicators = pd.factorize(df["indicator"], sort=True)
+        # one integer key per (location, indicator) cell; duplicates are averaged like pivot_table
+        cell, inv = np.unique(loc * len(indicators) + ind, return_inverse=True)
+        values = np.bincount(inv, df["value"].to_numpy(dtype=float)) / np.bincount(inv)
+        index = pd.MultiIndex.from_frame(df[LOCATION_KEYS].drop_duplicates().sort_values(LOCATION_KEYS))
+        return cls(index, pd.Index(indicators, name="indicator"), cell // len(indicators),
+                   cell % len(indicators), values)
+
+    shape = property(lambda self: (len(self.index), len(self.columns)))
+    empty = property(lambda self: len(self.values) == 0)
+    density = property(lambda self: len(self.values) / max(1, self.shape[0] * self.shape[1]))
+    nbytes = property(lambda self: self.rows.nbytes + self.cols.nbytes + self.values.nbytes)
+
+    def zscores(self) -> np.ndarray:
+        """NaN-aware column z-scores of the stored cells (ddof=0; a constant column divides by 1, like zscore)."""
+        k = len(self.columns)
+        n = np.bincount(self.cols, minlength=k)
+        mean = np.bincount(self.cols, self.values, minlength=k) / np.maximum(n, 1)
+        dev = self.values - mean[self.cols]
+        std = np.sqrt(np.bincount(self.cols, dev * dev, minlength=k) / np.maximum(n, 1))
+        std[~(std > 0)] = 1.0
+        return dev / std[self.cols]
+
+    def select_rows(self, mask) -> "SparsePivot":
+        """Rows where `mask` is True; indicators with no remaining cells are dropped (like pivot_table)."""
+        mask = np.asarray(mask, dtype=bool)
+        row_map = np.cumsum(mask) - 1
+        keep = mask[self.rows]
+        used = np.unique(self.cols[keep])
+        col_map = np.full(len(self.columns), -1); col_map[used] = np.arange(len(used))
+        return SparsePivot(self.index[mask], self.columns[used], row_map[self.rows[keep]],
+                           col_map[self.cols[keep]], self.values[keep])
+
+    def select_columns(self, mask) -> "SparsePivot":
+        """Indicators where `mask` is True; every row is kept."""
+        mask = np.asarray(mask, dtype=bool)
+        col_map = np.cumsum(mask) - 1
+        keep = mask[self.cols]
+        return SparsePivot(self.index, self.columns[mask], self.rows[keep], col_map[self.cols[keep]], self.values[keep])
+
+    def to_dense(self) -> pd.DataFrame:
+        out = np.full(self.shape, np.nan)
+        out[self.rows, self.cols] = self.values
+        return pd.DataFrame(out, index=self.index, columns=self.columns)
+
+    def to_long(self) -> pd.DataFrame:
+        out = self.index[self.rows].to_frame(index=False)
+        out["indicator"] = self.columns[self.cols]
+        out["value"] = self.values
+        return out
+
+def derive_pivot(df_latest: pd.DataFrame, sparse: bool | str = False, workers: int = 1):
+    """Location × indicator means. `sparse=True` returns a SparsePivot; "auto" does so only for
+    wide, gappy data (SPARSE_MIN_CELLS / SPARSE_MAX_DENSITY). A dense pivot of at least
+    SHARD_MIN_ROWS rows is built sharded by state when `workers` > 1 (vitalview_shard)."""
+    if df_latest is None or df_latest.empty: return pd.DataFrame()
+    if sparse == "auto":
+        n_loc = len(df_latest[LOCATION_KEYS].drop_duplicates())
+        cells = n_loc * df_latest["indicator"].nunique()
+        n_filled = len(df_latest[LOCATION_KEYS + ["indicator"]].drop_duplicates())
+        sparse = cells >= SPARSE_MIN_CELLS and n_filled <= SPARSE_MAX_DENSITY * cells
+    if sparse:
+        return SparsePivot.from_long(df_latest)
+    if workers > 1 and len(df_latest) >= SHARD_MIN_ROWS:
+        from vitalview_shard import pivot_sharded
+        return pivot_sharded(df_latest, max_workers=workers)
+    return df_latest.pivot_table(index=LOCATION_KEYS,
+                                 columns="indicator", values="value", aggfunc="mean")
+
+def _match_columns(columns, weights: dict) -> list:
+    """(column position, weight) per weight label, matched by prefix like the sliders."""
+    low = [c.lower() for c in columns]
+    out = []
+    for lbl, w in weights.items():
+        j = next((j for j, c in enumerate(low) if c.startswith(lbl.lower())), None)
+        if j is not None: out.append((j, w))
+    return out
+
+def compute_priority_df(pivot, weights: dict) -> pd.DataFrame:
+    if pivot is None or pivot.empty: return pd.DataFrame()
+    if isinstance(pivot, SparsePivot):
+        return _priority_sparse(pivot, weights)
+    z = pivot.apply(zscore, axis=0)
+    score = 0; used=[]
+    for j, w in _match_columns(z.columns, weights):
+        col = z.columns[j]
+        score = score + w * z[col]; used.append(col)
+    out = z.copy(); out["E_Score"] = score; out["__used__"]=", ".join(used) if used else "(none)"
+    return out.reset_index().sort_values("E_Score", ascending=False)
+
+def _priority_sparse(sp: SparsePivot, weights: dict) -> pd.DataFrame:
+    """compute_priority_df for a SparsePivot: same E_Score (NaN where any weighted indicator is
+    missing), but z columns only for the first SPARSE_Z_COLUMNS weighted indicators."""
+    n = sp.shape[0]
+    matched = _match_columns(sp.columns, weights)
+    w_col = np.zeros(len(sp.columns)); is_used = np.zeros(len(sp.columns), dtype=bool)
+    for j, w in matched:
+        w_col[j] += w; is_used[j] = True
+    z = sp.zscores()
+    zcols = {}
+    for j in np.flatnonzero(is_used)[:SPARSE_Z_COLUMNS]:
+        m = sp.cols == j
+        col = np.full(n, np.nan); col[sp.rows[m]] = z[m]
+        zcols[sp.columns[j]] = col
+    out = pd.concat([sp.index.to_frame(index=False), pd.DataFrame(zcols)], axis=1)
+    if matched:
+        score = np.bincount(sp.rows, w_col[sp.cols] * z, minlength=n)
+        have = np.bincount(sp.rows, is_used[sp.cols], minlength=n)
+        score[have < is_used.sum()] = np.nan
+    else:
+        score = 0
+    out["E_Score"] = score
+    out["__used__"] = ", ".join(sp.columns[j] for j, _ in matched) if matched else "(none)"
+    return out.sort_values("E_Score", ascending=False)
+
+def coverage_report(pivot) -> pd.DataFrame:
+    """Per indicator: locations reporting, share of all locations, and value summary — dense or sparse pivot."""
+    if pivot is None or pivot.empty:
+        return pd.DataFrame(columns=["indicator","locations","coverage_pct","mean","std","min","max"])
+    if not isinstance(pivot, SparsePivot):
+        pivot = SparsePivot(pivot.index, pivot.columns, *np.nonzero(pivot.notna().to_numpy()),
+                            pivot.to_numpy(dtype=float)[pivot.notna().to_numpy()])
+    v = pd.DataFrame({"indicator": pivot.columns[pivot.cols], "value": pivot.values})
+    rep = v.groupby("indicator", sort=False)["value"].agg(locations="size", mean="mean", std=lambda s: s.std(ddof=0),
+                                                          min="min", max="max").reset_index()
+    rep.insert(2, "coverage_pct", (100.0 * rep["locations"] / pivot.shape[0]).round(1))
+    return rep.sort_values(["locations","indicator"], ascending=[False, True], ignore_index=True)
+
+def trend_blurbs(df_scope: pd.DataFrame) -> list:
+    """Up to six one-line indicator trends over the last three years in `df_scope`."""
+    blurbs = []
+    if df_scope is None or df_scope.empty:
+        return blurbs
+    years_sorted = sorted(pd.to_numeric(df_scope["year"], errors="coerce").dropna().unique().tolist())
+    slice_years = years_sorted[-3:] if len(years_sorted) >= 3 else years_sorted
+    d3 = df_scope[df_scope["year"].isin(slice_years)].copy()
+    for ind, sub in d3.groupby("indicator"):
+        try:
+            sub = sub.groupby("year", as_index=False)["value"].mean().sort_values("year")
+            if len(sub) >= 2:
+                delta = float(sub["value"].iloc[-1]) - float(sub["value"].iloc[0])
+                dirw = "increased" if delta > 0 else ("decreased" if delta < 0 else "held steady")
+                blurbs.append(f"{ind} {dirw} by {abs(delta):.1f} over {len(sub)} year(s).")
+        except Exception:
+            pass
+    return blurbs[:6]
+
+def score_years(df: pd.DataFrame, weights: dict | None = None, years=None, workers: int = 1) -> pd.DataFrame:
+    """Priority table for each year in `years` (default: every year in `df`), stacked with a
+    `year` column. `weights` maps indicator (or label prefix) -> weight; missing = 1.0 each.
+    `workers` > 1 scores large years sharded by state in a process pool (vitalview_shard)."""
+    out = []
+    all_years = sorted(int(y) for y in df["year"].dropna().unique())
+    for y in (all_years if years is None else [int(y) for y in years]):
+        d = df[df["year"] == y]
+        if d.empty: continue
+        w = weights if weights else {c: 1.0 for c in sorted(d["indicator"].dropna().unique())}
+        if workers > 1 and len(d) >= SHARD_MIN_ROWS:
+            from vitalview_shard import score_sharded
+            pr = score_sharded(d, w, max_workers=workers)
+        else:
+            pr = compute_priority_df(derive_pivot(d), w)
+        if pr.empty: continue
+        pr.insert(0, "year", y)
+        pr["rank"] = np.arange(1, len(pr) + 1)
+        out.append(pr)
+    if not out: return pd.DataFrame()
+    res = pd.concat(out, ignore_index=True)
+    res.columns.name = None
+    return res
+
+# ----------------------------
+# Peer counties (nearest neighbors by indicator profile)
+# ----------------------------
+class PeerIndex:
+    """Brute-force k-NN over the z-scored indicator matrix (the same z as compute_priority_df).
+    A query is one BLAS mat-vec over all locations; missing indicators count as the mean (z = 0)."""
+    def __init__(self, pivot):
+        if isinstance(pivot, SparsePivot): pivot = pivot.to_dense()
+        z = pivot.apply(zscore, axis=0)
+        self.indicators = list(z.columns)
+        self.meta = z.index.to_frame(index=False)
+        self.meta["fips"] = self.meta["fips"].astype(str)
+        self.Z = np.ascontiguousarray(np.nan_to_num(z.to_numpy(dtype=float), nan=0.0))
+        self.sq = np.einsum("ij,ij->i", self.Z, self.Z)
+        self._pos = {f: i for i, f in enumerate(self.meta["fips"])}
+
+    def __len__(self): return len(self.Z)
+
+    def query(self, fips: str, k: int = 10) -> pd.DataFrame:
+        """Top-k peers of `fips` (itself excluded), closest first, with distance and their z-scores.
+        Raises KeyError for an unknown fips."""
+        i = self._pos[str(fips)]
+        d2 = self.sq + self.sq[i] - 2.0 * (self.Z @ self.Z[i])
+        d2[i] = np.inf
+        k = min(k, len(d2) - 1)
+        if k <= 0: return self.meta.iloc[:0].assign(distance=[])
+        idx = np.argpartition(d2, k - 1)[:k]
+        idx = idx[np.argsort(d2[idx], kind="stable")]
+        out = self.meta.iloc[idx].reset_index(drop=True)
+        out["distance"] = np.sqrt(np.maximum(d2[idx], 0.0))
+        return pd.concat([out, pd.DataFrame(self.Z[idx], columns=self.indicators)], axis=1)
+
+# ----------------------------
+# Incremental ingestion (dedupe on fips/year/indicator)
+# ----------------------------
+RECORD_KEYS = ["fips","year","indicator"]
+CONFLICT_POLICIES = {
+    "last":  "Newest file wins",
+    "first": "Keep existing value",
+    "mean":  "Average duplicates",
+    "error": "Reject conflicting values",
+}
+
+class ConflictError(ValueError):
+    """Rows for the same (fips, year, indicator) disagree and the policy is "error"."""
+
+def _norm_keys(df: pd.DataFrame) -> pd.DataFrame:
+    # fips as text (int-read files lose nothing further; mixed int/str files still match)
+    return df.assign(fips=df["fips"].astype(str).str.strip(), year=df["year"].astype(int))
+
+def dedupe_records(df: pd.DataFrame, policy: str = "last") -> pd.DataFrame:
+    """Collapse rows sharing RECORD_KEYS; row order is arrival order (later rows are newer)."""
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy {policy!r}")
+    if policy == "mean":
+        df = df.assign(value=df.groupby(RECORD_KEYS, sort=False)["value"].transform("mean"))
+    elif policy == "error":
+        dup = df[df.duplicated(RECORD_KEYS, keep=False)]
+        clash = dup.groupby(RECORD_KEYS)["value"].nunique()
+        clash = clash[clash > 1]
+        if len(clash):
+            f, y, ind = clash.index[0]
+            raise ConflictError(f"{len(clash):,} conflicting value(s), e.g. fips {f}, {y}, {ind}")
+    return df.drop_duplicates(RECORD_KEYS, keep="first" if policy in ("first", "mean", "error") else "last")
+
+def merge_datasets(base: pd.DataFrame | None, new: pd.DataFrame, policy: str = "last") -> tuple[pd.DataFrame, dict]:
+    """
+    Append `new` (already through enforce_schema) to `base`, deduplicated on RECORD_KEYS per `policy`.
+    Only the year partitions present in `new` are re-deduplicated; other years are carried over as-is.
+    Returns (merged, report) with rows read/added/updated/duplicates dropped and the touched years.
+    """
+    new = _norm_keys(new)
+    rows_in = len(new)
+    new = dedupe_records(new, policy)
+    years = sorted(int(y) for y in new["year"].unique())
+    if base is None or base.empty:
+        return new.reset_index(drop=True), {"rows": rows_in, "added": len(new), "updated": 0,
+                                            "duplicates": rows_in - len(new), "years": years}
+    base = _norm_keys(base)
+    touched = base["year"].isin(years)
+    old = base[touched]
+    overlap = new[RECORD_KEYS + ["value"]].merge(old[RECORD_KEYS + ["value"]], on=RECORD_KEYS, suffixes=("", "_old"))
+    changed = overlap[overlap["value"] != overlap["value_old"]]
+    if policy == "error" and len(changed):
+        f, y, ind = changed.iloc[0][RECORD_KEYS]
+        raise ConflictError(f"{len(changed):,} value(s) differ from the existing data, e.g. fips {f}, {y}, {ind}")
+    part = dedupe_records(pd.concat([old, new], ignore_index=True), policy)
+    merged = pd.concat([base[~touched], part], ignore_index=True)
+    report = {"rows": rows_in, "added": len(new) - len(overlap),
+              "updated": 0 if policy == "first" else len(changed),
+              "duplicates": rows_in - len(new), "years": years}
+    return merged, report
+
+def sort_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    """Rows ordered by state, county, fips, year, indicator with a fresh RangeIndex: each state is one
+    contiguous block (see state_slices), and the order doesn't depend on file arrival order."""
+    return df.sort_values(["state","county","fips","year","indicator"], kind="stable", ignore_index=True)
+
+def state_slices(df: pd.DataFrame) -> dict:
+    """{state: slice of row positions} for a frame grouped by state (e.g. from sort_dataset)."""
+    s = df["state"].to_numpy()
+    if not len(s): return {}
+    starts = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+    stops = np.r_[starts[1:], len(s)]
+    return {s[a]: slice(int(a), int(b)) for a, b in zip(starts, stops)}
+
+def select_states(df: pd.DataFrame, slices: dict, states) -> pd.DataFrame:
+    """Rows for `states` via state_slices. One state (or a run of adjacent ones) is a positional
+    slice, which pandas returns as a view of `df` rather than a copy."""
+    if not states: return df
+    parts = sorted((slices[s] for s in states if s in slices), key=lambda sl: sl.start)
+    if not parts: return df.iloc[:0]
+    merged = [parts[0]]
+    for sl in parts[1:]:
+        if sl.start == merged[-1].stop: merged[-1] = slice(merged[-1].start, sl.stop)
+        else: merged.append(sl)
+    if len(merged) == 1: return df.iloc[merged[0]]
+    return df.iloc[np.concatenate([np.arange(sl.start, sl.stop) for sl in merged])]
+
+def partition_versions(df: pd.DataFrame, years=None) -> dict:
+    """{year: content hash} for each year partition (all years, or just `years`). Cache keys built on
+    these stay valid for years an append didn't touch."""
+    if years is not None:
+        df = df[df["year"].isin(list(years))]
+    cols = SCHEMA_COLUMNS + [c for c in GEO_EXTRA_COLUMNS if c in df.columns]
+    out = {}
+    for y, g in df.groupby("year", sort=True):
+        h = pd.util.hash_pandas_object(g[cols], index=False).to_numpy()
+        out[int(y)] = hashlib.sha1(h.tobytes()).hexdigest()[:16]
+    return out
+
+# ----------------------------
+# Data-quality profile (computed once at ingestion)
+# ----------------------------
+OUTLIER_Z = 3.0          # |z| within an (indicator, year) above this flags a value
+MAX_OUTLIER_ROWS = 500   # outlier rows kept in a profile (largest |z| first); the count covers all
+
+def profile_dataset(df: pd.DataFrame, issues: dict | None = None, z_max: float = OUTLIER_Z,
+                    max_outliers: int = MAX_OUTLIER_ROWS) -> dict:
+    """
+    Data-health summary of a schema-checked frame. One grouping by (indicator, year) feeds both
+      coverage   indicator × year: % of that year's locations reporting the indicator
+      outliers   rows more than `z_max` standard deviations from their indicator-year mean
+    Duplicate RECORD_KEYS rows still in `df` are added to issues["duplicates"] (rows merge_datasets
+    already dropped); blank/coerced/dropped counts come from enforce_schema's `issues`.
+    """
+    issues = issues or {}
+    out = {"rows": len(df), "rows_in": issues.get("rows", len(df)), "dropped": issues.get("dropped", 0),
+           "missing": dict(issues.get("missing", {})), "coerced": dict(issues.get("coerced", {})),
+           "duplicates": issues.get("duplicates", 0) + int(df.duplicated(RECORD_KEYS).sum()),
+           "z_max": z_max}
+    cols = LOCATION_KEYS + ["year","indicator","value"]
+    if df.empty:
+        return {**out, "coverage": pd.DataFrame(), "outliers": df[cols].assign(z=[]), "n_outliers": 0}
+    g = df.groupby(["indicator","year"], sort=True)
+    codes, k = g.ngroup().to_numpy(), g.ngroups
+    v = df["value"].to_numpy(dtype=float)
+    n = np.bincount(codes, minlength=k)
+    mean = np.bincount(codes, v, k) / n
+    dev = v - mean[codes]
+    std = np.sqrt(np.bincount(codes, dev * dev, k) / n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = dev / np.where(std > 0, std, np.nan)[codes]
+    hit = np.flatnonzero(np.abs(z) > z_max)
+    top = hit[np.argsort(-np.abs(z[hit]), kind="stable")[:max_outliers]]
+    outliers = df.iloc[top][cols].assign(z=z[top].round(2)).reset_index(drop=True)
+
+    reporting = g["fips"].nunique()
+    per_year = df.groupby("year")["fips"].nunique()
+    pct = 100.0 * reporting / per_year.reindex(reporting.index.get_level_values("year")).to_numpy()
+    coverage = pct.unstack("year", fill_value=0.0).round(1)
+    coverage.columns = [int(y) for y in coverage.columns]
+    return {**out, "coverage": coverage, "outliers": outliers, "n_outliers": int(len(hit))}
+
+# ----------------------------
+# Geography hierarchy (tract -> county -> state, optional ZIP)
+# ----------------------------
+GEO_LEVELS = ["tract","county","state"]
+GEO_LABELS = {"tract": "Census tract", "county": "County", "state": "State", "zip": "ZIP code"}
+GEO_EXTRA_COLUMNS = ["population","zip"]     # optional upload columns used by rollups
+
+class GeoHierarchy:
+    """
+    Integer group codes per geography level for every location (fips) in a dataset, built once at
+    ingestion: codes[level][i] is the group of location i and groups[level] holds each group's
+    state / county / fips labels. The base level comes from the fips width (11 tract, 5 county, 2 state);
+    a `zip` column adds a ZIP level. rollup() is a bincount over these codes.
+    """
+    def __init__(self, df: pd.DataFrame):
+        cols = ["state","county","fips"] + (["zip"] if "zip" in df.columns else [])
+        loc = df[cols].drop_duplicates("fips").reset_index(drop=True)
+        self.index = pd.Index(loc["fips"].astype(str))
+        width = int(self.index.str.len().max()) if len(loc) else 5
+        self.base = "tract" if width >= 10 else ("county" if width >= 4 else "state")
+        fips = pd.Series(self.index).str.zfill({"tract": 11, "county": 5, "state": 2}[self.base])
+        keys = {"tract": fips, "county": fips.str[:5], "state": fips.str[:2]}
+        if "zip" in loc.columns:
+            keys["zip"] = loc["zip"].astype(str).str.strip().str.zfill(5)
+        self.levels = GEO_LEVELS[GEO_LEVELS.index(self.base):] + (["zip"] if "zip" in keys else [])
+        self.codes, self.groups = {}, {}
+        for lvl in self.levels:
+            codes, uniq = pd.factorize(keys[lvl], sort=True)
+            first = pd.Series(np.arange(len(codes))).groupby(codes).first().to_numpy()
+            lab = loc.loc[first, ["state","county"]].reset_index(drop=True)
+            if lvl == "state": lab["county"] = "(statewide)"
+            if lvl == "zip": lab["county"] = "ZIP " + pd.Series(uniq)
+            lab["fips"] = np.asarray(uniq, dtype=object)
+            self.codes[lvl], self.groups[lvl] = codes.astype(np.int32), lab
+
+def rollup(df: pd.DataFrame, geo: GeoHierarchy, level: str) -> pd.DataFrame:
+    """
+    Long data rolled up to `level` in one vectorized pass: the mean per (group, year, indicator),
+    weighted by the `population` column when present (cells with no population fall back to the
+    plain mean). Output is in the upload schema with the group's labels in state/county/fips.
+    """
+    if level == geo.base or df.empty:
+        return df
+    grp = geo.codes[level][geo.index.get_indexer(df["fips"].astype(str))]
+    ind, inds = pd.factorize(df["indicator"], sort=True)
+    yr, yrs = pd.factorize(df["year"], sort=True)
+    key = (grp.astype(np.int64) * len(yrs) + yr) * len(inds) + ind
+    cell, inv = np.unique(key, return_inverse=True)
+    x = df["value"].to_numpy(dtype=float)
+    mean = np.bincount(inv, x) / np.bincount(inv)
+    if "population" in df.columns:
+        w = pd.to_numeric(df["population"], errors="coerce").fillna(0).clip(lower=0).to_numpy(dtype=float)
+        wsum = np.bincount(inv, w)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(wsum > 0, np.bincount(inv, w * x) / wsum, mean)
+    g, rest = np.divmod(cell, len(yrs) * len(inds))
+    y, i = np.divmod(rest, len(inds))
+    out = geo.groups[level].iloc[g].reset_index(drop=True)
+    out["year"] = np.asarray(yrs)[y]
+    out["indicator"] = np.asarray(inds, dtype=object)[i]
+    out["value"] = mean
+    units = df.drop_duplicates("indicator").set_index("indicator")["unit"]
+    out["unit"] = units.reindex(out["indicator"]).to_numpy()
+    if "population" in df.columns:
+        out["population"] = wsum
+    return out[SCHEMA_COLUMNS + (["population"] if "population" in df.columns else [])]
+
+# ----------------------------
+# CSV export (formula-injection safe)
+# ----------------------------
+CSV_FORMULA_PREFIXES = ["=", "+", "-", "@"]
+CSV_CHUNK_ROWS = 50_000
+
+def escape_csv_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Prefix spreadsheet-formula cells with ' — only text columns are touched."""
+    out = None
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype(object)
+        elif not (s.dtype == object or pd.api.types.is_string_dtype(s.dtype)):
+            continue
+        kind = pd.api.types.infer_dtype(s, skipna=True) if s.dtype == object else "string"
+        if kind == "string":
+            mask = s.str[:1].isin(CSV_FORMULA_PREFIXES).to_numpy(dtype=bool)
+        elif kind.startswith("mixed"):
+            # .str refuses columns that aren't mostly text; check the str cells one by one
+            mask = s.map(lambda x: isinstance(x, str) and x[:1] in CSV_FORMULA_PREFIXES).to_numpy(dtype=bool)
+        else:
+            continue   # ints, Decimals, dates ... in an object column: nothing to escape
+        if not mask.any():
+            continue
+        if out is None:
+            out = df.copy()
+        s = s.astype(object).copy()
+        s[mask] = "'" + s[mask]
+        out[col] = s
+    return df if out is None else out
+
+def iter_safe_csv(df: pd.DataFrame, chunk_rows: int = CSV_CHUNK_ROWS):
+    """Yield escaped UTF-8 CSV for `df`, `chunk_rows` rows at a time (header on the first chunk).
+    Only one chunk is escaped/encoded in memory at once."""
+    if len(df) == 0:
+        yield df.to_csv(index=False).encode("utf-8")
+        return
+    for start in range(0, len(df), chunk_rows):
+        part = escape_csv_text(df.iloc[start:start + chunk_rows])
+        yield part.to_csv(index=False, header=(start == 0)).encode("utf-8")
+
+def write_safe_csv(df: pd.DataFrame, fh, chunk_rows: int = CSV_CHUNK_ROWS) -> int:
+    """Stream `df` into binary file `fh`; returns bytes written."""
+    written = 0
+    for data in iter_safe_csv(df, chunk_rows):
+        fh.write(data); written += len(data)
+    return written
+
+def safe_csv_bytes(df: pd.DataFrame) -> bytes:
+    buf = __import__("io").BytesIO()
+    write_safe_csv(df, buf)
+    return buf.getvalue()
+
+# ----------------------------
+# Local resources CSV
+# ----------------------------
+def load_local_resources_csv(file) -> dict:
+    """
+    CSV schema (headers, case-insensitive):
+      state, county, section, label, url
+    Returns: dict[(State, County)] -> list of (section, label, url)
+    Raises ValueError if the file can't be read or lacks columns.
+    """
+    if file is None:
+        return {}
+
+    try:
+        df = pd.read_csv(file)
+    except Exception:
+        try:
+            if hasattr(file, "seek"): file.seek(0)
+            df = pd.read_csv(file, encoding="utf-8-sig")
+        except Exception as e:
+            raise ValueError(f"Could not read resources CSV: {e}") from e
+
+    # normalize columns
+    df.columns = [c.strip().lower() for c in df.columns]
+    required = set(RESOURCE_COLUMNS)
+    if not required.issubset(set(df.columns)):
+        raise ValueError(f"Resources CSV missing columns: {required - set(df.columns)}")
+
+    # clean up text
+    for c in RESOURCE_COLUMNS:
+        df[c] = df[c].astype(str).str.strip()
+
+    # title-case state & county to match your filters
+    df["state"] = df["state"].str.title()
+    df["county"] = df["county"].str.title()
+
+    # build lookup dictionary (zip over columns: much cheaper than iterrows)
+    resources = {}
+    for st_, co, sec, lab, url in zip(df["state"], df["county"], df["section"], df["label"], df["url"]):
+        resources.setdefault((st_, co), []).append((sec, lab, url))
+    return resources
+
+# ----------------------------
+# Sample + synthetic data
+# ----------------------------
+def make_sample() -> pd.DataFrame:
+    counties = [("Illinois","Cook","17031"),("Illinois","Lake","17097"),("Illinois","Will","17197")]
+    years = list(range(2019, 2025))
+    rows=[]
+    def trend(a,b,n): return [round(a+(b-a)*i/(n-1),2) for i in range(n)]
+    ob={"Cook":trend(29,33,len(years)),"Lake":trend(25,29,len(years)),"Will":trend(26,31,len(years))}
+    pm={"Cook":trend(11.5,9.2,len(years)),"Lake":trend(10.8,8.9,len(years)),"Will":trend(11.2,9.1,len(years))}
+    un={"Cook":trend(15,11,len(years)),"Lake":trend(12,9,len(years)),"Will":trend(13,9.5,len(years))}
+    nc={"Cook":trend(16,15,len(years)),"Lake":trend(7,6.5,len(years)),"Will":trend(6.3,5.9,len(years))}
+    fd={"Cook":{2019:17.6,2022:16.8,2024:16.2},"Lake":{2019:10.6,2022:10.1,2024:9.8},"Will":{2019:12.7,2022:12.1,2024:11.9}}
+    for (s,c,f) in counties:
+        for i,y in enumerate(years):
+            rows.append([s,c,f,y,"Obesity (%)",ob[c][i],"percent"])
+            rows.append([s,c,f,y,"PM2.5 (µg/m³)",pm[c][i],"ugm3"])
+            rows.append([s,c,f,y,"Uninsured (%)",un[c][i],"percent"])
+            rows.append([s,c,f,y,"No Car Households (%)",nc[c][i],"percent"])
+        for y in fd[c]:
+            rows.append([s,c,f,y,"Food Desert (%)",fd[c][y],"percent"])
+    return pd.DataFrame(rows, columns=SCHEMA_COLUMNS)
+
+# 50 states + DC with FIPS codes (synthetic locations are spread across these)
+US_STATES = [
+    ("Alabama","01"),("Alaska","02"),("Arizona","04"),("Arkansas","05"),("California","06"),("Colorado","08"),
+    ("Connecticut","09"),("Delaware","10"),("District Of Columbia","11"),("Florida","12"),("Georgia","13"),
+    ("Hawaii","15"),("Idaho","16"),("Illinois","17"),("Indiana","18"),("Iowa","19"),("Kansas","20"),
+    ("Kentucky","21"),("Louisiana","22"),("Maine","23"),("Maryland","24"),("Massachusetts","25"),
+    ("Michigan","26"),("Minnesota","27"),("Mississippi","28"),("Missouri","29"),("Montana","30"),
+    ("Nebraska","31"),("Nevada","32"),("New Hampshire","33"),("New Jersey","34"),("New Mexico","35"),
+    ("New York","36"),("North Carolina","37"),("North Dakota","38"),("Ohio","39"),("Oklahoma","40"),
+    ("Oregon","41"),("Pennsylvania","42"),("Rhode Island","44"),("South Carolina","45"),("South Dakota","46"),
+    ("Tennessee","47"),("Texas","48"),("Utah","49"),("Vermont","50"),("Virginia","51"),("Washington","53"),
+    ("West Virginia","54"),("Wisconsin","55"),("Wyoming","56"),
+]
+SAMPLE_INDICATORS = ["Obesity (%)","PM2.5 (µg/m³)","Uninsured (%)","No Car Households (%)","Food Desert (%)"]
+US_COUNTY_COUNT = 3143
+US_TRACT_COUNT = 85_000
+
+def make_synthetic(n_counties: int = US_COUNTY_COUNT, tracts_per_county: int = 0,
+                   n_indicators: int = 5, n_years: int = 6, first_year: int = 2019,
+                   missing_frac: float = 0.0, dup_frac: float = 0.0, seed: int = 0) -> pd.DataFrame:
+    """
+    Long-format dataset in the upload schema, built with vectorized numpy (no Python row loop).
+      n_counties        counties spread round-robin over US_STATES (3,143 ~ the whole US)
+      tracts_per_county >0 emits tract rows (11-digit fips) instead of county rows (~27 -> ~85k tracts)
+      n_indicators      first five reuse the demo names, then "Indicator 006 (%)", ...
+      missing_frac      share of rows whose value is blanked (dropped by enforce_schema)
+      dup_frac          share of rows repeated with a perturbed value (same fips/year/indicator)
+    """
+    rng = np.random.default_rng(seed)
+    st_idx = np.arange(n_counties) % len(US_STATES)
+    cty_no = np.arange(n_counties) // len(US_STATES) * 2 + 1          # odd county codes, like FIPS
+    st_names = np.array([s for s, _ in US_STATES], dtype=object)[st_idx]
+    st_fips = np.array([f for _, f in US_STATES], dtype=object)[st_idx]
+    cty_fips = st_fips + np.char.zfill(cty_no.astype(str), 3).astype(object)
+    cty_names = np.char.add("County ", np.char.zfill(cty_no.astype(str), 3)).astype(object)
+
+    if tracts_per_county > 0:
+        rep = tracts_per_county
+        states = np.repeat(st_names, rep); counties = np.repeat(cty_names, rep)
+        tract_no = np.tile(np.arange(1, rep + 1) * 100, n_counties)
+        fips = np.repeat(cty_fips, rep) + np.char.zfill(tract_no.astype(str), 6).astype(object)
+    else:
+        states, counties, fips = st_names, cty_names, cty_fips
+    n_loc = len(fips)
+
+    indicators = (SAMPLE_INDICATORS + [f"Indicator {i:03d} (%)" for i in range(6, n_indicators + 1)])[:n_indicators]
+    years = np.arange(first_year, first_year + n_years)
+
+    # value = location/indicator baseline + per-indicator yearly drift + noise
+    base = rng.uniform(5, 35, size=(n_loc, n_indicators))
+    drift = rng.normal(0, 0.4, size=n_indicators)
+    loc_i = np.repeat(np.arange(n_loc), n_indicators * n_years)
+    ind_i = np.tile(np.repeat(np.arange(n_indicators), n_years), n_loc)
+    yr_i = np.tile(np.arange(n_years), n_loc * n_indicators)
+    values = base[loc_i, ind_i] + drift[ind_i] * yr_i + rng.normal(0, 0.5, size=len(loc_i))
+
+    df = pd.DataFrame({
+        "state": states[loc_i], "county": counties[loc_i], "fips": fips[loc_i],
+        "year": years[yr_i], "indicator": np.array(indicators, dtype=object)[ind_i],
+        "value": np.round(values, 2), "unit": "percent",
+    })
+    if missing_frac > 0:
+        df.loc[rng.random(len(df)) < missing_frac, "value"] = np.nan
+    if dup_frac > 0:
+        dups = df.sample(frac=dup_frac, random_state=seed).copy()
+        dups["value"] = dups["value"] + np.round(rng.normal(0, 0.3, size=len(dups)), 2)
+        df = pd.concat([df, dups], ignore_index=True)
+    return df
+
+def make_synthetic_resources(df: pd.DataFrame, per_location: int = 3) -> pd.DataFrame:
+    """Resources CSV rows (one per section) for every (state, county) in `df`."""
+    locs = df[["state","county"]].drop_duplicates()
+    sections = ["Health Access","Food & Nutrition","Behavioral Health","Housing","Transportation"][:per_location]
+    out = locs.loc[locs.index.repeat(len(sections))].reset_index(drop=True)
+    out["section"] = np.tile(sections, len(locs))
+    out["label"] = out["county"] + " — " + out["section"]
+    out["url"] = "https://example.org/" + out.index.astype(str)
+    return out[RESOURCE_COLUMNS]
@@ -0,0 +1,133 @@
+# vitalview_jobs.py — VitalView background jobs (worker pool + SQLite job table)
+# Long exports run here instead of on the Streamlit script thread, so reruns don't cancel them.
+# One JobQueue per server process (the app holds it with st.cache_resource).
+
+import os, time, json, socket, sqlite3, threading, traceback
+from concurrent.futures import ThreadPoolExecutor
+
+JOBS_DB_PATH = os.getenv("VITALVIEW_JOBS_DB", "vitalview_jobs.db")
+JOBS_RESULT_DIR = os.getenv("VITALVIEW_JOBS_DIR", "vitalview_job_results")
+JOB_HEARTBEAT_S = 30       # each process re-stamps its unfinished jobs this often
+JOB_LEASE_S = 120          # an unfinished job not stamped for this long lost its process; fail it
+
+class JobQueue:
+    """
+    Jobs are plain callables `fn(fh, report, *args)` that write their result into the binary
+    file `fh` and may call `report(fraction, message)`. Status/progress live in SQLite so any
+    session (or page reload) can list and download them; inputs are kept in memory only, so a
+    job whose process exits is marked failed once its lease runs out (by any process on the DB).
+    """
+    def __init__(self, db_path: str = JOBS_DB_PATH, result_dir: str = JOBS_RESULT_DIR, max_workers: int = 2):
+        self.db_path, self.result_dir = db_path, result_dir
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        os.makedirs(result_dir, exist_ok=True)
+        self._init_db()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vitalview-job")
+        self._lock = threading.Lock()
+        threading.Thread(target=self._heartbeat, name="vitalview-job-lease", daemon=True).start()
+
+    def _conn(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner TEXT,
+                kind TEXT,
+                label TEXT,
+                status TEXT DEFAULT 'queued',
+                progress REAL DEFAULT 0,
+                message TEXT DEFAULT '',
+                params TEXT DEFAULT '{}',
+                file_name TEXT,
+                mime TEXT,
+                result_path TEXT,
+                created INTEGER,
+                updated INTEGER,
+                worker TEXT DEFAULT ''
+            )
+        """)
+        if "worker" not in {r[1] for r in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute("ALTER TABLE jobs ADD COLUMN worker TEXT DEFAULT ''")   # older databases
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_owner ON jobs(owner, id)")
+        conn.commit(); conn.close()
+        self._expire(restart=True)
+
+    def _expire(self, restart: bool = False):
+        """Fail unfinished jobs whose process stopped renewing them (and, on start, any left under this
+        host:pid by an earlier process); other replicas' live jobs are left alone."""
+        now = int(time.time())
+        conn = self._conn()
+        conn.execute("UPDATE jobs SET status='failed', message='Interrupted by server restart', updated=? "
+                     "WHERE status IN ('queued','running') AND (updated < ? OR worker=?)",
+                     (now, now - JOB_LEASE_S, self.worker if restart else None))
+        conn.commit(); conn.close()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_S)
+            try:
+                with self._lock:
+                    conn = self._conn()
+                    conn.execute("UPDATE jobs SET updated=? WHERE worker=? AND status IN ('queued','running')",
+                                 (int(time.time()), self.worker))
+                    conn.commit(); conn.close()
+                self._expire()
+            except sqlite3.Error:
+                pass
+
+    def _update(self, job_id: int, **fields):
+        fields["updated"] = int(time.time())
+        cols = ", ".join(f"{k}=?" for k in fields)
+        with self._lock:
+            conn = self._conn()
+            conn.execute(f"UPDATE jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+            conn.commit(); conn.close()
+
+    def submit(self, owner: str, kind: str, label: str, fn, *args,
+               file_name: str = "result.bin", mime: str = "application/octet-stream", params: dict | None = None) -> int:
+        now = int(time.time())
+        conn = self._conn()
+        cur = conn.execute(
+            "INSERT INTO jobs(owner,kind,label,params,file_name,mime,created,updated,worker) VALUES(?,?,?,?,?,?,?,?,?)",
+            (owner, kind, label, json.dumps(params or {}, default=str), file_name, mime, now, now, self.worker))
+        job_id = cur.lastrowid
+        conn.commit(); conn.close()
+        self._pool.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id: int, fn, args):
+        path = os.path.join(self.result_dir, f"job_{job_id}.bin")
+        last = [0.0]
+        def report(fraction: float, message: str = ""):
+            now = time.time()
+            if now - last[0] >= 0.5 or fraction >= 1.0:   # throttle SQLite writes
+                last[0] = now
+                self._update(job_id, progress=float(min(max(fraction, 0.0), 1.0)), message=message)
+        self._update(job_id, status="running")
+        try:
+            with open(path, "wb") as fh:
+                fn(fh, report, *args)
+            self._update(job_id, status="done", progress=1.0, result_path=path)
+        except Exception as e:
+            traceback.print_exc()
+            if os.path.exists(path): os.remove(path)
+            self._update(job_id, status="failed", message=f"{type(e).__name__}: {e}")
+
+    def list_jobs(self, owner: str, limit: int = 20) -> list[dict]:
+        conn = self._conn(); conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM jobs WHERE owner=? ORDER BY id DESC LIMIT ?", (owner, limit)).fetchall()
+        conn.close()
+        return [dict(r) for r in rows]
+
+    def delete(self, job_id: int, owner: str):
+        conn = self._conn()
+        row = conn.execute("SELECT result_path FROM jobs WHERE id=? AND owner=? AND status IN ('done','failed')",
+                           (job_id, owner)).fetchone()
+        if row:
+            if row[0] and os.path.exists(row[0]): os.remove(row[0])
+            conn.execute("DELETE FROM jobs WHERE id=?", (job_id,))
+            conn.commit()
+        conn.close()
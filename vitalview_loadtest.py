@@ -0,0 +1,68 @@
+# vitalview_loadtest.py — requests/sec against a running vitalview_api.py
+# Run: python vitalview_loadtest.py --url http://127.0.0.1:8765 --threads 8 --seconds 10
+# Each worker keeps one HTTP/1.1 connection open and cycles through a fixed set of paths.
+# --etag sends If-None-Match with the last ETag seen per path (measures the 304 path).
+
+import time, json, threading, statistics, http.client
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    "/v1/priority?limit=50",
+    "/v1/priority?limit=50&weights=Food%20Desert:1.5,PM2.5:1",
+    "/v1/health",
+]
+
+def worker(host, port, paths, stop_at, use_etag, out):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    etags, lat, codes, i = {}, [], {}, 0
+    while time.perf_counter() < stop_at:
+        path = paths[i % len(paths)]; i += 1
+        headers = {"If-None-Match": etags[path]} if use_etag and path in etags else {}
+        t0 = time.perf_counter()
+        conn.request("GET", path, headers=headers)
+        resp = conn.getresponse(); resp.read()
+        lat.append(time.perf_counter() - t0)
+        codes[resp.status] = codes.get(resp.status, 0) + 1
+        if resp.getheader("ETag"): etags[path] = resp.getheader("ETag")
+    conn.close()
+    out.append((lat, codes))
+
+def run(url: str, threads: int = 8, seconds: float = 10.0, paths=None, use_etag: bool = False) -> dict:
+    u = urlsplit(url)
+    paths = paths or DEFAULT_PATHS
+    # warm the server-side caches once so the run measures steady state
+    c = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=60)
+    for p in paths:
+        c.request("GET", p); c.getresponse().read()
+    c.close()
+
+    out = []
+    stop_at = time.perf_counter() + seconds
+    ts = [threading.Thread(target=worker, args=(u.hostname, u.port or 80, paths, stop_at, use_etag, out))
+          for _ in range(threads)]
+    t0 = time.perf_counter()
+    for t in ts: t.start()
+    for t in ts: t.join()
+    wall = time.perf_counter() - t0
+    lat = sorted(x for (l, _) in out for x in l)
+    codes = {}
+    for _, c in out:
+        for k, v in c.items(): codes[k] = codes.get(k, 0) + v
+    return {
+        "threads": threads, "seconds": round(wall, 2), "requests": len(lat),
+        "req_per_s": round(len(lat) / wall, 1),
+        "p50_ms": round(statistics.median(lat) * 1000, 2) if lat else None,
+        "p99_ms": round(lat[int(len(lat) * 0.99) - 1] * 1000, 2) if lat else None,
+        "status": codes, "etag": use_etag,
+    }
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="VitalView API load test")
+    ap.add_argument("--url", default="http://127.0.0.1:8765")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--etag", action="store_true", help="revalidate with If-None-Match")
+    ap.add_argument("--path", action="append", help="path to request (repeatable)")
+    args = ap.parse_args()
+    print(json.dumps(run(args.url, args.threads, args.seconds, args.path, args.etag), indent=2))
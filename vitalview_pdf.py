@@ -0,0 +1,113 @@
+# vitalview_pdf.py — VitalView PDF rendering (Streamlit-free, importable by worker processes)
+# Run benchmark: python vitalview_pdf.py --bench [--docs 200] [--workers 4]
+# Requires: pip install reportlab
+
+import io, os, time, hashlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+_RL = None   # ReportLab pieces, imported on first render (keeps app start-up free of it)
+
+def _reportlab():
+    """(canvas, letter, inch, simpleSplit), or None when ReportLab isn't installed."""
+    global _RL
+    if _RL is None:
+        try:
+            from reportlab.pdfgen import canvas
+            from reportlab.lib.pagesizes import letter
+            from reportlab.lib.units import inch
+            from reportlab.lib.utils import simpleSplit
+            _RL = (canvas, letter, inch, simpleSplit)
+        except Exception:
+            _RL = False
+    return _RL or None
+
+def pdf_available() -> bool:
+    return _reportlab() is not None
+
+# Bump whenever the page layout below changes so cached PDFs are invalidated.
+PDF_LAYOUT_VERSION = 1
+
+def pdf_cache_key(text: str, title: str) -> tuple:
+    """(content hash, title, layout version) — what a rendered PDF depends on."""
+    return (hashlib.sha256(text.encode("utf-8")).hexdigest(), title, PDF_LAYOUT_VERSION)
+
+def render_pdf(text: str, title: str = "VitalView Report") -> tuple[bytes, int]:
+    """Render `text` to a letter-size PDF. Returns (pdf bytes, page count); (b"", 0) without ReportLab."""
+    rl = _reportlab()
+    if rl is None: return b"", 0
+    canvas, letter, inch, simpleSplit = rl
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter); w,h = letter
+    margin = 0.75*inch; y = h - margin; pages = 1
+    c.setTitle(title); c.setFont("Helvetica-Bold", 14); c.drawString(margin,y,title); y -= 0.35*inch
+    c.setFont("Helvetica",10); maxw = w-2*margin
+    for raw in text.replace("\r","").split("\n"):
+        if not raw.strip(): y -= 0.18*inch; continue
+        for line in simpleSplit(raw,"Helvetica",10,maxw):
+            if y < margin: c.showPage(); pages += 1; y = h-margin; c.setFont("Helvetica",10)
+            c.drawString(margin,y,line); y -= 0.16*inch
+    c.showPage(); c.save(); pdf = buf.getvalue(); buf.close()
+    return pdf, pages
+
+def _render_job(job: tuple) -> tuple[bytes, int]:
+    text, title = job
+    return render_pdf(text, title)
+
+def pdf_pool(max_workers: int | None = None) -> ProcessPoolExecutor:
+    """Render pool to reuse across render_pdf_batch calls (shut it down when done). Workers start
+    from a fresh interpreter (forkserver/spawn), so it's safe to create inside a threaded server."""
+    ctx = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+    return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1, mp_context=ctx)
+
+def render_pdf_batch(docs: list, max_workers: int | None = None, chunksize: int = 4,
+                     pool: ProcessPoolExecutor | None = None) -> list[bytes]:
+    """Render many (text, title) pairs across a process pool (`pool`, or one made for this call);
+    result order matches `docs`. Small batches (or max_workers=1) render in-process."""
+    docs = list(docs)
+    if not docs or _reportlab() is None:
+        return [b"" for _ in docs]
+    max_workers = max_workers or min(len(docs), os.cpu_count() or 1)
+    if max_workers <= 1 or len(docs) < 2:
+        return [render_pdf(t, ti)[0] for (t, ti) in docs]
+    if pool is not None:
+        return [pdf for (pdf, _) in pool.map(_render_job, docs, chunksize=chunksize)]
+    with pdf_pool(max_workers) as ex:
+        return [pdf for (pdf, _) in ex.map(_render_job, docs, chunksize=chunksize)]
+
+# ----------------------------
+# Benchmark
+# ----------------------------
+def _bench_doc(i: int, paragraphs: int = 60) -> str:
+    para = ("Equity-weighted priority scoring highlights counties where food access, air quality, "
+            "insurance coverage and mobility barriers overlap. ") * 4
+    return "\n\n".join(f"Section {i}.{k}\n{para}" for k in range(paragraphs))
+
+def bench(n_docs: int = 100, workers: int | None = None) -> dict:
+    if _reportlab() is None:
+        raise SystemExit("ReportLab not installed:  pip install reportlab")
+    docs = [(_bench_doc(i), f"Bench {i}") for i in range(n_docs)]
+    pages = render_pdf(*docs[0])[1] * n_docs  # every bench doc has the same length
+
+    t0 = time.perf_counter(); [render_pdf(t, ti) for (t, ti) in docs]; serial = time.perf_counter() - t0
+    t0 = time.perf_counter(); render_pdf_batch(docs, max_workers=workers); par = time.perf_counter() - t0
+    return {
+        "docs": n_docs, "pages": pages,
+        "workers": workers or min(n_docs, os.cpu_count() or 1),
+        "serial_s": round(serial, 3), "parallel_s": round(par, 3),
+        "serial_pages_per_s": round(pages / serial, 1),
+        "parallel_pages_per_s": round(pages / par, 1),
+        "speedup": round(serial / par, 2),
+    }
+
+if __name__ == "__main__":
+    import argparse, json
+    ap = argparse.ArgumentParser(description="VitalView PDF rendering benchmark")
+    ap.add_argument("--bench", action="store_true")
+    ap.add_argument("--docs", type=int, default=100)
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+    if args.bench:
+        print(json.dumps(bench(args.docs, args.workers), indent=2))
+    else:
+        ap.print_help()
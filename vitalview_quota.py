@@ -0,0 +1,154 @@
+# vitalview_quota.py — VitalView per-plan quotas and load shedding (no Streamlit)
+# Each (user, plan, operation) has a token bucket: `capacity` tokens, refilled evenly over `window_s`.
+# Buckets live in SQLite so every replica draws from the same allowance; each process keeps a short-lived
+# copy in memory, so usage display and over-quota rejections don't touch the database.
+# Separately, a per-process cap on concurrent runs of each operation sheds load when the host is busy.
+
+import os, time, sqlite3, threading
+from contextlib import contextmanager
+
+QUOTA_DB_PATH = os.getenv("VITALVIEW_QUOTA_DB", "vitalview_quota.db")
+
+# operation -> (capacity, window seconds)
+PLAN_QUOTAS = {
+    "free":       {"grant_draft": (5, 3600),   "pdf": (10, 3600),   "rescore": (20, 3600),   "batch": (0, 86400)},
+    "pro":        {"grant_draft": (50, 3600),  "pdf": (100, 3600),  "rescore": (200, 3600),  "batch": (0, 86400)},
+    "enterprise": {"grant_draft": (300, 3600), "pdf": (600, 3600),  "rescore": (1000, 3600), "batch": (20, 86400)},
+    # every logged-out session draws from this one bucket, whatever demo plan it has picked
+    "anonymous":  {"grant_draft": (20, 3600),  "pdf": (40, 3600),   "rescore": (60, 3600),   "batch": (0, 86400)},
+}
+OP_LABELS = {"grant_draft": "Grant drafts", "pdf": "PDF renders", "rescore": "National re-scorings",
+             "batch": "Batch draft runs"}
+# runs at once in one process, across all users
+MAX_CONCURRENT = {"grant_draft": 4, "pdf": 2, "rescore": 2, "batch": 1}
+
+class QuotaExceeded(RuntimeError):
+    """Over the plan's allowance (reason 'quota') or the host is at capacity (reason 'busy')."""
+    def __init__(self, op: str, retry_after: float, reason: str = "quota"):
+        self.op, self.retry_after, self.reason = op, retry_after, reason
+        what = OP_LABELS.get(op, op)
+        msg = (f"{what}: plan limit reached" if reason == "quota" else f"{what}: server busy") + \
+              (f" — try again in {_fmt_wait(retry_after)}." if retry_after < float("inf") else
+               " — not included in this plan.")
+        super().__init__(msg)
+
+def _fmt_wait(s: float) -> str:
+    return f"{s:.0f}s" if s < 90 else f"{s / 60:.0f} min" if s < 5400 else f"{s / 3600:.1f} h"
+
+class QuotaStore:
+    def __init__(self, db_path: str = QUOTA_DB_PATH, quotas: dict = PLAN_QUOTAS,
+                 concurrency: dict = MAX_CONCURRENT, cache_s: float = 5.0):
+        self.db_path, self.quotas, self.cache_s = db_path, quotas, cache_s
+        self._cache = {}                  # (subject, plan, op) -> (tokens, updated, fetched_at)
+        self._lock = threading.Lock()
+        self._slots = {op: threading.BoundedSemaphore(n) for op, n in concurrency.items()}
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets(
+                subject TEXT,
+                plan TEXT,
+                op TEXT,
+                tokens REAL,
+                updated REAL,
+                PRIMARY KEY(subject, plan, op)
+            )
+        """)
+        conn.commit(); conn.close()
+
+    def _conn(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def limit(self, plan: str, op: str) -> tuple:
+        return self.quotas.get(plan, self.quotas["free"]).get(op, (0, 3600))
+
+    def _refill(self, plan, op, tokens, updated, now) -> float:
+        cap, window = self.limit(plan, op)
+        return min(cap, tokens + (now - updated) * cap / window) if cap else 0.0
+
+    def _wait_for(self, plan, op, tokens, cost) -> float:
+        cap, window = self.limit(plan, op)
+        if cost > cap: return float("inf")
+        return (cost - tokens) * window / cap
+
+    def _try_take(self, subject: str, plan: str, op: str, cost: float) -> float:
+        """0 on success, else seconds until `cost` tokens will be available."""
+        key, now = (subject, plan, op), time.time()
+        with self._lock:
+            hit = self._cache.get(key)
+        if hit and now - hit[2] < self.cache_s:
+            # other replicas only ever lower the balance, so a cached shortfall is safe to reject on
+            tokens = self._refill(plan, op, hit[0], hit[1], now)
+            if tokens < cost: return self._wait_for(plan, op, tokens, cost)
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE subject=? AND plan=? AND op=?", key).fetchone()
+            tokens = self._refill(plan, op, *row, now) if row else float(self.limit(plan, op)[0])
+            ok = tokens >= cost
+            if ok: tokens -= cost
+            conn.execute("INSERT OR REPLACE INTO buckets(subject,plan,op,tokens,updated) VALUES(?,?,?,?,?)",
+                         (*key, tokens, now))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        with self._lock:
+            self._cache[key] = (tokens, now, now)
+        return 0.0 if ok else self._wait_for(plan, op, tokens, cost)
+
+    def take(self, subject: str, plan: str, op: str, cost: float = 1, wait: float = 0):
+        """Spend `cost` tokens, waiting up to `wait` seconds for them (background work queues this way;
+        interactive calls use wait=0 and get QuotaExceeded with a retry-after instead)."""
+        deadline = time.time() + wait
+        while True:
+            retry = self._try_take(subject, plan, op, cost)
+            if retry == 0: return
+            if time.time() + retry > deadline:
+                raise QuotaExceeded(op, retry)
+            time.sleep(min(retry, 60.0))
+
+    @contextmanager
+    def slot(self, op: str, wait: float = 0):
+        """Hold one of the op's concurrent-run slots; QuotaExceeded('busy') if none frees up in `wait`."""
+        sem = self._slots.get(op)
+        if sem is None:
+            yield; return
+        if not (sem.acquire(timeout=wait) if wait else sem.acquire(blocking=False)):
+            raise QuotaExceeded(op, 5.0, "busy")
+        try:
+            yield
+        finally:
+            sem.release()
+
+    @contextmanager
+    def guard(self, subject: str, plan: str, op: str, cost: float = 1, wait: float = 0):
+        """slot() then take(): a busy host doesn't cost the user a token."""
+        with self.slot(op, wait):
+            self.take(subject, plan, op, cost, wait)
+            yield
+
+    def usage(self, subject: str, plan: str) -> list[dict]:
+        """Per-operation balance for the sidebar (memory copy, refreshed from SQLite every cache_s)."""
+        now = time.time()
+        ops = self.quotas.get(plan, self.quotas["free"])
+        with self._lock:
+            stale = [op for op in ops if now - self._cache.get((subject, plan, op), (0, 0, 0))[2] >= self.cache_s]
+        if stale:
+            conn = self._conn()
+            rows = dict((r[0], r[1:]) for r in conn.execute(
+                f"SELECT op, tokens, updated FROM buckets WHERE subject=? AND plan=? AND op IN ({','.join('?' * len(stale))})",
+                (subject, plan, *stale)))
+            conn.close()
+            with self._lock:
+                for op in stale:
+                    tokens, updated = rows.get(op, (float(self.limit(plan, op)[0]), now))
+                    self._cache[(subject, plan, op)] = (tokens, updated, now)
+        out = []
+        for op, (cap, window) in ops.items():
+            with self._lock:
+                tokens, updated, _ = self._cache[(subject, plan, op)]
+            left = self._refill(plan, op, tokens, updated, now)
+            out.append({"op": op, "label": OP_LABELS.get(op, op), "capacity": cap, "left": int(left),
+                        "used": cap - int(left), "window_s": window,
+                        "full_in_s": (cap - left) * window / cap if cap else 0.0})
+        return out
@@ -0,0 +1,141 @@
+# vitalview_shard.py — VitalView sharded scoring (process pool, no Streamlit)
+# One year's long data is split by state; worker processes pivot each shard and return per-indicator
+# sufficient statistics (n, mean, M2), which are merged for national z-scores before ranking.
+# The result matches core.compute_priority_df(core.derive_pivot(df), weights).
+# Bench: python vitalview_shard.py --bench --workers 1,2,4,8,16
+
+import os, time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import vitalview_core as core
+
+_SOURCE = None   # the year's long rows, handed to workers once at pool start (inherited under fork)
+# fork is only safe from a single-threaded process: the CLI and bench opt in; the (threaded) app
+# keeps forkserver/spawn, which pickle the rows once per worker instead
+START_METHOD = "forkserver"
+
+def _set_source(df: pd.DataFrame):
+    global _SOURCE
+    _SOURCE = df
+
+def _shard_job(job: tuple):
+    """Pivot the rows of `states` onto the shared indicator list; (index frame, values, n, mean, M2)."""
+    states, indicators = job
+    shard = _SOURCE[_SOURCE["state"].isin(states)]
+    pivot = shard.pivot_table(index=core.LOCATION_KEYS, columns="indicator", values="value", aggfunc="mean")
+    X = pivot.reindex(columns=indicators).to_numpy(dtype=float)
+    have = ~np.isnan(X)
+    n = have.sum(axis=0)
+    mean = np.where(n > 0, np.nansum(X, axis=0) / np.maximum(n, 1), 0.0)
+    m2 = np.nansum((X - mean) ** 2, axis=0)
+    return pivot.index.to_frame(index=False), X, n, mean, m2
+
+def merge_stats(parts) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Combine per-shard (n, mean, M2) column statistics (Chan et al.); returns (n, mean, M2)."""
+    n = mean = m2 = None
+    for nb, mb, m2b in parts:
+        if n is None:
+            n, mean, m2 = nb.astype(float), mb.astype(float), m2b.astype(float); continue
+        tot = n + nb
+        delta = mb - mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frac = np.where(tot > 0, nb / tot, 0.0)
+        m2 = m2 + m2b + delta ** 2 * n * frac
+        mean = mean + delta * frac
+        n = tot
+    return n, mean, m2
+
+def shard_by_state(df_latest: pd.DataFrame, n_shards: int) -> list:
+    """Sorted states cut into at most `n_shards` contiguous runs of similar row counts. Runs keep state
+    order, so the shard pivots concatenate in the same (state, county, fips) order as one big pivot."""
+    sizes = df_latest["state"].value_counts().sort_index()
+    cut = np.minimum((np.cumsum(sizes.to_numpy()) - 1) * max(1, n_shards) // max(1, len(df_latest)), n_shards - 1)
+    return [sizes.index[cut == i].tolist() for i in np.unique(cut)]
+
+def _pool(workers: int, df: pd.DataFrame) -> ProcessPoolExecutor:
+    methods = mp.get_all_start_methods()
+    ctx = mp.get_context(next((m for m in (START_METHOD, "forkserver") if m in methods), "spawn"))
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_set_source, initargs=(df,))
+
+def _run(df_latest: pd.DataFrame, max_workers: int | None):
+    indicators = sorted(df_latest["indicator"].dropna().unique().tolist())
+    workers = max_workers or os.cpu_count() or 1
+    src = df_latest[core.LOCATION_KEYS + ["indicator", "value"]]
+    # a couple of shards per worker evens out uneven states; one worker = one shard = a plain pivot
+    jobs = [(m, indicators) for m in shard_by_state(src, 1 if workers <= 1 else 2 * workers)]
+    if workers <= 1:
+        _set_source(src)
+        try:
+            return indicators, [_shard_job(j) for j in jobs]
+        finally:
+            _set_source(None)
+    with _pool(workers, src) as ex:
+        return indicators, list(ex.map(_shard_job, jobs))
+
+def pivot_sharded(df_latest: pd.DataFrame, max_workers: int | None = None) -> pd.DataFrame:
+    """core.derive_pivot (dense) built shard-by-shard in a process pool."""
+    if df_latest is None or df_latest.empty: return pd.DataFrame()
+    indicators, results = _run(df_latest, max_workers)
+    index = pd.MultiIndex.from_frame(pd.concat([r[0] for r in results], ignore_index=True))
+    return pd.DataFrame(np.vstack([r[1] for r in results]), index=index,
+                        columns=pd.Index(indicators, name="indicator"))
+
+def score_sharded(df_latest: pd.DataFrame, weights: dict, max_workers: int | None = None) -> pd.DataFrame:
+    """core.compute_priority_df(core.derive_pivot(df_latest), weights) with the pivot and column
+    statistics computed per state in a process pool; z-scores use the merged national statistics."""
+    if df_latest is None or df_latest.empty: return pd.DataFrame()
+    indicators, results = _run(df_latest, max_workers)
+    n, mean, m2 = merge_stats((r[2], r[3], r[4]) for r in results)
+    std = np.sqrt(m2 / np.maximum(n, 1)); std[~(std > 0)] = 1.0
+    X = np.vstack([r[1] for r in results])
+    Z = (X - mean) / std
+    out = pd.concat([pd.concat([r[0] for r in results], ignore_index=True),
+                     pd.DataFrame(Z, columns=indicators)], axis=1)
+    score = 0; used = []
+    for j, w in core._match_columns(indicators, weights):
+        score = score + w * Z[:, j]; used.append(indicators[j])
+    out["E_Score"] = score
+    out["__used__"] = ", ".join(used) if used else "(none)"
+    return out.sort_values("E_Score", ascending=False)
+
+# ----------------------------
+# Benchmark
+# ----------------------------
+def bench(workers=(1, 2, 4), tracts_per_county: int = 27, n_indicators: int = 5, repeats: int = 3) -> dict:
+    raw = core.make_synthetic(tracts_per_county=tracts_per_county, n_indicators=n_indicators, n_years=1)
+    df = core.enforce_schema(raw)
+    weights = {c: 1.0 for c in sorted(df["indicator"].unique())}
+
+    def best(fn):
+        runs = []
+        for _ in range(repeats):
+            t0 = time.perf_counter(); r = fn(); runs.append(time.perf_counter() - t0)
+        return min(runs), r
+
+    serial, ref = best(lambda: core.compute_priority_df(core.derive_pivot(df), weights))
+    out = {"rows": len(df), "locations": int(ref.shape[0]), "cpus": os.cpu_count(),
+           "serial_s": round(serial, 3), "sharded": []}
+    for w in workers:
+        t, res = best(lambda: score_sharded(df, weights, max_workers=w))   # includes pool start-up
+        same = np.allclose(res["E_Score"].to_numpy(float), ref["E_Score"].to_numpy(float), equal_nan=True) \
+            and (res["fips"].to_numpy() == ref["fips"].to_numpy()).all()
+        out["sharded"].append({"workers": w, "seconds": round(t, 3), "speedup": round(serial / t, 2), "identical": bool(same)})
+    return out
+
+if __name__ == "__main__":
+    import argparse, json
+    ap = argparse.ArgumentParser(description="VitalView sharded scoring benchmark")
+    ap.add_argument("--bench", action="store_true")
+    ap.add_argument("--workers", default="1,2,4", help="comma list of pool sizes")
+    ap.add_argument("--tracts", type=int, default=27, help="tracts per county (27 ~ 85k tracts)")
+    ap.add_argument("--indicators", type=int, default=5)
+    args = ap.parse_args()
+    START_METHOD = "fork"
+    if args.bench:
+        ws = [int(w) for w in args.workers.split(",") if w.strip()]
+        print(json.dumps(bench(ws, args.tracts, args.indicators), indent=2))
+    else:
+        ap.print_help()
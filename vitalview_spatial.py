@@ -0,0 +1,199 @@
+# vitalview_spatial.py — VitalView county neighbor graph + hot-spot statistics (numpy only, no Streamlit)
+# Build the adjacency file once (shipped next to the app):
+#   python vitalview_spatial.py build counties-10m.json        # us-atlas TopoJSON: counties sharing an arc
+#   python vitalview_spatial.py build county_adjacency.txt     # or the Census county adjacency file
+# Local Moran's I and Getis-Ord Gi* are computed for every county × column at once with CSR
+# segment sums (the sparse product W @ X), so a national run over all indicators takes milliseconds.
+
+import os, io, sys, json
+import numpy as np
+import pandas as pd
+
+ADJACENCY_PATH = os.getenv("VITALVIEW_ADJACENCY",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), "vitalview_county_adjacency.npz"))
+COUNTIES_TOPO_URL = "https://cdn.jsdelivr.net/npm/us-atlas@3/counties-10m.json"
+
+class NeighborGraph:
+    """Symmetric county adjacency in CSR form: neighbors of node i are indices[indptr[i]:indptr[i+1]]."""
+    def __init__(self, fips, indptr, indices):
+        self.fips = np.asarray(fips, dtype=object)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.degree = np.diff(self.indptr)
+
+    def __len__(self): return len(self.fips)
+
+    @property
+    def n_edges(self) -> int: return int(len(self.indices) // 2)
+
+    @classmethod
+    def from_edges(cls, pairs) -> "NeighborGraph":
+        """From (fips_a, fips_b) pairs; symmetrized, self-loops and repeats dropped."""
+        e = pd.DataFrame(list(pairs), columns=["a", "b"]).astype(str)
+        e = e[e["a"] != e["b"]]
+        e = pd.concat([e, e.rename(columns={"a": "b", "b": "a"})], ignore_index=True).drop_duplicates()
+        fips = np.array(sorted(set(e["a"])), dtype=object)
+        pos = pd.Series(np.arange(len(fips)), index=fips)
+        a, b = pos[e["a"]].to_numpy(), pos[e["b"]].to_numpy()
+        order = np.lexsort((b, a))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(a, minlength=len(fips)))])
+        return cls(fips, indptr, b[order])
+
+    @classmethod
+    def from_topojson(cls, topo, obj: str = "counties") -> "NeighborGraph":
+        """Rook adjacency from a TopoJSON (path or parsed dict): two shapes are neighbors when they share an arc."""
+        if isinstance(topo, str):
+            with open(topo, encoding="utf-8") as fh: topo = json.load(fh)
+        owners = {}
+        for g in topo["objects"][obj]["geometries"]:
+            polys = g.get("arcs") or []
+            if g.get("type") == "Polygon": polys = [polys]
+            for ring in (r for poly in polys for r in poly):
+                for arc in ring:
+                    owners.setdefault(arc if arc >= 0 else ~arc, set()).add(str(g["id"]))
+        pairs = [(a, b) for ids in owners.values() if len(ids) > 1
+                 for a in ids for b in ids if a < b]
+        return cls.from_edges(pairs)
+
+    @classmethod
+    def from_census(cls, path: str) -> "NeighborGraph":
+        """Census county_adjacency file (tab-delimited with continuation rows, or the newer pipe-delimited one)."""
+        with open(path, encoding="latin-1") as fh: text = fh.read()
+        if "|" in text.splitlines()[0]:
+            d = pd.read_csv(io.StringIO(text), sep="|", dtype=str)
+            return cls.from_edges(zip(d.iloc[:, 1], d.iloc[:, 3]))
+        d = pd.read_csv(io.StringIO(text), sep="\t", header=None, dtype=str)
+        return cls.from_edges(zip(d[1].ffill(), d[3]))
+
+    def save(self, path: str = ADJACENCY_PATH):
+        np.savez_compressed(path, fips=self.fips.astype(str), indptr=self.indptr, indices=self.indices)
+
+    @classmethod
+    def load(cls, path: str = ADJACENCY_PATH) -> "NeighborGraph":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["fips"].astype(object), z["indptr"], z["indices"])
+
+    def subgraph(self, fips) -> "NeighborGraph":
+        """Graph over `fips` in that order; edges to counties outside it are dropped (unknown fips are isolates)."""
+        fips = np.asarray([str(f) for f in fips], dtype=object)
+        old = pd.Series(np.arange(len(self.fips)), index=self.fips).reindex(fips).to_numpy()
+        remap = np.full(len(self.fips), -1, dtype=np.int64)
+        known = ~np.isnan(old)
+        remap[old[known].astype(np.int64)] = np.flatnonzero(known)
+        r = remap[np.repeat(np.arange(len(self.fips)), self.degree)]
+        c = remap[self.indices]
+        keep = (r >= 0) & (c >= 0)
+        r, c = r[keep], c[keep]
+        order = np.lexsort((c, r))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(r, minlength=len(fips)))])
+        cols = c[order]
+        return NeighborGraph(fips, indptr, cols)
+
+    def lag(self, X: np.ndarray) -> np.ndarray:
+        """Binary W @ X for an (n, k) array: per-row neighbor sums via a cumulative-sum segment reduce."""
+        X = np.asarray(X, dtype=float)
+        cs = np.vstack([np.zeros((1, X.shape[1])), np.cumsum(X[self.indices], axis=0)])
+        return cs[self.indptr[1:]] - cs[self.indptr[:-1]]
+
+def load_adjacency(path: str = ADJACENCY_PATH, fetch: bool = True, timeout: float = 15.0) -> NeighborGraph | None:
+    """The bundled adjacency; if it is missing and `fetch` is set, build it from the us-atlas counties
+    TopoJSON (the same CDN the map uses) and save it. None when neither is available."""
+    if os.path.exists(path):
+        return NeighborGraph.load(path)
+    if not fetch:
+        return None
+    try:
+        from urllib.request import urlopen
+        with urlopen(COUNTIES_TOPO_URL, timeout=timeout) as r:
+            g = NeighborGraph.from_topojson(json.load(r))
+    except Exception:
+        return None
+    try:
+        g.save(path)
+    except OSError:
+        pass
+    return g
+
+# ----------------------------
+# Hot-spot statistics
+# ----------------------------
+def _standardize(X: np.ndarray):
+    """Column z-scores with NaN filled by 0 (the column mean) so gaps don't pull neighbors either way."""
+    mu = np.nanmean(X, axis=0)
+    sd = np.nanstd(X, axis=0); sd[~(sd > 0)] = 1.0
+    return np.nan_to_num((X - mu) / sd, nan=0.0)
+
+def local_morans_i(values: pd.DataFrame, graph: NeighborGraph) -> pd.DataFrame:
+    """Local Moran's I (row-standardized weights) for every row × column of `values`.
+    `values` is indexed like `graph.fips`; isolates and missing cells come back NaN."""
+    X = values.to_numpy(dtype=float)
+    z = _standardize(X)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lag = graph.lag(z) / graph.degree[:, None]
+    out = z * lag
+    out[np.isnan(X) | (graph.degree == 0)[:, None]] = np.nan
+    return pd.DataFrame(out, index=values.index, columns=values.columns)
+
+def getis_ord_gi_star(values: pd.DataFrame, graph: NeighborGraph) -> pd.DataFrame:
+    """Getis-Ord Gi* z-scores (binary weights, self included) for every row × column of `values`."""
+    X = values.to_numpy(dtype=float)
+    miss = np.isnan(X)
+    n = (~miss).sum(axis=0).astype(float)
+    xbar = np.nanmean(X, axis=0)
+    s = np.sqrt(np.nanmean(X * X, axis=0) - xbar ** 2)
+    Xf = np.where(miss, xbar, X)                              # neutral fill, as in _standardize
+    wsum = (graph.degree + 1).astype(float)[:, None]          # Σw_ij = Σw_ij² for binary weights
+    num = graph.lag(Xf) + Xf - xbar * wsum
+    with np.errstate(invalid="ignore", divide="ignore"):
+        den = s * np.sqrt((n * wsum - wsum ** 2) / (n - 1))
+        out = num / den
+    out[miss | (graph.degree == 0)[:, None]] = np.nan
+    return pd.DataFrame(out, index=values.index, columns=values.columns)
+
+HOT_SPOT_BINS = [(2.576, "Hot spot (99%)"), (1.960, "Hot spot (95%)"), (1.645, "Hot spot (90%)")]
+
+def hot_spot_labels(gi_z: pd.Series) -> pd.Series:
+    """Gi* z-score -> "Hot/Cold spot (90/95/99%)" or "Not significant"."""
+    z = gi_z.to_numpy(dtype=float)
+    lab = np.full(len(z), "Not significant", dtype=object)
+    for cut, name in reversed(HOT_SPOT_BINS):                 # strongest bin written last
+        lab[z >= cut] = name
+        lab[z <= -cut] = name.replace("Hot", "Cold")
+    lab[np.isnan(z)] = "No neighbors / no data"
+    return pd.Series(lab, index=gi_z.index)
+
+def moran_quadrants(values: pd.DataFrame, graph: NeighborGraph) -> pd.DataFrame:
+    """High-High / Low-Low / High-Low / Low-High per cell, by the sign of z and its neighbor average."""
+    X = values.to_numpy(dtype=float)
+    z = _standardize(X)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lag = graph.lag(z) / graph.degree[:, None]
+    q = np.where(z >= 0, np.where(lag >= 0, "High-High", "High-Low"),
+                 np.where(lag >= 0, "Low-High", "Low-Low")).astype(object)
+    q[np.isnan(X) | np.isnan(lag)] = ""
+    return pd.DataFrame(q, index=values.index, columns=values.columns)
+
+def hot_spots(pr: pd.DataFrame, graph: NeighborGraph, columns=None) -> dict:
+    """Gi* and local Moran's I for a priority table (one row per county, `fips` column) over
+    `columns` (default: E_Score and every indicator). Returns {"gi", "moran", "quadrant"} DataFrames
+    indexed by fips, plus the "graph" restricted to those counties."""
+    cols = list(columns) if columns is not None else \
+        [c for c in pr.columns if c not in ("state", "county", "fips", "year", "rank", "__used__")]
+    vals = pr.assign(fips=pr["fips"].astype(str)).drop_duplicates("fips").set_index("fips")[cols]
+    g = graph.subgraph(vals.index)
+    return {"gi": getis_ord_gi_star(vals, g), "moran": local_morans_i(vals, g),
+            "quadrant": moran_quadrants(vals, g), "graph": g}
+
+if __name__ == "__main__":
+    import argparse, time
+    ap = argparse.ArgumentParser(description="VitalView county adjacency builder")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="build the adjacency .npz from a TopoJSON or Census adjacency file")
+    b.add_argument("source", help="counties TopoJSON (.json) or county_adjacency.txt")
+    b.add_argument("--out", default=ADJACENCY_PATH)
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    g = (NeighborGraph.from_topojson(args.source) if args.source.lower().endswith(".json")
+         else NeighborGraph.from_census(args.source))
+    g.save(args.out)
+    print(f"{len(g):,} counties, {g.n_edges:,} edges -> {args.out} ({time.perf_counter() - t0:.1f}s)", file=sys.stderr)
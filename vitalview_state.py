@@ -0,0 +1,221 @@
+# vitalview_state.py — VitalView session/artifact state backends (no Streamlit)
+# The app keeps login, plan, theme and saved artifacts here instead of only in st.session_state,
+# so any replica can pick up a browser session. Pick a backend with VITALVIEW_STATE_URL:
+#   sqlite:///vitalview_state.db     one file shared by the processes on a host (default)
+#   tcp://10.0.0.5:8766              state server shared by replicas on several nodes
+#   memory://                        this process only (tests)
+# Run the state server (a local stand-in for a networked store such as Redis):
+#   python vitalview_state.py serve --port 8766 --db vitalview_state.db
+
+import os, sys, json, time, socket, sqlite3, threading, socketserver
+
+STATE_DB_PATH = os.getenv("VITALVIEW_STATE_DB", "vitalview_state.db")
+
+class StateError(RuntimeError):
+    """The state backend couldn't be reached or refused the request."""
+
+class MemoryBackend:
+    """
+    JSON values under (namespace, key), optionally expiring. Lists can be appended to / removed from
+    atomically, so two replicas adding to the same account's library don't overwrite each other.
+    This class is the in-process reference; the other backends implement the same five methods.
+    """
+    def __init__(self):
+        self._d, self._lock = {}, threading.Lock()
+
+    def _live(self, ns: str) -> dict:
+        now = time.time()
+        items = self._d.get(ns, {})
+        for k in [k for k, (_, exp) in items.items() if exp and exp <= now]: del items[k]
+        return items
+
+    def get_many(self, ns: str) -> dict:
+        with self._lock:
+            return {k: json.loads(v) for k, (v, _) in self._live(ns).items()}
+
+    def put(self, ns: str, key: str, value, ttl: float | None = None):
+        with self._lock:
+            self._d.setdefault(ns, {})[key] = (json.dumps(value), time.time() + ttl if ttl else None)
+
+    def delete(self, ns: str, key: str | None = None):
+        with self._lock:
+            if key is None: self._d.pop(ns, None)
+            else: self._d.get(ns, {}).pop(key, None)
+
+    def append(self, ns: str, key: str, item, limit: int | None = None) -> list:
+        with self._lock:
+            cur = self._live(ns).get(key)
+            items = (json.loads(cur[0]) if cur else []) + [item]
+            if limit: items = items[-limit:]
+            self._d.setdefault(ns, {})[key] = (json.dumps(items), cur[1] if cur else None)
+            return items
+
+    def remove(self, ns: str, key: str, item) -> list:
+        with self._lock:
+            cur = self._live(ns).get(key)
+            items = json.loads(cur[0]) if cur else []
+            if item in items:
+                items.remove(item)
+                self._d[ns][key] = (json.dumps(items), cur[1])
+            return items
+
+class SQLiteBackend:
+    """MemoryBackend semantics in a SQLite file (WAL), safe across processes on one host."""
+    def __init__(self, path: str = STATE_DB_PATH):
+        self.path = path
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS state(
+                ns TEXT,
+                key TEXT,
+                value TEXT,
+                expires REAL,
+                PRIMARY KEY(ns, key)
+            )
+        """)
+        conn.execute("DELETE FROM state WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+        conn.commit(); conn.close()
+
+    def _conn(self):
+        try:
+            return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        except sqlite3.Error as e:
+            raise StateError(str(e)) from e
+
+    def _read(self, conn, ns: str, key: str):
+        row = conn.execute("SELECT value, expires FROM state WHERE ns=? AND key=? AND (expires IS NULL OR expires > ?)",
+                           (ns, key, time.time())).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, None)
+
+    def get_many(self, ns: str) -> dict:
+        conn = self._conn()
+        try:
+            rows = conn.execute("SELECT key, value FROM state WHERE ns=? AND (expires IS NULL OR expires > ?)",
+                                (ns, time.time())).fetchall()
+        finally:
+            conn.close()
+        return {k: json.loads(v) for k, v in rows}
+
+    def put(self, ns: str, key: str, value, ttl: float | None = None):
+        conn = self._conn()
+        try:
+            conn.execute("INSERT OR REPLACE INTO state(ns,key,value,expires) VALUES(?,?,?,?)",
+                         (ns, key, json.dumps(value), time.time() + ttl if ttl else None))
+        finally:
+            conn.close()
+
+    def delete(self, ns: str, key: str | None = None):
+        conn = self._conn()
+        try:
+            if key is None: conn.execute("DELETE FROM state WHERE ns=?", (ns,))
+            else: conn.execute("DELETE FROM state WHERE ns=? AND key=?", (ns, key))
+        finally:
+            conn.close()
+
+    def _update_list(self, ns: str, key: str, fn) -> list:
+        # read-modify-write under the database write lock, so concurrent appends from other processes serialize
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur, exp = self._read(conn, ns, key)
+            items = fn(list(cur or []))
+            conn.execute("INSERT OR REPLACE INTO state(ns,key,value,expires) VALUES(?,?,?,?)",
+                         (ns, key, json.dumps(items), exp))
+            conn.execute("COMMIT")
+            return items
+        except BaseException:
+            if conn.in_transaction: conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def append(self, ns: str, key: str, item, limit: int | None = None) -> list:
+        return self._update_list(ns, key, lambda items: (items + [item])[-limit:] if limit else items + [item])
+
+    def remove(self, ns: str, key: str, item) -> list:
+        def drop(items):
+            if item in items: items.remove(item)
+            return items
+        return self._update_list(ns, key, drop)
+
+# ----------------------------
+# Networked store (local stand-in)
+# ----------------------------
+OPS = ("get_many", "put", "delete", "append", "remove")
+
+class _Handler(socketserver.StreamRequestHandler):
+    # one JSON request per line: {"op": "put", "args": [...]} -> {"ok": true, "result": ...}
+    def handle(self):
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+                if req.get("op") not in OPS: raise ValueError(f"unknown op {req.get('op')!r}")
+                out = {"ok": True, "result": getattr(self.server.backend, req["op"])(*req.get("args", []))}
+            except Exception as e:
+                out = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(out).encode("utf-8") + b"\n")
+
+class StateServer(socketserver.ThreadingTCPServer):
+    """Serves a backend (SQLite by default) to RemoteBackend clients over newline-delimited JSON."""
+    daemon_threads = True
+    allow_reuse_address = True
+    def __init__(self, addr: tuple, backend=None):
+        self.backend = backend or SQLiteBackend()
+        super().__init__(addr, _Handler)
+
+class RemoteBackend:
+    """Client for StateServer. One persistent connection per thread; reconnects once on a dropped socket."""
+    def __init__(self, host: str, port: int, timeout: float = 2.0):
+        self.addr, self.timeout = (host, port), timeout
+        self._local = threading.local()
+
+    def _call(self, op: str, *args):
+        msg = json.dumps({"op": op, "args": list(args)}).encode("utf-8") + b"\n"
+        for attempt in (0, 1):
+            f = getattr(self._local, "f", None)
+            try:
+                if f is None:
+                    f = self._local.f = socket.create_connection(self.addr, timeout=self.timeout).makefile("rwb")
+                f.write(msg); f.flush()
+                line = f.readline()
+                if not line: raise ConnectionError("connection closed")
+                break
+            except OSError as e:
+                self._local.f = None
+                if attempt: raise StateError(f"state server {self.addr[0]}:{self.addr[1]}: {e}") from e
+        out = json.loads(line)
+        if not out["ok"]: raise StateError(out["error"])
+        return out["result"]
+
+    def get_many(self, ns): return self._call("get_many", ns)
+    def put(self, ns, key, value, ttl=None): return self._call("put", ns, key, value, ttl)
+    def delete(self, ns, key=None): return self._call("delete", ns, key)
+    def append(self, ns, key, item, limit=None): return self._call("append", ns, key, item, limit)
+    def remove(self, ns, key, item): return self._call("remove", ns, key, item)
+
+def open_backend(url: str = ""):
+    """Backend for a VITALVIEW_STATE_URL (see the header); a bare path means a SQLite file."""
+    url = url or f"sqlite:///{STATE_DB_PATH}"
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith("tcp://"):
+        host, _, port = url[len("tcp://"):].rstrip("/").rpartition(":")
+        return RemoteBackend(host or "127.0.0.1", int(port))
+    return SQLiteBackend(url[len("sqlite:///"):] if url.startswith("sqlite:///") else url)
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="VitalView state server")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("serve", help="serve a SQLite state file to app replicas")
+    sp.add_argument("--host", default="127.0.0.1")
+    sp.add_argument("--port", type=int, default=8766)
+    sp.add_argument("--db", default=STATE_DB_PATH)
+    args = ap.parse_args()
+    srv = StateServer((args.host, args.port), SQLiteBackend(args.db))
+    print(f"VitalView state server on tcp://{args.host}:{args.port} ({args.db})", file=sys.stderr)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
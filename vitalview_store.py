@@ -0,0 +1,161 @@
+# vitalview_store.py — VitalView on-disk dataset store with predicate pushdown (Parquet, no Streamlit)
+# Layout written by write_store (or `python vitalview_cli.py store data.csv DIR`):
+#   DIR/year=2021/part-0.parquet   one Hive partition per year; rows ordered by indicator, state, county,
+#                                   fips, so each row group's min/max statistics cover a narrow range
+#   DIR/_locations.parquet          distinct (state, county, fips[, zip]) for GeoHierarchy
+#   DIR/_manifest.json              filter options, partition versions and the data-health profile
+# DatasetStore.scan(states, counties, years, indicators) prunes year partitions, then row groups whose
+# statistics can't match, and reads only what's left; every scan reports files/row groups/bytes read.
+
+import os, json, time, shutil, threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import vitalview_core as core
+
+MANIFEST = "_manifest.json"
+LOCATIONS = "_locations.parquet"
+ROW_GROUP_ROWS = 16_384      # smaller groups prune finer; larger ones compress and scan faster
+FORMAT_VERSION = 1
+
+def is_store(path: str) -> bool:
+    return bool(path) and os.path.isfile(os.path.join(path, MANIFEST))
+
+def _profile_json(prof: dict) -> dict:
+    cov, out = prof["coverage"], prof["outliers"]
+    return {**{k: v for k, v in prof.items() if k not in ("coverage", "outliers")},
+            "coverage": {"index": cov.index.tolist(), "columns": [int(c) for c in cov.columns],
+                         "data": cov.to_numpy().tolist()},
+            "outliers": json.loads(out.to_json(orient="records"))}
+
+def _profile_frames(prof: dict) -> dict:
+    cov = prof["coverage"]
+    return {**prof, "coverage": pd.DataFrame(cov["data"], index=pd.Index(cov["index"], name="indicator"),
+                                             columns=cov["columns"]),
+            "outliers": pd.DataFrame(prof["outliers"], columns=core.LOCATION_KEYS + ["year","indicator","value","z"])}
+
+def write_store(df: pd.DataFrame, root: str, issues: dict | None = None,
+                row_group_rows: int = ROW_GROUP_ROWS) -> dict:
+    """Write a schema-checked, deduplicated frame (see merge_datasets) as a store at `root`,
+    replacing any existing store there. Returns the manifest. Raises FileExistsError if `root`
+    is a file or a non-empty directory that isn't a store."""
+    if os.path.lexists(root) and not (is_store(root) or (os.path.isdir(root) and not os.listdir(root))):
+        raise FileExistsError(f"{root} exists and is not a VitalView store; refusing to replace it")
+    extra = [c for c in core.GEO_EXTRA_COLUMNS if c in df.columns]
+    cols = ["state","county","fips","indicator","value","unit"] + extra
+    df = df.assign(fips=df["fips"].astype(str), year=df["year"].astype(int))
+    tmp = root.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for y, g in df.groupby("year", sort=True):
+        g = g.sort_values(["indicator","state","county","fips"], kind="stable")
+        os.makedirs(os.path.join(tmp, f"year={y}"))
+        pq.write_table(pa.Table.from_pandas(g[cols], preserve_index=False),
+                       os.path.join(tmp, f"year={y}", "part-0.parquet"),
+                       row_group_size=row_group_rows, compression="zstd", write_statistics=True)
+    loc = df[["state","county","fips"] + (["zip"] if "zip" in df.columns else [])].drop_duplicates("fips")
+    pq.write_table(pa.Table.from_pandas(loc, preserve_index=False), os.path.join(tmp, LOCATIONS))
+    counties = df[["state","county"]].drop_duplicates().sort_values(["state","county"])
+    manifest = {
+        "format": FORMAT_VERSION, "rows": len(df), "row_group_rows": row_group_rows,
+        "columns": ["state","county","fips","year","indicator","value","unit"] + extra,
+        "years": sorted(int(y) for y in df["year"].unique()),
+        "indicators": sorted(df["indicator"].unique().tolist()),
+        "states": {s: g["county"].tolist() for s, g in counties.groupby("state", sort=True)},
+        "parts": {str(y): v for y, v in core.partition_versions(df).items()},
+        "profile": _profile_json(core.profile_dataset(df, issues)),
+        "written": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh)
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+    os.replace(tmp, root)
+    return manifest
+
+def filter_expression(states=None, counties=None, years=None, indicators=None):
+    """pyarrow expression for the Filters panel selections (None / empty = no constraint);
+    `years` is an inclusive (first, last) range."""
+    parts = []
+    if states: parts.append(pc.field("state").isin(list(states)))
+    if counties: parts.append(pc.field("county").isin(list(counties)))
+    if years: parts.append((pc.field("year") >= int(years[0])) & (pc.field("year") <= int(years[1])))
+    if indicators: parts.append(pc.field("indicator").isin(list(indicators)))
+    expr = None
+    for p in parts:
+        expr = p if expr is None else expr & p
+    return expr
+
+class DatasetStore:
+    """Read side of a store. Thread-safe; one instance is shared by every session in the app."""
+    def __init__(self, root: str):
+        self.root = root
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as fh:
+            self.manifest = json.load(fh)
+        self.dataset = ds.dataset(root, format="parquet",
+                                  partitioning=ds.partitioning(pa.schema([("year", pa.int64())]), flavor="hive"))
+        self._fragments = list(self.dataset.get_fragments())
+        self._sizes = {}      # (path, row group id) -> compressed bytes on disk
+        for f in self._fragments:
+            md = f.metadata
+            for i in range(md.num_row_groups):
+                rg = md.row_group(i)
+                self._sizes[(f.path, i)] = sum(rg.column(j).total_compressed_size for j in range(rg.num_columns))
+        self.bytes_total = sum(self._sizes.values())
+        self._lock = threading.Lock()
+        self._stats = {"scans": 0, "bytes_read": 0, "rows_read": 0, "rows": 0}
+
+    # ---- catalog (from the manifest; no data read) ----
+    @property
+    def states(self) -> list: return list(self.manifest["states"])
+    @property
+    def years(self) -> list: return list(self.manifest["years"])
+    @property
+    def indicators(self) -> list: return list(self.manifest["indicators"])
+    @property
+    def parts(self) -> dict: return {int(y): v for y, v in self.manifest["parts"].items()}
+
+    def counties(self, states=None) -> list:
+        st = self.manifest["states"]
+        return sorted({c for s in (states or st) for c in st.get(s, [])})
+
+    def locations(self) -> pd.DataFrame:
+        return pd.read_parquet(os.path.join(self.root, LOCATIONS))
+
+    def profile(self) -> dict:
+        return _profile_frames(self.manifest["profile"])
+
+    # ---- scans ----
+    def plan(self, states=None, counties=None, years=None, indicators=None) -> list:
+        """Row-group fragments that can hold matching rows: year partitions pruned on the partition
+        key, then row groups pruned on their column statistics (year isn't stored in the files)."""
+        keep = filter_expression(years=years)
+        cols = filter_expression(states, counties, None, indicators)
+        files = self.dataset.get_fragments(filter=keep) if keep is not None else self._fragments
+        return [rg for f in files for rg in f.split_by_row_group(cols)]
+
+    def scan(self, states=None, counties=None, years=None, indicators=None) -> tuple[pd.DataFrame, dict]:
+        """Matching rows in the upload schema, ordered like core.sort_dataset, plus scan metrics."""
+        t0 = time.perf_counter()
+        frags = self.plan(states, counties, years, indicators)
+        groups = [(f.path, rg.id, rg.num_rows) for f in frags for rg in f.row_groups]
+        sub = ds.FileSystemDataset(frags, self.dataset.schema, self.dataset.format, self.dataset.filesystem)
+        table = sub.to_table(columns=self.manifest["columns"],
+                             filter=filter_expression(states, counties, years, indicators))
+        df = core.sort_dataset(table.to_pandas())
+        m = {"files": len({p for p, *_ in groups}), "files_total": len(self._fragments),
+             "row_groups": len(groups), "row_groups_total": len(self._sizes),
+             "bytes_read": sum(self._sizes[(p, i)] for p, i, _ in groups), "bytes_total": self.bytes_total,
+             "rows_read": sum(n for *_, n in groups), "rows": len(df),
+             "ms": round((time.perf_counter() - t0) * 1000, 1)}
+        with self._lock:
+            self._stats["scans"] += 1
+            for k in ("bytes_read", "rows_read", "rows"): self._stats[k] += m[k]
+        return df, m
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "bytes_total": self.bytes_total}